@@ -0,0 +1,224 @@
+import os
+import json
+import math
+import time
+import sqlite3
+import threading
+from array import array
+from langchain_core.documents import Document
+from model_clients import get_client
+from project_manifest import project_version
+
+DB_ROOT = "chroma_db_store"
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# 所有项目共用一个 SQLite 文件 (WAL 模式)，Web 界面与 API 服务等多个进程共享同一份缓存
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", os.path.join("embedding_cache", "answers.sqlite"))
+# 问题向量的余弦相似度达到该阈值才视为同一个问题
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+# 缓存条目的有效期 (小时)，0 表示不过期
+ANSWER_CACHE_TTL_HOURS = float(os.getenv("ANSWER_CACHE_TTL_HOURS", "72"))
+# 每个项目最多缓存的问答数，超出后淘汰最久未命中的条目
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+# 加载项目后在后台预先回答建议问题 (会为每个建议问题运行完整流程、消耗云端模型 Token，默认关闭)
+ANSWER_CACHE_PREWARM = os.getenv("ANSWER_CACHE_PREWARM", "false").lower() == "true"
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _serialize_document(doc):
+    return {"page_content": doc.page_content, "metadata": doc.metadata}
+
+
+class AnswerCache:
+    """
+    单个项目的语义答案缓存 (SQLite 持久化，线程安全，WAL 模式支持多进程共享)
+    按问题向量的余弦相似度查找；项目重新导入后整体失效
+    """
+
+    def __init__(self, db_path, embeddings=None, path=ANSWER_CACHE_PATH, threshold=ANSWER_CACHE_THRESHOLD,
+                 ttl_hours=ANSWER_CACHE_TTL_HOURS, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.db_path = db_path
+        self.project = os.path.basename(os.path.normpath(db_path))
+        self.embeddings = embeddings or get_client("embeddings")
+        self.threshold = threshold
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS answers (
+                project TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                documents TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                version INTEGER,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (project, question)
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS answer_stats (
+                project TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._conn.commit()
+
+    def _check_version(self):
+        """项目被重新导入 (清单变化) 时清空该项目的缓存 (调用方持有锁)"""
+        version = project_version(self.db_path)
+        cursor = self._conn.execute(
+            "DELETE FROM answers WHERE project = ? AND version IS NOT ?", (self.project, version)
+        )
+        if cursor.rowcount:
+            print(f"🧹 [Answer Cache] 项目数据已更新，清空 {cursor.rowcount} 条缓存答案")
+        return version
+
+    def _min_created(self, now):
+        return now - self.ttl_seconds if self.ttl_seconds > 0 else float("-inf")
+
+    def _count(self, column):
+        self._conn.execute(
+            f"INSERT INTO answer_stats (project, {column}) VALUES (?, 1) "
+            f"ON CONFLICT(project) DO UPDATE SET {column} = {column} + 1",
+            (self.project,),
+        )
+
+    def lookup(self, question):
+        """
+        查找相似问题的缓存答案
+        :return: 命中时返回 {"question", "answer", "documents", "similarity"}，否则返回 None
+        """
+        vector = _normalize(self.embeddings.embed_query(question))
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            rows = self._conn.execute(
+                "SELECT question, vector FROM answers WHERE project = ? AND created_at >= ?",
+                (self.project, self._min_created(now)),
+            ).fetchall()
+            best, best_sim = None, -1.0
+            for cached_question, blob in rows:
+                sim = sum(a * b for a, b in zip(vector, array("f", blob)))
+                if sim > best_sim:
+                    best, best_sim = cached_question, sim
+            if best is None or best_sim < self.threshold:
+                self._count("misses")
+                self._conn.commit()
+                return None
+            self._count("hits")
+            self._conn.execute(
+                "UPDATE answers SET hits = hits + 1, last_used = ? WHERE project = ? AND question = ?",
+                (now, self.project, best),
+            )
+            self._conn.commit()
+            answer, documents = self._conn.execute(
+                "SELECT answer, documents FROM answers WHERE project = ? AND question = ?", (self.project, best)
+            ).fetchone()
+        print(f"⚡ [Answer Cache] 命中缓存答案 (相似度 {best_sim:.3f}): {best}")
+        return {
+            "question": best,
+            "answer": answer,
+            "documents": [Document(**d) for d in json.loads(documents)],
+            "similarity": best_sim,
+        }
+
+    def store(self, question, answer, documents):
+        """写入一条问答 (同一问题会覆盖旧答案)"""
+        if not answer:
+            return
+        vector = _normalize(self.embeddings.embed_query(question))
+        documents = json.dumps([_serialize_document(d) for d in documents], ensure_ascii=False, default=str)
+        now = time.time()
+        with self._lock:
+            version = self._check_version()
+            self._conn.execute(
+                "DELETE FROM answers WHERE project = ? AND created_at < ?", (self.project, self._min_created(now))
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(project, question, answer, documents, vector, version, created_at, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (self.project, question, answer, documents, array("f", vector).tobytes(), version, now, now),
+            )
+            # 超出上限时淘汰最久未使用的条目
+            self._conn.execute(
+                "DELETE FROM answers WHERE project = ? AND question NOT IN "
+                "(SELECT question FROM answers WHERE project = ? ORDER BY last_used DESC LIMIT ?)",
+                (self.project, self.project, self.max_entries),
+            )
+            self._conn.commit()
+
+    def contains(self, question):
+        """是否已缓存完全相同的问题 (不计入命中率，预热时使用)"""
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            self._conn.commit()
+            row = self._conn.execute(
+                "SELECT 1 FROM answers WHERE project = ? AND question = ? AND created_at >= ?",
+                (self.project, question, self._min_created(now)),
+            ).fetchone()
+        return row is not None
+
+    def stats(self):
+        """条目数与命中统计 (所有共享该缓存的进程合计)"""
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM answers WHERE project = ?", (self.project,)
+            ).fetchone()[0]
+            row = self._conn.execute(
+                "SELECT hits, misses FROM answer_stats WHERE project = ?", (self.project,)
+            ).fetchone()
+        hits, misses = row or (0, 0)
+        total = hits + misses
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_answer_cache(project_name):
+    """进程内共享的项目答案缓存实例"""
+    with _caches_lock:
+        if project_name not in _caches:
+            _caches[project_name] = AnswerCache(os.path.join(DB_ROOT, project_name))
+        return _caches[project_name]
+
+
+def prewarm_answers(project_name, questions, registry):
+    """
+    后台预热：依次运行 Graph 回答建议问题并写入缓存 (已缓存的问题跳过)
+    用户点击建议问题时即可直接返回答案
+    """
+    cache = get_answer_cache(project_name)
+    for question in questions:
+        if cache.contains(question):
+            continue
+        try:
+            with registry.use(project_name) as project:
+                result = project.graph.invoke({"question": question})
+            cache.store(question, result.get("generation", ""), result.get("documents", []))
+            print(f"🔥 [Answer Cache] 已预热: {question}")
+        except Exception as e:
+            print(f"⚠️ [Answer Cache] 预热失败 ({question}): {e}")
@@ -0,0 +1,298 @@
+import os
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import anyio
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from ingest import list_existing_projects
+from job_queue import JobConflictError, get_job_queue
+from project_registry import get_project_registry
+from query_service import stream_query, stream_federated_query
+from answer_cache import get_answer_cache
+from embedding_cache import get_embedding_cache
+from verdict_cache import get_verdict_cache
+from grader import GRADER_ENGINE
+from fast_grader import GRADER_SAMPLE_LOG, get_fast_grader
+from telemetry import metrics as telemetry_metrics, new_trace_id
+from model_clients import loaded_clients, warm_up
+from http_clients import stats as http_stats
+
+# HTTP 服务监听地址
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# 同时执行的查询数 (每个查询占用一个工作线程，评分/生成期间大部分时间在等待模型)
+API_MAX_CONCURRENT_QUERIES = int(os.getenv("API_MAX_CONCURRENT_QUERIES", "4"))
+# 排队等待的查询上限，超过后直接返回 429 (背压)，避免请求无限堆积
+API_MAX_QUEUED_QUERIES = int(os.getenv("API_MAX_QUEUED_QUERIES", "16"))
+# 排队超过该时间 (秒) 仍未开始执行则返回 503
+API_QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "30"))
+
+
+class Busy(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Admission:
+    """并发控制：最多 limit 个任务同时执行，最多 max_queue 个任务排队，其余立即拒绝"""
+
+    def __init__(self, limit, max_queue, timeout):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Busy(429, f"队列已满 ({self.waiting} 个请求排队中)，请稍后重试")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Busy(503, f"排队超过 {self.timeout:.0f}s，服务繁忙")
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        return {"running": self.running, "waiting": self.waiting, "rejected": self.rejected,
+                "limit": self.limit, "max_queue": self.max_queue}
+
+
+query_admission = Admission(API_MAX_CONCURRENT_QUERIES, API_MAX_QUEUED_QUERIES, API_QUEUE_TIMEOUT)
+# 查询在专用线程池中执行 (与 Starlette 默认线程池隔离，避免占满后阻塞其他接口)
+_query_executor = ThreadPoolExecutor(max_workers=API_MAX_CONCURRENT_QUERIES, thread_name_prefix="query")
+
+
+class _AdmittedStream(StreamingResponse):
+    """
+    占用查询并发名额的流式响应：无论正常结束、出错，还是客户端在开始迭代之前就断开 (生成器从未运行，
+    其 finally 不会执行)，都先关闭生成器 (通知工作线程停止并等待其退出)，再释放名额
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                query_admission.release()
+
+
+def _busy_response(e):
+    headers = {"Retry-After": "5"}
+    return JSONResponse({"error": str(e)}, status_code=e.status_code, headers=headers)
+
+
+def _project_exists(name):
+    return bool(name) and name in list_existing_projects()
+
+
+async def _query_events(project, question, trace_id, projects=None):
+    """在工作线程中执行同步的查询流程，通过 asyncio 队列把事件转交给事件循环"""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def worker():
+        try:
+            if projects is not None:
+                events = stream_federated_query(question, projects, cancelled=cancelled, trace_id=trace_id)
+            else:
+                events = stream_query(project, question, cancelled=cancelled, trace_id=trace_id)
+            for event in events:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+        except Exception as e:
+            print(f"❌ [API] 查询失败: {e}")
+            loop.call_soon_threadsafe(queue.put_nowait, {"event": "error", "message": str(e)})
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    future = loop.run_in_executor(_query_executor, worker)
+    try:
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+    finally:
+        # 客户端断开 (生成器被关闭) 时通知工作线程停止，并等待其退出后再释放并发名额
+        # (断开时 Starlette 会取消所在的任务组，需屏蔽取消，否则这里立即返回而工作线程仍在运行)
+        cancelled.set()
+        with anyio.CancelScope(shield=True):
+            await asyncio.shield(future)
+
+
+async def projects(request):
+    registry = get_project_registry().metrics()
+    return JSONResponse({
+        "projects": list_existing_projects(),
+        "loaded": registry["projects"],
+    })
+
+
+async def query(request: Request):
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse({"error": "请求体必须是 JSON"}, status_code=400)
+    if not isinstance(body, dict):
+        return JSONResponse({"error": "请求体必须是 JSON 对象"}, status_code=400)
+    project = body.get("project")
+    # 传入 projects (列表) 时为跨项目查询，空列表表示所有已导入的项目
+    projects = body.get("projects")
+    question = (body.get("question") or "").strip()
+    if not question:
+        return JSONResponse({"error": "缺少 question"}, status_code=400)
+    if projects is not None:
+        if not isinstance(projects, list):
+            return JSONResponse({"error": "projects 必须是项目名列表"}, status_code=400)
+        missing = [name for name in projects if not _project_exists(name)]
+        if missing:
+            return JSONResponse({"error": f"项目不存在: {', '.join(map(str, missing))}"}, status_code=404)
+    elif not _project_exists(project):
+        return JSONResponse({"error": f"项目不存在: {project}"}, status_code=404)
+
+    try:
+        await query_admission.acquire()
+    except Busy as e:
+        return _busy_response(e)
+
+    # trace ID 通过响应头返回，可在 JSON 日志中检索本次查询的全部 span
+    trace_id = new_trace_id()
+    headers = {"X-Trace-Id": trace_id}
+    if body.get("stream"):
+        async def ndjson():
+            events = _query_events(project, question, trace_id, projects)
+            try:
+                async for event in events:
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+            finally:
+                # 显式关闭内层生成器：等工作线程退出后才算结束 (不依赖垃圾回收时的异步清理)
+                await events.aclose()
+        return _AdmittedStream(ndjson(), media_type="application/x-ndjson", headers=headers)
+
+    events = _query_events(project, question, trace_id, projects)
+    try:
+        result = {"answer": "", "sources": [], "cached": False, "stats": {}, "trace_id": trace_id}
+        async for event in events:
+            if event["event"] == "done":
+                result = {k: v for k, v in event.items() if k != "event"}
+            elif event["event"] == "error":
+                return JSONResponse({"error": event["message"], "trace_id": trace_id}, status_code=500, headers=headers)
+        return JSONResponse(result, headers=headers)
+    finally:
+        try:
+            await events.aclose()
+        finally:
+            query_admission.release()
+
+
+async def ingest(request: Request):
+    """提交后台导入任务，立即返回 202 与任务信息；通过 GET /jobs/{id} 轮询进度"""
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse({"error": "请求体必须是 JSON"}, status_code=400)
+    if not isinstance(body, dict):
+        return JSONResponse({"error": "请求体必须是 JSON 对象"}, status_code=400)
+    url = body.get("url", "")
+    if not url:
+        return JSONResponse({"error": "缺少 url"}, status_code=400)
+    try:
+        job, created = get_job_queue().submit(
+            url, force_update=bool(body.get("force")), incremental=bool(body.get("incremental")), ref=body.get("ref")
+        )
+    except JobConflictError as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    # 同一项目已有进行中的任务时不重复导入，返回已有任务
+    return JSONResponse({"job": job, "deduplicated": not created}, status_code=202,
+                        headers={"Location": f"/jobs/{job['id']}"})
+
+
+async def jobs(request):
+    return JSONResponse({"jobs": get_job_queue().list(request.query_params.get("project"))})
+
+
+async def job_detail(request):
+    job = get_job_queue().get(request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"error": "任务不存在"}, status_code=404)
+    return JSONResponse(job)
+
+
+async def health(request):
+    return JSONResponse({"status": "ok"})
+
+
+def _grader_stats():
+    # 与 graph_brain 相同的条件：只用 LLM 评分且不记录样本时快速评分引擎从未使用，不为统计构建它
+    if GRADER_ENGINE != "llm" or GRADER_SAMPLE_LOG:
+        return {"engine": GRADER_ENGINE, **get_fast_grader().stats()}
+    return {"engine": GRADER_ENGINE}
+
+
+async def metrics(request):
+    project_stats = {}
+    for name in get_project_registry().metrics()["projects"]:
+        project_stats[name] = get_answer_cache(name).stats()
+    return JSONResponse({
+        "queries": query_admission.stats(),
+        "ingests": get_job_queue().stats(),
+        "registry": get_project_registry().metrics(),
+        "answer_cache": project_stats,
+        "embedding_cache": get_embedding_cache().stats(),
+        "verdict_cache": get_verdict_cache().stats(),
+        "grader": _grader_stats(),
+        "clients": loaded_clients(),
+        "http": http_stats(),
+        "spans": telemetry_metrics.summary(),
+    })
+
+
+async def prometheus_metrics(request):
+    """Prometheus 文本格式：各节点 / 模型调用 / 导入阶段的耗时直方图、错误数与 Token、文档计数"""
+    return PlainTextResponse(telemetry_metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+app = Starlette(routes=[
+    Route("/health", health),
+    Route("/metrics", metrics),
+    Route("/metrics/prometheus", prometheus_metrics),
+    Route("/projects", projects),
+    Route("/query", query, methods=["POST"]),
+    Route("/ingest", ingest, methods=["POST"]),
+    Route("/jobs", jobs),
+    Route("/jobs/{job_id}", job_detail),
+])
+
+
+def run(host=API_HOST, port=API_PORT):
+    import uvicorn
+    # 模型客户端在后台预先构建，服务立即开始监听
+    warm_up()
+    print(f"🌐 HTTP API 已启动: http://{host}:{port} (查询并发 {API_MAX_CONCURRENT_QUERIES}，排队上限 {API_MAX_QUEUED_QUERIES})")
+    uvicorn.run(app, host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    run()
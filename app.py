@@ -1,10 +1,15 @@
 import streamlit as st
 import os
-from ingest import ingest_project, get_project_name, list_existing_projects
-from local_worker import get_retriever
-from graph_brain import build_graph
+import threading
+from ingest import list_existing_projects
+from job_queue import get_job_queue, format_progress
+from project_registry import get_project_registry
+from answer_cache import ANSWER_CACHE_ENABLED, ANSWER_CACHE_PREWARM, get_answer_cache, prewarm_answers
+from query_service import stream_query, stream_federated_query
+from telemetry import TELEMETRY_LOG_PATH
 # --- 新增引入 ---
 from profiler import generate_suggestions
+from model_clients import warm_up
 
 st.set_page_config(page_title="OpenSource Navigator", page_icon="🧭", layout="wide")
 
@@ -13,13 +18,17 @@ st.title("OpenSource Navigator")
 # --- Session State 初始化 ---
 if "current_project" not in st.session_state:
     st.session_state["current_project"] = None
-if "graph_app" not in st.session_state:
-    st.session_state["graph_app"] = None
 if "messages" not in st.session_state:
     st.session_state["messages"] = []
 # 新增：用于存储建议问题
 if "suggested_questions" not in st.session_state:
     st.session_state["suggested_questions"] = []
+# 当前会话提交的后台导入任务 ID
+if "ingest_job" not in st.session_state:
+    st.session_state["ingest_job"] = None
+# 跨项目检索的项目列表 (空列表为全部项目)，None 表示单项目模式
+if "federated_projects" not in st.session_state:
+    st.session_state["federated_projects"] = None
 
 # 定义一个回调函数，处理点击建议问题
 def set_question(question_text):
@@ -32,16 +41,22 @@ with st.sidebar:
     
     # 辅助函数：加载项目后的通用逻辑
     def load_project_logic(proj_name):
-        db_path = os.path.join("chroma_db_store", proj_name)
-        new_retriever = get_retriever(db_path)
-        st.session_state["graph_app"] = build_graph(new_retriever)
+        # 检索器与 Graph 由进程级缓存持有，所有会话共享，切换回最近用过的项目无需重新加载
+        get_project_registry().get(proj_name)
         st.session_state["current_project"] = proj_name
+        st.session_state["federated_projects"] = None
         st.session_state["messages"] = [{"role": "assistant", "content": f"项目 **{proj_name}** 已就绪！"}]
         
         # --- 关键：调用 Profiler 生成建议 ---
         with st.spinner("🧠 正在查看文档并提供建议..."):
             suggestions = generate_suggestions(proj_name)
             st.session_state["suggested_questions"] = suggestions
+
+        # 后台预先回答建议问题，用户点击时直接命中答案缓存
+        if ANSWER_CACHE_ENABLED and ANSWER_CACHE_PREWARM and suggestions:
+            threading.Thread(
+                target=prewarm_answers, args=(proj_name, suggestions, get_project_registry()), daemon=True
+            ).start()
         
         st.success(f"✅ 已加载: {proj_name}")
 
@@ -53,27 +68,81 @@ with st.sidebar:
                 load_project_logic(selected_project)
                 st.rerun()
 
+        # 跨项目提问：问题并行发往所选项目 (留空为全部) 的索引，合并后统一评分与回答
+        if len(existing_projects) > 1:
+            with st.expander("🌐 跨项目提问"):
+                federated_selection = st.multiselect("参与检索的项目 (留空为全部):", existing_projects)
+                if st.button("🌐 启用跨项目检索", key="btn_federated"):
+                    st.session_state["current_project"] = None
+                    st.session_state["federated_projects"] = federated_selection
+                    scope = "、".join(federated_selection) if federated_selection else "所有已导入项目"
+                    st.session_state["messages"] = [
+                        {"role": "assistant", "content": f"已启用跨项目检索：**{scope}**，回答会标注片段来自哪个项目。"}
+                    ]
+                    st.session_state["suggested_questions"] = []
+                    st.rerun()
+
     with tab2:
         repo_url = st.text_input("GitHub URL:", placeholder="https://github.com/user/repo")
+        repo_ref = st.text_input("分支 / Tag / Commit (可选):", placeholder="默认分支")
         force_update = st.checkbox("强制重新下载并处理")
+        incremental = st.checkbox("增量更新 (只处理有变更的文件)")
         if st.button("📥 开始导入", key="btn_import"):
             if repo_url:
-                proj_name = get_project_name(repo_url)
-                st.info(f"正在处理: {proj_name} ...")
-                db_path, msg = ingest_project(repo_url, force_update=force_update)
-                if db_path:
-                    load_project_logic(proj_name)
-                    st.rerun()
-                else:
-                    st.error(f"❌ 失败: {msg}")
+                # 导入在后台任务中执行，不阻塞界面；同一项目已在导入时复用已有任务
+                try:
+                    job, created = get_job_queue().submit(
+                        repo_url, force_update=force_update, incremental=incremental, ref=repo_ref
+                    )
+                    st.session_state["ingest_job"] = job["id"]
+                    if not created:
+                        st.info(f"项目 {job['project']} 已在导入中，显示已有任务的进度")
+                except ValueError as e:
+                    st.error(f"❌ 失败: {e}")
+
+        # 每秒刷新一次任务进度 (只重跑这一块)，完成后自动加载项目
+        @st.fragment(run_every=1)
+        def ingest_job_status():
+            job_id = st.session_state["ingest_job"]
+            job = get_job_queue().get(job_id) if job_id else None
+            if job is None:
+                return
+            if job["status"] in ("queued", "running"):
+                st.info(f"⏳ 正在处理: {job['project']} — {format_progress(job)}")
+                chunks = job["progress"].get("chunks")
+                if chunks:
+                    st.progress(min(1.0, job["progress"].get("chunks_embedded", 0) / chunks))
+            elif job["status"] == "done":
+                st.session_state["ingest_job"] = None
+                load_project_logic(job["project"])
+                st.rerun()
+            else:
+                st.error(f"❌ 失败: {job['message']}")
+
+        ingest_job_status()
 
     st.markdown("---")
+    federated_projects = st.session_state["federated_projects"]
+    if federated_projects is not None:
+        st.write(f"🟢 当前: **跨项目检索** ({len(federated_projects) or '全部'} 个项目)")
     if st.session_state["current_project"]:
         st.write(f"🟢 当前: **{st.session_state['current_project']}**")
+        if ANSWER_CACHE_ENABLED:
+            cache_stats = get_answer_cache(st.session_state["current_project"]).stats()
+            st.caption(
+                f"⚡ 答案缓存 {cache_stats['entries']} 条，命中率 {cache_stats['hit_rate']:.0%} "
+                f"({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']})"
+            )
+    registry_stats = get_project_registry().metrics()
+    if registry_stats["projects"]:
+        st.caption(
+            f"📦 已加载 {len(registry_stats['projects'])} 个项目 (约 {registry_stats['est_mb']:.0f} MB)，"
+            f"命中率 {registry_stats['hit_rate']:.0%}，淘汰 {registry_stats['evictions']} 次"
+        )
 
 # ================= 主界面 =================
 
-if not st.session_state["graph_app"]:
+if not st.session_state["current_project"] and st.session_state["federated_projects"] is None:
     st.info("👋 欢迎使用Github部署智能顾问")
 else:
     # --- 1. 显示建议问题区 (如果有) ---
@@ -111,29 +180,78 @@ else:
 
         with st.chat_message("assistant"):
             status_container = st.status("🧠 正在思考...", expanded=True)
-            app = st.session_state["graph_app"]
+            # 回答区：生成节点的 Token 到达时逐步刷新
+            answer_placeholder = st.empty()
             final_answer = ""
+            streamed = ""
             
             try:
-                # 运行 Graph
-                for output in app.stream({"question": user_input}):
-                    for key, value in output.items():
-                        if key == "retrieve":
-                            status_container.write(f"🔍 检索到 {len(value['documents'])} 个片段")
-                        elif key == "grade_documents":
-                            n = len(value["documents"])
-                            if n > 0:
-                                status_container.write(f"✅ 保留 {n} 个有效片段")
-                            # 注意：由于兜底机制，这里不再提前结束流程
-                            # 即使评分后文档较少，也会尝试生成回答
-                        elif key == "generate":
+                if st.session_state["federated_projects"] is not None:
+                    events = stream_federated_query(user_input, st.session_state["federated_projects"])
+                else:
+                    events = stream_query(st.session_state["current_project"], user_input)
+                for event in events:
+                    kind = event["event"]
+                    if kind == "cache_hit":
+                        status_container.write(
+                            f"⚡ 命中答案缓存 (相似问题: {event['question']}，相似度 {event['similarity']:.2f})"
+                        )
+                    elif kind == "retrieve":
+                        status_container.write(f"🔍 检索到 {event['documents']} 个片段")
+                        if event.get("projects"):
+                            status_container.write("🌐 " + "，".join(
+                                f"{name} {count} 个" for name, count in event["projects"].items()
+                            ))
+                    elif kind == "grade":
+                        if event["kept"] > 0:
+                            status_container.write(f"✅ 保留 {event['kept']} 个有效片段")
+                        stats = event["stats"]
+                        if stats.get("exact"):
+                            status_container.write(f"🔖 符号索引精确命中 {stats['exact']} 个定义 (无需评分)")
+                        if stats.get("cached"):
+                            status_container.write(f"🗂️ {stats['cached']} 个片段复用了缓存的评分")
+                        if stats.get("fast_graded"):
+                            status_container.write(
+                                f"⚡ 快速评分直接判定 {stats['fast_graded']} 个片段 ({stats['engine']}，无需调用模型)"
+                            )
+                        if stats.get("skipped"):
+                            status_container.write(
+                                f"⏩ 评分 {stats['graded']}/{stats['retrieved']} 个片段后提前结束，"
+                                f"节省 {stats['calls_saved']} 次评分调用"
+                            )
+                        # 注意：由于兜底机制，这里不再提前结束流程
+                        # 即使评分后文档较少，也会尝试生成回答
+                    elif kind == "token":
+                        if not streamed:
                             status_container.write("💡 Agent正在回答...")
-                            final_answer = value["generation"]
-                
+                        streamed += event["content"]
+                        answer_placeholder.markdown(streamed + "▌")
+                    elif kind == "done":
+                        final_answer = event["answer"]
+                        stats = event["stats"]
+                        ctx_stats = stats.get("context")
+                        if ctx_stats:
+                            status_container.write(
+                                f"📦 上下文约 {ctx_stats['tokens']} tokens "
+                                f"(合并去重节省 {ctx_stats['merge_saved']}，"
+                                f"超出预算未发送 {ctx_stats['dropped']} 个片段)"
+                            )
+                        gen_stats = stats.get("generation")
+                        if stats.get("first_token") is not None and gen_stats:
+                            status_container.write(
+                                f"⏱️ 提问到首字 {stats['first_token']:.2f}s，"
+                                f"生成首 Token {gen_stats['ttft']:.2f}s，生成总耗时 {gen_stats['total']:.2f}s"
+                            )
+                        if event.get("trace_id") and TELEMETRY_LOG_PATH:
+                            status_container.caption(f"🔎 Trace ID: `{event['trace_id']}` (可在 {TELEMETRY_LOG_PATH} 中检索)")
+
                 status_container.update(label="完成", state="complete", expanded=False)
                 if final_answer:
-                    st.markdown(final_answer)
+                    answer_placeholder.markdown(final_answer)
                     st.session_state.messages.append({"role": "assistant", "content": final_answer})
             
             except Exception as e:
-                st.error(f"出错: {e}")
\ No newline at end of file
+                st.error(f"出错: {e}")
+
+# 首屏渲染完成后在后台预先构建模型客户端 (每个进程一次)，首个查询无需等待集成库导入
+warm_up()
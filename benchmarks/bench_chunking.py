@@ -0,0 +1,101 @@
+"""
+切分策略对比：legacy (全部按 Python 规则 1500/200 切分) vs language (按文件类型 + Python AST)
+
+指标：
+- 切片数 (= 导入时的向量化次数) 与平均长度
+- 冗余率：切片总字符数 / 源文件总字符数 (重叠带来的重复)
+- 函数完整率：Python 函数/方法的完整源码落在同一个切片内的比例
+- 符号召回@3：用函数名做 BM25 检索，前 3 个切片中包含其 def 的比例 (离线的检索质量近似)
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_chunking --path source_code/<项目名>
+"""
+import os
+import ast
+import argparse
+import random
+
+from chunker import split_document
+from lexical_index import BM25Index
+from scanner import scan_documents
+
+
+def python_functions(source):
+    """返回 [(函数名, 完整源码)]"""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    funcs = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            segment = ast.get_source_segment(source, node)
+            if segment:
+                funcs.append((node.name, segment))
+    return funcs
+
+
+def evaluate(documents, root, strategy, queries):
+    chunks = []
+    for doc in documents:
+        rel_path = os.path.relpath(doc.metadata["source"], root).replace(os.sep, "/")
+        chunks.extend(split_document(doc, rel_path, strategy=strategy))
+
+    source_chars = sum(len(d.page_content) for d in documents)
+    chunk_chars = sum(len(c.page_content) for c in chunks)
+
+    intact = total = 0
+    for doc in documents:
+        if not doc.metadata["source"].endswith(".py"):
+            continue
+        file_chunks = [c.page_content for c in chunks if c.metadata.get("source") == doc.metadata["source"]]
+        for _, segment in python_functions(doc.page_content):
+            total += 1
+            if any(segment in c for c in file_chunks):
+                intact += 1
+
+    index = BM25Index()
+    for i, chunk in enumerate(chunks):
+        index.add(str(i), chunk.page_content)
+    hits = 0
+    for name in queries:
+        top = index.search(name, k=3)
+        if any(f"def {name}" in chunks[int(doc_id)].page_content for doc_id, _ in top):
+            hits += 1
+
+    return {
+        "strategy": strategy,
+        "chunks": len(chunks),
+        "avg_chars": chunk_chars / len(chunks) if chunks else 0,
+        "redundancy": chunk_chars / source_chars if source_chars else 0,
+        "function_intact": intact / total if total else 0,
+        "symbol_recall@3": hits / len(queries) if queries else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="切分策略对比 (切片数 / 冗余 / 检索质量)")
+    parser.add_argument("--path", default=".", help="要分析的源码目录 (默认当前目录)")
+    parser.add_argument("--queries", type=int, default=200, help="抽样的函数名查询数")
+    args = parser.parse_args()
+
+    documents = list(scan_documents(args.path))
+    names = sorted({
+        name for d in documents if d.metadata["source"].endswith(".py")
+        for name, _ in python_functions(d.page_content) if not name.startswith("__")
+    })
+    random.Random(0).shuffle(names)
+    queries = names[:args.queries]
+
+    print(f"📊 {len(documents)} 个文件，{len(queries)} 个函数名查询")
+    print(f"{'策略':<10}{'切片数':>8}{'平均长度':>10}{'冗余率':>8}{'函数完整率':>12}{'符号召回@3':>12}")
+    for strategy in ("legacy", "language"):
+        r = evaluate(documents, args.path, strategy, queries)
+        print(
+            f"{r['strategy']:<10}{r['chunks']:>8}{r['avg_chars']:>10.0f}{r['redundancy']:>8.2f}"
+            f"{r['function_intact']:>12.1%}{r['symbol_recall@3']:>12.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+克隆模式对比：在临时目录中用样例仓库生成一个带历史的本地上游仓库 (以及它的一个 Fork)，
+通过 file:// 地址分别以 完整克隆 / 浅克隆 / 部分克隆 / 本地缓存 导入，统计各阶段耗时与下载的对象大小
+
+- 完全离线，不访问网络；file:// 地址通过 ALLOW_LOCAL_REPOS 放行
+- 历史中反复改写一个较大的文件，完整克隆需要下载全部历史版本，浅克隆只下载最新版本
+- 缓存模式依次执行：首次克隆上游 -> 重新克隆上游 -> 克隆 Fork，后两次只应拉取新增对象
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_clone
+    python -m benchmarks.bench_clone --commits 50 --file-kb 512
+"""
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "sample_repo")
+
+
+def git(*args):
+    subprocess.run(["git", *args], check=True, capture_output=True)
+
+
+def make_upstream(root, commits, file_kb):
+    """样例仓库 + commits 个提交，每个提交改写一个 file_kb 大小的数据文件 (随机内容，几乎不可压缩)"""
+    path = os.path.join(root, "upstream")
+    shutil.copytree(FIXTURE, path)
+    git("-C", path, "init", "-q")
+    git("-C", path, "config", "user.email", "bench@example.com")
+    git("-C", path, "config", "user.name", "bench")
+    # 允许部分克隆 (本地仓库默认不支持过滤器)
+    git("-C", path, "config", "uploadpack.allowFilter", "true")
+    rng = random.Random(0)
+    for i in range(commits):
+        with open(os.path.join(path, "data.txt"), "w", encoding="utf-8") as f:
+            f.write("".join(rng.choice("abcdefghijklmnopqrstuvwxyz\n") for _ in range(file_kb * 1024)))
+        git("-C", path, "add", "-A")
+        git("-C", path, "commit", "-q", "-m", f"commit {i}")
+
+    fork = os.path.join(root, "fork")
+    git("clone", "-q", path, fork)
+    git("-C", fork, "config", "user.email", "bench@example.com")
+    git("-C", fork, "config", "user.name", "bench")
+    with open(os.path.join(fork, "FORK.md"), "w", encoding="utf-8") as f:
+        f.write("# fork\n")
+    git("-C", fork, "add", "-A")
+    git("-C", fork, "commit", "-q", "-m", "fork commit")
+    return path, fork
+
+
+def run_clone(url, target, ref=None):
+    import git_fetch
+    shutil.rmtree(target, ignore_errors=True)
+    start = time.perf_counter()
+    stats = git_fetch.clone_source(url, target, ref)
+    return time.perf_counter() - start, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="克隆模式对比 (本地 file:// 仓库)")
+    parser.add_argument("--commits", type=int, default=20, help="上游仓库的提交数")
+    parser.add_argument("--file-kb", type=int, default=256, help="每个提交改写的数据文件大小 (KB)")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="navigator-clone-")
+    upstream, fork = make_upstream(root, args.commits, args.file_kb)
+    os.chdir(root)
+    print(f"📂 临时目录: {root} (上游 {args.commits} 个提交)")
+
+    import git_fetch
+    modes = [
+        ("完整克隆", {"CLONE_DEPTH": 0, "CLONE_FILTER": "", "CLONE_CACHE_ENABLED": False}),
+        ("浅克隆 depth=1", {"CLONE_DEPTH": 1, "CLONE_FILTER": "", "CLONE_CACHE_ENABLED": False}),
+        ("部分克隆 blob:none", {"CLONE_DEPTH": 0, "CLONE_FILTER": "blob:none", "CLONE_CACHE_ENABLED": False}),
+    ]
+    rows = []
+    for label, settings in modes:
+        for key, value in settings.items():
+            setattr(git_fetch, key, value)
+        rows.append((label, *run_clone(f"file://{upstream}", os.path.join(root, "work"))))
+
+    # 缓存模式：所有项目共用一个裸仓库
+    git_fetch.CLONE_DEPTH, git_fetch.CLONE_FILTER, git_fetch.CLONE_CACHE_ENABLED = 1, "", True
+    git_fetch.CLONE_CACHE_DIR = os.path.join(root, "git_cache", "objects.git")
+    rows.append(("缓存: 首次克隆", *run_clone(f"file://{upstream}", os.path.join(root, "work"))))
+    rows.append(("缓存: 重新克隆", *run_clone(f"file://{upstream}", os.path.join(root, "work"))))
+    rows.append(("缓存: 克隆 Fork", *run_clone(f"file://{fork}", os.path.join(root, "work-fork"))))
+
+    # 固定到第一个提交
+    first = subprocess.run(["git", "-C", upstream, "rev-list", "--max-parents=0", "HEAD"],
+                           check=True, capture_output=True, text=True).stdout.strip()
+    git_fetch.CLONE_CACHE_ENABLED = False
+    rows.append(("浅克隆 固定 commit", *run_clone(f"file://{upstream}", os.path.join(root, "work"), first)))
+
+    print(f"\n{'模式':<20}{'总耗时':>10}{'下载':>12}   各阶段")
+    for label, seconds, stats in rows:
+        total = sum(s["bytes"] for s in stats.values())
+        print(f"{label:<20}{seconds:>9.2f}s{total / 1024 / 1024:>10.2f}MB   {git_fetch.format_stats(stats)}")
+    shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+上下文组装压测：对比 直接拼接 与 context_packer (合并重叠、去重、Token 预算) 发送给云端模型的 Token 数
+
+做法：对源码目录切分并建立 BM25 索引，用抽样的函数名作为问题，
+取每个问题的 Top-K 切片 (模拟评分后保留的文档)，统计两种组装方式的估算 Token 数
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_context --path source_code/<项目名> --top-k 10 --budget 5000
+"""
+import os
+import argparse
+import random
+
+from chunker import split_document
+from context_packer import pack_context
+from grader import estimate_tokens
+from ingest import assign_chunk_ids
+from lexical_index import BM25Index
+from scanner import scan_documents
+from benchmarks.bench_chunking import python_functions
+
+
+def load_chunks(root, strategy):
+    chunks = []
+    for doc in scan_documents(root):
+        rel_path = os.path.relpath(doc.metadata["source"], root).replace(os.sep, "/")
+        file_chunks = split_document(doc, rel_path, strategy=strategy)
+        assign_chunk_ids(file_chunks, root)
+        chunks.extend(file_chunks)
+    return chunks
+
+
+def evaluate(chunks, queries, top_k, budget):
+    index = BM25Index()
+    for i, chunk in enumerate(chunks):
+        index.add(str(i), chunk.page_content)
+    naive = merged = packed = dropped = 0
+    for query in queries:
+        docs = [chunks[int(doc_id)] for doc_id, _ in index.search(query, k=top_k)]
+        naive += estimate_tokens("\n\n".join(d.page_content for d in docs))
+        merged += pack_context(docs, budget=0)[1]["tokens"]
+        _, stats = pack_context(docs, budget=budget)
+        packed += stats["tokens"]
+        dropped += stats["dropped"]
+    n = len(queries) or 1
+    return naive / n, merged / n, packed / n, dropped / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上下文组装 Token 对比")
+    parser.add_argument("--path", default=".", help="要分析的源码目录 (默认当前目录)")
+    parser.add_argument("--queries", type=int, default=100, help="抽样的函数名查询数")
+    parser.add_argument("--top-k", type=int, default=10, help="每个问题保留的切片数")
+    parser.add_argument("--budget", type=int, default=5000, help="Token 预算")
+    args = parser.parse_args()
+
+    documents = list(scan_documents(args.path))
+    names = sorted({
+        name for d in documents if d.metadata["source"].endswith(".py")
+        for name, _ in python_functions(d.page_content) if not name.startswith("__")
+    })
+    random.Random(0).shuffle(names)
+    queries = names[:args.queries]
+
+    print(f"📊 {len(queries)} 个查询，每个取 Top-{args.top_k}，预算 {args.budget} tokens (均为每次查询的平均值)")
+    print(f"{'切分策略':<10}{'直接拼接':>10}{'合并去重':>10}{'预算内':>10}{'丢弃片段':>10}")
+    for strategy in ("legacy", "language"):
+        naive, merged, packed, dropped = evaluate(load_chunks(args.path, strategy), queries, args.top_k, args.budget)
+        print(f"{strategy:<10}{naive:>10.0f}{merged:>10.0f}{packed:>10.0f}{dropped:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
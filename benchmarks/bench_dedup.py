@@ -0,0 +1,135 @@
+"""
+导入去重压测：在示例仓库中加入 vendored 副本 (完全相同) 与复制后略作修改的示例 (近似重复)，
+分别在关闭 / 开启去重时导入，对比写入向量库的切片数、实际向量化的文本数、向量化与导入耗时，
+以及检索结果 Top-10 中被重复内容占用的位置与 recall@10 (别名路径同样算作命中)
+
+- 两次导入前都清空向量缓存，避免第二次导入直接命中缓存
+- 假 Ollama 的每次向量化请求有固定延迟 (--embed-latency)，批次调小 (INGEST_BATCH_SIZE=8) 使向量化耗时与切片数成正比
+
+不需要 Ollama / Kimi：使用假服务 (见 benchmarks/offline_env.py)
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_dedup --vendored 2 --forks 2 --embed-latency 0.05
+"""
+import os
+import re
+import json
+import time
+import shutil
+import argparse
+import statistics
+
+from benchmarks.offline_env import start_offline_backends
+from benchmarks.bench_pipeline import SAMPLE_REPO, GOLDEN_QUESTIONS
+
+
+def fork_file(text, n):
+    """复制后略作修改：加一行来源说明，改掉第一个较长的字符串字面量 (模拟复制到 examples/ 后的小改动)"""
+    text = re.sub(r'"([^"\n]{8,})"', lambda m: f'"{m.group(1)} (fork {n})"', text, count=1)
+    return f"# Copied from weather (fork {n})\n" + text
+
+
+def build_repo(workdir, vendored, forks):
+    """示例仓库 + vendor/ 下的完全相同副本 + examples/ 下略作修改的副本"""
+    target = os.path.join(workdir, "dedup_repo")
+    shutil.copytree(SAMPLE_REPO, target, ignore=shutil.ignore_patterns("__pycache__"))
+    package = os.path.join(SAMPLE_REPO, "weather")
+    for i in range(vendored):
+        shutil.copytree(package, os.path.join(target, "vendor", f"weather_{i}"),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+    for i in range(forks):
+        for dirpath, dirnames, filenames in os.walk(package):
+            dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+            for name in filenames:
+                rel_path = os.path.relpath(os.path.join(dirpath, name), package)
+                path = os.path.join(target, "examples", f"fork_{i}", rel_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(os.path.join(dirpath, name), "r", encoding="utf-8") as src:
+                    text = src.read()
+                with open(path, "w", encoding="utf-8") as dst:
+                    dst.write(fork_file(text, i))
+    return target
+
+
+def run_ingest(source_path, project, enabled):
+    import ingest
+    from embedding_cache import get_embedding_cache
+    from flat_store import open_vector_store
+    from model_clients import get_client
+
+    cache = get_embedding_cache()
+    cache.clear()
+    before = cache.stats()
+    ingest.DEDUP_ENABLED = enabled
+    db_path = os.path.join(ingest.DB_ROOT, project)
+    start = time.perf_counter()
+    n_chunks = ingest.index_source_tree(source_path, db_path, f"file://{source_path}")
+    elapsed = time.perf_counter() - start
+    after = cache.stats()
+    store = open_vector_store(db_path, get_client("embeddings"))
+    stored = len(store.get(include=[])["ids"])
+    with open(os.path.join(db_path, ingest.MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+        duplicates = json.load(f).get("duplicates", {})
+    return {"chunks": n_chunks, "stored": stored, "embedded": after["misses"] - before["misses"],
+            "elapsed": elapsed, "duplicates": len(duplicates), "db_path": db_path}
+
+
+def crowding(documents, k=10):
+    """Top-k 中与排名更靠前的片段重复 (完全相同或近似) 的位置数"""
+    from dedup import Deduper
+    deduper = Deduper()
+    return sum(deduper.check(str(i), d.page_content) is not None for i, d in enumerate(documents[:k]))
+
+
+def hits(relevant, documents, k=10):
+    """前 k 个片段覆盖到的相关文件比例：片段所在文件与其别名路径都算"""
+    from context_packer import source_label
+    found = set()
+    for doc in documents[:k]:
+        found.add(source_label(doc))
+        found.update(doc.metadata.get("aliases") or ())
+    return len(relevant & found) / len(relevant)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导入去重压测 (假 Ollama / 假 Kimi)")
+    parser.add_argument("--vendored", type=int, default=2, help="vendor/ 下完全相同的副本数")
+    parser.add_argument("--forks", type=int, default=2, help="examples/ 下略作修改的副本数")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="假 Ollama 每次向量化请求的延迟 (秒)")
+    args = parser.parse_args()
+
+    workdir = start_offline_backends(
+        embed_latency=args.embed_latency, prefix="navigator-dedup-",
+        env={"ANSWER_CACHE_ENABLED": "false", "TELEMETRY_CONSOLE": "false", "INGEST_BATCH_SIZE": "8"},
+    )
+    from local_worker import get_retriever
+
+    source_path = build_repo(workdir, args.vendored, args.forks)
+    with open(GOLDEN_QUESTIONS, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+
+    results = {}
+    for name, enabled in (("关闭去重", False), ("开启去重", True)):
+        result = run_ingest(source_path, "dedup_on" if enabled else "dedup_off", enabled)
+        retriever = get_retriever(result["db_path"])
+        recalls, crowded = [], []
+        for item in golden:
+            documents = retriever.invoke(item["question"])
+            recalls.append(hits(set(item["relevant"]), documents))
+            crowded.append(crowding(documents))
+        result.update(recall=statistics.mean(recalls), crowded=statistics.mean(crowded))
+        results[name] = result
+
+    print(f"\n📦 示例仓库 + {args.vendored} 个 vendored 副本 + {args.forks} 个修改过的副本，"
+          f"每次向量化请求延迟 {args.embed_latency * 1000:.0f}ms")
+    print(f"{'':<10}{'切片':>6}{'写入':>6}{'重复':>6}{'向量化文本':>10}{'导入耗时':>10}{'Top10 重复位':>12}{'recall@10':>11}")
+    for name, r in results.items():
+        print(f"{name:<8}{r['chunks']:>8}{r['stored']:>8}{r['duplicates']:>8}{r['embedded']:>14}"
+              f"{r['elapsed']:>13.2f}s{r['crowded']:>14.1f}{r['recall']:>11.3f}")
+    off, on = results["关闭去重"], results["开启去重"]
+    print(f"\n🧬 去重移除 {off['stored'] - on['stored']} 个切片 ({1 - on['stored'] / off['stored']:.0%})，"
+          f"少向量化 {off['embedded'] - on['embedded']} 段文本，导入耗时 {off['elapsed']:.2f}s -> {on['elapsed']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+跨项目检索压测：把示例仓库拆成多个项目分别导入，对比 逐个项目串行检索 与 并行的跨项目检索 的耗时，
+以及跨项目合并后的召回率 (与整个仓库作为单个项目时对比)
+
+- 每个项目可以模拟不同的检索延迟 (--shard-latency，依次分配给各项目)，用来观察耗时取决于最慢的项目而不是总和
+- 最后用一个问题走完整的 检索 -> 评分 -> 生成 流程 (stream_federated_query)
+
+不需要 Ollama / Kimi：使用假服务 (见 benchmarks/offline_env.py)
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_federated --projects 4 --shard-latency 0.02,0.05,0.1,0.2
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import statistics
+
+from benchmarks.offline_env import start_offline_backends
+from benchmarks.bench_pipeline import SAMPLE_REPO, GOLDEN_QUESTIONS, recall
+
+WHOLE_PROJECT = "whole_repo"
+
+
+class DelayedRetriever:
+    """给项目的检索器加上固定延迟 (模拟较大 / 较慢的项目索引)"""
+
+    def __init__(self, retriever, delay):
+        self.retriever = retriever
+        self.vectorstore = retriever.vectorstore
+        self.delay = delay
+
+    def invoke(self, query):
+        time.sleep(self.delay)
+        return self.retriever.invoke(query)
+
+
+def split_repo(n_projects, workdir):
+    """把示例仓库的文件轮流分配到 n 个项目目录，返回 (项目名列表, 相对路径 -> 项目名)"""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(SAMPLE_REPO):
+        dirnames[:] = sorted(d for d in dirnames if d != "__pycache__")
+        files.extend(os.path.relpath(os.path.join(dirpath, f), SAMPLE_REPO).replace(os.sep, "/")
+                     for f in sorted(filenames))
+    names = [f"shard_{i}" for i in range(n_projects)]
+    owner = {}
+    for i, rel_path in enumerate(files):
+        name = names[i % n_projects]
+        owner[rel_path] = name
+        target = os.path.join(workdir, "sources", name, rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy(os.path.join(SAMPLE_REPO, rel_path), target)
+    return names, owner
+
+
+def main():
+    parser = argparse.ArgumentParser(description="跨项目检索压测 (假 Ollama / 假 Kimi)")
+    parser.add_argument("--projects", type=int, default=4, help="拆分出的项目数")
+    parser.add_argument("--shard-latency", default="0.02,0.05,0.1,0.2",
+                        help="各项目模拟的检索延迟 (秒，逗号分隔，依次分配)")
+    args = parser.parse_args()
+    latencies = [float(x) for x in args.shard_latency.split(",") if x.strip()] or [0.0]
+
+    workdir = start_offline_backends(env={"ANSWER_CACHE_ENABLED": "false", "TELEMETRY_CONSOLE": "false"},
+                                     prefix="navigator-federated-")
+    from ingest import DB_ROOT, index_source_tree
+    from project_registry import ProjectRegistry, load_project
+    from federated import FederatedRetriever
+    from query_service import stream_federated_query
+
+    names, owner = split_repo(args.projects, workdir)
+    for name in names:
+        index_source_tree(os.path.join(workdir, "sources", name), os.path.join(DB_ROOT, name), f"file://{name}")
+    # 对照：整个仓库作为单个项目
+    index_source_tree(SAMPLE_REPO, os.path.join(DB_ROOT, WHOLE_PROJECT), f"file://{SAMPLE_REPO}")
+    delays = {name: latencies[i % len(latencies)] for i, name in enumerate(names)}
+
+    def loader(name):
+        project = load_project(name)
+        project.retriever = DelayedRetriever(project.retriever, delays.get(name, 0.0))
+        return project
+
+    with open(GOLDEN_QUESTIONS, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    registry = ProjectRegistry(max_projects=len(names) + 1, loader=loader)
+    retriever = FederatedRetriever(registry=registry, projects=names)
+
+    start = time.perf_counter()
+    retriever.invoke(golden[0]["question"])
+    cold = time.perf_counter() - start
+
+    sequential, federated, recalls, whole_recalls = [], [], [], []
+    for item in golden:
+        start = time.perf_counter()
+        for name in names:
+            with registry.use(name) as project:
+                project.retriever.invoke(item["question"])
+        sequential.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        documents = retriever.invoke(item["question"])
+        federated.append(time.perf_counter() - start)
+        relevant = {f"{owner[path]}:{path}" for path in item["relevant"]}
+        recalls.append(recall(relevant, documents, 10))
+        with registry.use(WHOLE_PROJECT) as project:
+            whole_recalls.append(recall(set(item["relevant"]), project.retriever.invoke(item["question"]), 10))
+
+    print(f"\n🌐 {len(names)} 个项目，模拟检索延迟 " + "，".join(f"{n} {d * 1000:.0f}ms" for n, d in delays.items()))
+    print(f"首次查询 (并行加载所有项目): {cold:.2f}s")
+    print(f"逐个项目串行检索 p50: {statistics.median(sequential) * 1000:7.0f}ms")
+    print(f"跨项目并行检索 p50:   {statistics.median(federated) * 1000:7.0f}ms "
+          f"(最慢的项目 {max(delays.values()) * 1000:.0f}ms + 检索)")
+    print(f"跨项目 recall@10: {statistics.mean(recalls):.3f} (整个仓库作为单个项目: {statistics.mean(whole_recalls):.3f})")
+
+    question = golden[1]["question"]
+    for event in stream_federated_query(question, names, registry=registry):
+        if event["event"] == "retrieve":
+            print(f"\n❓ {question}\n🔍 检索 {event['documents']} 个片段: {event.get('projects')}")
+        elif event["event"] == "done":
+            print(f"📎 引用: {', '.join(sorted({s['source'] for s in event['sources']}))}")
+            print(f"✅ 完整流程耗时 {event['stats']['total']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+评分引擎对比：llm / fast / cascade (离线，模型由假服务代替)
+
+流程：导入样例仓库 -> 对每个黄金问题检索 -> 用 LLM 评分作为参照标签 ->
+按问题分成两半交叉校准 (一半的样本校准阈值，另一半评估) -> 各引擎分别评分
+指标：与 LLM 评分的一致率、每个问题的模型调用次数、评分耗时 p50、评分后保留片段的召回率
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_grader_engines
+    python -m benchmarks.bench_grader_engines --grade-latency 0.2
+"""
+import os
+import time
+import argparse
+
+from benchmarks.offline_env import start_offline_backends
+from benchmarks.bench_pipeline import SAMPLE_REPO, GOLDEN_QUESTIONS, PROJECT, percentile, recall
+
+ENGINES = ("llm", "fast", "cascade")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评分引擎对比 (离线)")
+    parser.add_argument("--grade-latency", type=float, default=0.05, help="假评分模型单次调用的延迟 (秒)")
+    args = parser.parse_args()
+
+    start_offline_backends(grade_latency=args.grade_latency, env={
+        "TELEMETRY_CONSOLE": "false", "GRADER_SAMPLE_LOG": "false", "VERDICT_CACHE_ENABLED": "false",
+    })
+    import json
+    import numpy as np
+    from ingest import DB_ROOT, index_source_tree
+    from local_worker import get_retriever, get_grader_chain, get_query_embeddings
+    from grader import run_grader, select_documents, _grade, GRADER_MAX_WORKERS
+    from fast_grader import FastGrader, calibrate, save_calibration, FEATURES, _GRADE_LABELS
+
+    db_path = os.path.join(DB_ROOT, PROJECT)
+    index_source_tree(SAMPLE_REPO, db_path, f"file://{SAMPLE_REPO}")
+    retriever = get_retriever(db_path)
+    grader_chain = get_grader_chain()
+    with open(GOLDEN_QUESTIONS, encoding="utf-8") as f:
+        golden = json.load(f)
+
+    # 参照标签：LLM 对每个问题检索结果的评分 (与 Graph 一致，跳过符号索引精确命中的切片)
+    probe = FastGrader(embeddings=get_query_embeddings(), calibration_path="", sample_log=False)
+    cases = []
+    for item in golden:
+        docs = [d for d in retriever.invoke(item["question"]) if not d.metadata.get("symbol_match")]
+        labels = _grade(item["question"], docs, grader_chain, None, GRADER_MAX_WORKERS, 1)[0]
+        cases.append((item, docs, labels, probe.features(item["question"], docs)))
+
+    results = {engine: {"agree": 0, "total": 0, "calls": [], "seconds": [], "kept": []} for engine in ENGINES}
+    calibrations = []
+    folds = [cases[0::2], cases[1::2]]
+    for fold, (train, test) in enumerate([(folds[0], folds[1]), (folds[1], folds[0])]):
+        features = np.vstack([c[3] for c in train]).reshape(-1, len(FEATURES))
+        labels = np.asarray([_GRADE_LABELS[g] for c in train for g in c[2]])
+        calibration = calibrate(features, labels)
+        calibrations.append(calibration)
+        path = os.path.abspath(f"grader_calibration_{fold}.json")
+        save_calibration(calibration, path)
+        fast_grader = FastGrader(embeddings=get_query_embeddings(), calibration_path=path, sample_log=False)
+        for item, docs, reference, _ in test:
+            for engine in ENGINES:
+                start = time.perf_counter()
+                ordered, grades, stats = run_grader(
+                    item["question"], docs, grader_chain, None, strategy="full",
+                    engine=engine, fast_grader=fast_grader
+                )
+                r = results[engine]
+                r["seconds"].append(time.perf_counter() - start)
+                r["calls"].append(stats["grader_calls"])
+                r["agree"] += sum(1 for a, b in zip(grades, reference) if a == b)
+                r["total"] += len(reference)
+                r["kept"].append(recall(set(item["relevant"]), select_documents(ordered, grades)))
+
+    print(f"\n📐 交叉校准 ({len(cases)} 个问题，两折)：")
+    for i, c in enumerate(calibrations):
+        print(f"   折 {i}: 权重 {c['weights']}，partial {c['partial']:.3f} / yes {c['yes']:.3f}，"
+              f"cascade <{c['cascade_no']:.3f} / >={c['cascade_yes']:.3f}，训练集一致率 {c['agreement']:.1%}")
+    print(f"\n{'引擎':<10}{'一致率':>8}{'调用/问题':>10}{'评分p50':>10}{'保留召回':>10}")
+    for engine in ENGINES:
+        r = results[engine]
+        print(f"{engine:<10}{r['agree'] / r['total']:>9.1%}{np.mean(r['calls']):>11.1f}"
+              f"{percentile(r['seconds'], 50) * 1000:>9.0f}ms{np.mean(r['kept']):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+评分引擎压测：对比 逐篇串行 / 并发 / 多文档批量 三种评分方式的耗时，以及重复提问时评分缓存的效果
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_grading --docs 50 --latency 0.2 --workers 8 --batch-size 5
+"""
+import os
+import argparse
+import tempfile
+import time
+from langchain_core.documents import Document
+
+from grader import grade_documents_concurrent, select_documents
+from verdict_cache import VerdictCache
+from benchmarks.stubs import CallCounter, make_stub_grader, make_stub_batch_grader
+
+QUESTION = "如何配置 OLLAMA_BASE_URL 环境变量 和 build_graph"
+
+
+def make_documents(n):
+    """构造 n 个模拟检索片段，其中一部分与问题相关"""
+    docs = []
+    for i in range(n):
+        if i % 7 == 0:
+            text = f"OLLAMA_BASE_URL = os.getenv(...)  # chunk {i} build_graph 配置"
+        elif i % 5 == 0:
+            text = f"def build_graph(retriever): ...  # chunk {i}"
+        else:
+            text = f"def helper_{i}(x): return x * {i}"
+        docs.append(Document(page_content=text, metadata={"source": f"file_{i}.py"}))
+    return docs
+
+
+def run_case(name, documents, grader_chain, batch_chain, counter, workers, batch_size,
+             verdicts=None, question=QUESTION):
+    counter.calls = 0
+    start = time.perf_counter()
+    grades = grade_documents_concurrent(
+        question, documents, grader_chain, batch_chain,
+        max_workers=workers, batch_size=batch_size, verdicts=verdicts
+    )
+    elapsed = time.perf_counter() - start
+    selected = select_documents(documents, grades)
+    print(f"{name:<12} {elapsed:8.2f}s  LLM 调用 {counter.calls:3d} 次  保留 {len(selected)} 个文档")
+    return elapsed, grades
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grader 并发/批量评分压测 (Stub LLM)")
+    parser.add_argument("--docs", type=int, default=50, help="检索到的文档数 (默认 50)")
+    parser.add_argument("--latency", type=float, default=0.2, help="单次模型调用的模拟延迟 (秒)")
+    parser.add_argument("--per-doc-latency", type=float, default=0.05, help="批量模式中每篇文档的额外延迟 (秒)")
+    parser.add_argument("--workers", type=int, default=8, help="并发度")
+    parser.add_argument("--batch-size", type=int, default=5, help="多文档模式每个 Prompt 的文档数")
+    args = parser.parse_args()
+
+    documents = make_documents(args.docs)
+
+    counter = CallCounter()
+    single = make_stub_grader(args.latency, counter=counter)
+    batch = make_stub_batch_grader(args.latency, args.per_doc_latency, counter=counter)
+
+    print(f"📊 文档数 {args.docs}，单次延迟 {args.latency}s，并发 {args.workers}，批量 {args.batch_size}")
+    base, base_grades = run_case("串行", documents, single, None, counter, 1, 1)
+    conc, conc_grades = run_case("并发", documents, single, None, counter, args.workers, 1)
+    bat, bat_grades = run_case("并发+批量", documents, single, batch, counter, args.workers, args.batch_size)
+
+    # 评分缓存：首次提问写入缓存，换一种写法重复提问时直接命中
+    with tempfile.TemporaryDirectory() as tmp:
+        verdicts = VerdictCache(os.path.join(tmp, "verdicts.sqlite")).scoped("stub", "1")
+        run_case("缓存-首次", documents, single, None, counter, args.workers, 1, verdicts)
+        cached, cached_grades = run_case(
+            "缓存-重复", documents, single, None, counter, args.workers, 1, verdicts, QUESTION + "？"
+        )
+
+    assert conc_grades == base_grades and bat_grades == base_grades, "评分结果不一致"
+    assert cached_grades == base_grades, "缓存评分结果不一致"
+    print(
+        f"🚀 加速比: 并发 {base / conc:.1f}x，并发+批量 {base / bat:.1f}x，"
+        f"重复提问 (评分缓存) {base / max(cached, 1e-6):.0f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+HTTP 连接层压测：在注入 429 / 503 的假 Ollama / 假 OpenAI 服务上，对比 直连 与 经过 http_clients 共享层 的
+失败请求数、服务端观察到的并发峰值、重试次数与实际请求速率
+
+- 直连：每个客户端自带连接池，没有并发上限，429 / 503 直接变成调用失败
+- 共享层：并发不超过 --concurrency，失败的请求退避后重试；--rate 开启令牌桶限速
+- 流式生成在整个输出期间占用并发名额，结束后归还
+
+不需要 Ollama / Kimi，模型调用全部发往本地假服务
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_http_clients --requests 120 --threads 16 --concurrency 4 --rate 40
+"""
+import os
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# 重试退避在 http_clients 导入时读取，压测中缩短以免等待过久
+os.environ.setdefault("HTTP_RETRY_BASE_DELAY", "0.05")
+os.environ.setdefault("TELEMETRY_CONSOLE", "false")
+
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+from langchain_openai import ChatOpenAI
+import httpx
+
+from http_clients import Backend, LimitedTransport
+from benchmarks.fake_ollama_server import start_server as start_ollama
+from benchmarks.fake_openai_server import start_server as start_openai
+
+
+def ollama_clients(base_url, transport=None):
+    kwargs = {"sync_client_kwargs": {"transport": transport}} if transport else {}
+    return (ChatOllama(model="fake", base_url=base_url, format="json", **kwargs),
+            OllamaEmbeddings(model="fake", base_url=base_url, **kwargs))
+
+
+def openai_client(base_url, transport=None):
+    if transport:
+        return ChatOpenAI(model="fake", api_key="fake", base_url=base_url, max_retries=0,
+                          http_client=httpx.Client(transport=transport))
+    return ChatOpenAI(model="fake", api_key="fake", base_url=base_url, max_retries=0)
+
+
+def run_load(calls, n_requests, threads):
+    """并发执行 n_requests 次调用 (轮流使用 calls 中的函数)，返回 (失败数, 耗时)"""
+    def one(i):
+        try:
+            calls[i % len(calls)]()
+            return 0
+        except Exception:
+            return 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        failures = sum(pool.map(one, range(n_requests)))
+    return failures, time.perf_counter() - start
+
+
+def run_case(name, kind, args, backend=None):
+    if kind == "ollama":
+        server, base_url = start_ollama(0, chat_latency=args.latency, fail_every=args.fail_every)
+        llm, embeddings = ollama_clients(base_url, LimitedTransport(backend) if backend else None)
+        calls = [lambda: llm.invoke("ping"), lambda: embeddings.embed_query("ping")]
+    else:
+        server, base_url = start_openai(0, first_token_delay=args.latency, token_interval=0.001,
+                                        fail_every=args.fail_every)
+        llm = openai_client(base_url, LimitedTransport(backend) if backend else None)
+        calls = [lambda: "".join(chunk.content for chunk in llm.stream("ping"))]
+
+    failures, elapsed = run_load(calls, args.requests, args.threads)
+    server.shutdown()
+    faults = server.faults.stats()
+    retries = backend.stats()["retries"] if backend else 0
+    print(f"{name:<22}{failures:>6}{faults['peak_in_flight']:>10}{faults['injected']:>8}{retries:>8}"
+          f"{elapsed:>9.2f}s{faults['requests'] / elapsed:>10.1f}")
+    if backend:
+        assert backend.stats()["in_flight"] == 0, "并发名额未全部归还"
+    return {"failures": failures, "peak": faults["peak_in_flight"], "elapsed": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 连接层压测 (并发上限 / 限速 / 重试)")
+    parser.add_argument("--requests", type=int, default=120, help="每个场景的调用次数")
+    parser.add_argument("--threads", type=int, default=16, help="发起调用的线程数")
+    parser.add_argument("--concurrency", type=int, default=4, help="共享层的并发上限")
+    parser.add_argument("--rate", type=float, default=40, help="限速场景的每秒请求数")
+    parser.add_argument("--latency", type=float, default=0.02, help="假服务每次调用的延迟 (秒)")
+    parser.add_argument("--fail-every", type=int, default=5, help="每 N 个请求注入一次 429 / 503")
+    args = parser.parse_args()
+    # 追踪日志等运行时文件写在临时工作目录，不污染项目目录 (与 offline_env 一致)
+    os.chdir(tempfile.mkdtemp(prefix="navigator-http-"))
+
+    print(f"{'场景':<20}{'失败':>6}{'并发峰值':>8}{'注入':>6}{'重试':>6}{'耗时':>10}{'请求/秒':>8}")
+    direct = run_case("ollama 直连", "ollama", args)
+    shared = run_case("ollama 共享层", "ollama", args, Backend("ollama", args.concurrency, 0))
+    limited = run_case("ollama 共享层+限速", "ollama", args, Backend("ollama", args.concurrency, args.rate))
+    run_case("kimi 流式直连", "kimi", args)
+    kimi = run_case("kimi 流式共享层", "kimi", args, Backend("kimi", args.concurrency, 0))
+
+    print()
+    ok = True
+    for name, result in (("ollama 共享层", shared), ("ollama 共享层+限速", limited), ("kimi 流式共享层", kimi)):
+        if result["failures"] or result["peak"] > args.concurrency:
+            ok = False
+            print(f"❌ {name}: 失败 {result['failures']} 次，并发峰值 {result['peak']} (上限 {args.concurrency})")
+    if ok:
+        print(f"✅ 共享层无失败请求，并发峰值不超过 {args.concurrency} (直连失败 {direct['failures']} 次，"
+              f"并发峰值 {direct['peak']})")
+
+
+if __name__ == "__main__":
+    main()
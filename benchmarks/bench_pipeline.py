@@ -0,0 +1,210 @@
+"""
+端到端离线评测：导入固定的样例仓库，用一组标注了相关文件的黄金问题跑完整的 Graph，并与基线对比
+
+- 模型全部替换为本地假服务 (benchmarks/offline_env.py)：向量化与评分走假 Ollama，生成走假 OpenAI，
+  结果确定、延迟可配置，不消耗任何额度
+- 统计：导入吞吐与峰值内存、各节点 (retrieve / grade / generate) 延迟、评分调用次数、
+  检索召回率 recall@5 / recall@10 (按标注的相关文件计算)、评分后保留片段的召回率 与发送给生成模型的上下文 Token 数
+- 与 benchmarks/baseline.json 对比，超出容忍度的指标视为回退，进程以非 0 状态退出 (可用于 CI)
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --update-baseline      # 确认改动符合预期后更新基线
+    GRADER_BATCH_SIZE=5 python -m benchmarks.bench_pipeline    # 其他配置同样通过环境变量调整
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from benchmarks.offline_env import start_offline_backends
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SAMPLE_REPO = os.path.join(FIXTURES_DIR, "sample_repo")
+GOLDEN_QUESTIONS = os.path.join(FIXTURES_DIR, "golden_questions.json")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+PROJECT = "sample_repo"
+
+# 指标 -> (方向, 相对容忍度, 绝对容忍度)；lower 表示越低越好
+# 延迟受机器负载影响，容忍度放宽；召回率与调用次数是确定的，任何变差都算回退
+METRICS = {
+    "ingest_chunks_per_s": ("higher", 0.30, 0),
+    "ingest_peak_rss_mb": ("lower", 0.25, 20),
+    "retrieve_ms_p50": ("lower", 0.50, 20),
+    "grade_ms_p50": ("lower", 0.30, 20),
+    "generate_ms_p50": ("lower", 0.30, 20),
+    "total_ms_p95": ("lower", 0.30, 50),
+    "grader_calls_mean": ("lower", 0, 1e-6),
+    "recall_at_5": ("higher", 0, 1e-6),
+    "recall_at_10": ("higher", 0, 1e-6),
+    "kept_recall": ("higher", 0, 1e-6),
+    "context_tokens_mean": ("lower", 0.10, 0),
+}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def recall(relevant, documents, k=None):
+    """前 k 个片段覆盖到的相关文件比例"""
+    from context_packer import source_label
+    found = {source_label(d) for d in documents[:k]}
+    return len(relevant & found) / len(relevant)
+
+
+def run_ingest():
+    from telemetry import span
+    from ingest import DB_ROOT, index_source_tree, peak_rss_mb
+    from model_clients import get_client
+    db_path = os.path.join(DB_ROOT, PROJECT)
+    # 嵌入客户端在首次使用时才构建，其一次性导入开销由 bench_startup 单独统计，不计入导入吞吐
+    get_client("embeddings")
+    start = time.perf_counter()
+    with span("ingest", project=PROJECT):
+        n_chunks = index_source_tree(SAMPLE_REPO, db_path, f"file://{SAMPLE_REPO}")
+    elapsed = time.perf_counter() - start
+    return db_path, {
+        "ingest_chunks": n_chunks,
+        "ingest_chunks_per_s": n_chunks / elapsed if elapsed else 0.0,
+        "ingest_peak_rss_mb": peak_rss_mb() or 0.0,
+    }
+
+
+def run_questions(db_path, golden):
+    from local_worker import get_retriever
+    from graph_brain import build_graph
+    from telemetry import span
+
+    graph = build_graph(get_retriever(db_path))
+    rows = []
+    for item in golden:
+        relevant = set(item["relevant"])
+        row = {"question": item["question"], "retrieve": 0.0, "grade": 0.0, "generate": 0.0,
+               "grader_calls": 0, "context_tokens": 0, "kept_recall": 0.0}
+        start = last = time.perf_counter()
+        # Graph 按顺序执行，相邻两次 updates 之间的时间即该节点的耗时
+        # 每个问题一个 trace，span 写入临时目录下的 telemetry/spans.jsonl
+        with span("query", project=PROJECT):
+            for update in graph.stream({"question": item["question"]}, stream_mode="updates"):
+                now = time.perf_counter()
+                for node, value in update.items():
+                    if node == "retrieve":
+                        row["retrieve"] = now - last
+                        row["recall_at_5"] = recall(relevant, value["documents"], 5)
+                        row["recall_at_10"] = recall(relevant, value["documents"], 10)
+                    elif node == "grade_documents":
+                        row["grade"] = now - last
+                        row["grader_calls"] = value["grade_stats"]["grader_calls"]
+                        row["kept_recall"] = recall(relevant, value["documents"])
+                    elif node == "generate":
+                        row["generate"] = now - last
+                        row["context_tokens"] = value["context_stats"]["tokens"]
+                last = now
+        row["total"] = time.perf_counter() - start
+        rows.append(row)
+    return rows
+
+
+def summarize(rows):
+    def mean(key):
+        return sum(r[key] for r in rows) / len(rows)
+
+    return {
+        "retrieve_ms_p50": percentile([r["retrieve"] for r in rows], 50) * 1000,
+        "grade_ms_p50": percentile([r["grade"] for r in rows], 50) * 1000,
+        "generate_ms_p50": percentile([r["generate"] for r in rows], 50) * 1000,
+        "total_ms_p95": percentile([r["total"] for r in rows], 95) * 1000,
+        "grader_calls_mean": mean("grader_calls"),
+        "recall_at_5": mean("recall_at_5"),
+        "recall_at_10": mean("recall_at_10"),
+        "kept_recall": mean("kept_recall"),
+        "context_tokens_mean": mean("context_tokens"),
+    }
+
+
+def compare(metrics, baseline):
+    """返回回退的指标列表 [(名称, 当前值, 基线值)]"""
+    regressions = []
+    for name, (direction, rel_tol, abs_tol) in METRICS.items():
+        if name not in baseline or name not in metrics:
+            continue
+        value, base = metrics[name], baseline[name]
+        if direction == "lower":
+            worse = value > base * (1 + rel_tol) + abs_tol
+        else:
+            worse = value < base * (1 - rel_tol) - abs_tol
+        if worse:
+            regressions.append((name, value, base))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端离线评测 (样例仓库 + 黄金问题集)")
+    parser.add_argument("--embed-latency", type=float, default=0.005, help="假 Ollama 每次向量化请求的延迟 (秒)")
+    parser.add_argument("--grade-latency", type=float, default=0.02, help="假 Ollama 每次评分请求的延迟 (秒)")
+    parser.add_argument("--first-token", type=float, default=0.1, help="假 OpenAI 的首 Token 延迟 (秒)")
+    parser.add_argument("--token-interval", type=float, default=0.005, help="假 OpenAI 的 Token 间隔 (秒)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线文件路径")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果覆盖基线")
+    args = parser.parse_args()
+
+    settings = {
+        "embed_latency": args.embed_latency, "grade_latency": args.grade_latency,
+        "first_token": args.first_token, "token_interval": args.token_interval,
+    }
+    # 评测要测的是完整流程，关闭答案缓存与评分缓存
+    start_offline_backends(
+        args.embed_latency, args.grade_latency, args.first_token, args.token_interval,
+        env={"ANSWER_CACHE_ENABLED": "false", "VERDICT_CACHE_ENABLED": "false"},
+    )
+    with open(GOLDEN_QUESTIONS, encoding="utf-8") as f:
+        golden = json.load(f)
+
+    db_path, metrics = run_ingest()
+    rows = run_questions(db_path, golden)
+    metrics.update(summarize(rows))
+
+    print(f"\n{'问题':<64}{'检索':>8}{'评分':>8}{'生成':>8}{'调用':>6}{'R@5':>6}{'R@10':>6}")
+    for r in rows:
+        print(
+            f"{r['question'][:62]:<64}{r['retrieve'] * 1000:>7.0f}ms{r['grade'] * 1000:>6.0f}ms"
+            f"{r['generate'] * 1000:>6.0f}ms{r['grader_calls']:>6}{r['recall_at_5']:>6.2f}{r['recall_at_10']:>6.2f}"
+        )
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"\n{'指标':<24}{'本次':>12}{'基线':>12}")
+    for name in ["ingest_chunks"] + list(METRICS):
+        base = (baseline or {}).get("metrics", {}).get(name)
+        print(f"{name:<24}{metrics[name]:>12.3f}" + (f"{base:>12.3f}" if base is not None else f"{'-':>12}"))
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "metrics": metrics}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"💾 基线已更新: {args.baseline}")
+        return
+    if baseline is None:
+        print("⚠️ 没有基线文件，使用 --update-baseline 生成")
+        return
+    if baseline.get("settings") != settings:
+        print(f"⚠️ 本次的模拟延迟与基线不同 (基线: {baseline.get('settings')})，延迟类指标不可比")
+
+    regressions = compare(metrics, baseline["metrics"])
+    if regressions:
+        for name, value, base in regressions:
+            print(f"❌ 回退: {name} = {value:.3f} (基线 {base:.3f})")
+        sys.exit(1)
+    print("✅ 所有指标均在基线容忍范围内")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+启动耗时评测：每项都在全新的 Python 进程中测量 (模块缓存不会互相影响)
+
+- 导入耗时：app.py / api_server.py 依赖的各个模块单独导入的耗时与加载的模块数，
+  以及是否提前加载了重量级集成库 (langchain_openai / langchain_ollama / langgraph / chromadb 等)
+- 首屏耗时：从进程启动到 app.py 第一次运行完成 (Streamlit AppTest 无界面执行，含 streamlit 自身的导入)
+- 客户端构建：首屏之后第一次使用各模型客户端的耗时 (延迟到首次使用的那部分开销)
+
+不需要 Ollama / Kimi：在临时目录中运行，不导入任何项目，也不发起模型请求
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 5 --json startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["telemetry", "ingest", "job_queue", "project_registry", "answer_cache", "query_service", "profiler",
+           "api_server"]
+HEAVY = ["langchain_openai", "langchain_ollama", "langgraph", "chromadb", "langchain_community",
+         "langchain_text_splitters", "langchain_core.retrievers"]
+
+_IMPORT_PROBE = """
+import sys, time, json
+t = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - t, "modules": len(sys.modules),
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_RENDER_PROBE = """
+import time, json
+t = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app!r}, default_timeout=120)
+app.run()
+print(json.dumps({{"seconds": time.perf_counter() - t, "errors": [str(e.value) for e in app.exception]}}))
+"""
+
+_CLIENT_PROBE = """
+import time, json
+import model_clients
+result = {}
+for name in model_clients.CLIENT_FACTORIES:
+    t = time.perf_counter()
+    model_clients.get_client(name)
+    result[name] = time.perf_counter() - t
+print(json.dumps(result))
+"""
+
+
+def run_probe(code, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+               OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "fake"),
+               TELEMETRY_CONSOLE="false", MODEL_CLIENTS_WARMUP="false")
+    result = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median_of(samples, key):
+    values = [s[key] for s in samples if key in s]
+    return statistics.median(values) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时评测 (导入耗时 / 首屏耗时)")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取中位数")
+    parser.add_argument("--json", help="把结果写入 JSON 文件，便于跟踪变化")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="navigator-startup-")
+    report = {"imports": {}, "first_render": None, "clients": None}
+
+    print(f"{'模块':<18}{'导入耗时':>10}{'模块数':>8}   提前加载的重量级库")
+    for module in MODULES:
+        samples = [run_probe(_IMPORT_PROBE.format(module=module, heavy=HEAVY), workdir) for _ in range(args.repeat)]
+        if "error" in samples[0]:
+            print(f"{module:<18}{'失败':>10}           {samples[0]['error']}")
+            report["imports"][module] = {"error": samples[0]["error"]}
+            continue
+        entry = {"seconds": median_of(samples, "seconds"), "modules": samples[0]["modules"],
+                 "heavy": samples[0]["heavy"]}
+        report["imports"][module] = entry
+        print(f"{module:<18}{entry['seconds']:>9.2f}s{entry['modules']:>8}   {', '.join(entry['heavy']) or '-'}")
+
+    samples = [run_probe(_RENDER_PROBE.format(app=os.path.join(ROOT, "app.py")), workdir)
+               for _ in range(args.repeat)]
+    errors = [s.get("error") or "; ".join(s.get("errors", [])) for s in samples if s.get("error") or s.get("errors")]
+    report["first_render"] = {"seconds": median_of(samples, "seconds"), "errors": errors[:1]}
+    if report["first_render"]["seconds"] is not None:
+        print(f"\n🖥️ 首屏耗时 (进程启动 -> app.py 首次运行完成): {report['first_render']['seconds']:.2f}s")
+    if errors:
+        print(f"⚠️ 首屏运行出错: {errors[0]}")
+
+    clients = run_probe(_CLIENT_PROBE, workdir)
+    if "error" not in clients:
+        report["clients"] = clients
+        print("🔌 首次使用时构建模型客户端 (含集成库导入): " + "，".join(
+            f"{name} {seconds:.2f}s" for name, seconds in clients.items()
+        ))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
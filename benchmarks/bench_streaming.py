@@ -0,0 +1,65 @@
+"""
+流式生成压测：Graph 使用真实的生成链 (cloud_brain)，指向本地假 OpenAI 服务，
+对比 等待完整回答 与 流式渲染首 Token 的等待时间
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_streaming --first-token 0.5 --token-interval 0.02
+"""
+import os
+import time
+import argparse
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from benchmarks.fake_openai_server import start_server
+from benchmarks.stubs import make_stub_grader
+
+QUESTION = "build_graph 是怎么构建的？"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式生成首 Token 延迟压测 (假 OpenAI 服务)")
+    parser.add_argument("--first-token", type=float, default=0.5, help="假服务的首 Token 延迟 (秒)")
+    parser.add_argument("--token-interval", type=float, default=0.02, help="假服务的 Token 间隔 (秒)")
+    parser.add_argument("--grade-latency", type=float, default=0.05, help="Stub 评分的单次延迟 (秒)")
+    args = parser.parse_args()
+
+    server, base_url = start_server(0, first_token_delay=args.first_token, token_interval=args.token_interval)
+    # 生成链在导入 cloud_brain 时创建，需先设置好地址；压测不写入评分缓存
+    os.environ["OPENAI_API_BASE"] = base_url
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ["VERDICT_CACHE_ENABLED"] = "false"
+    from graph_brain import build_graph
+
+    documents = [
+        Document(page_content=f"def build_graph(retriever): ...  # chunk {i}", metadata={"source": f"f{i}.py"})
+        for i in range(10)
+    ]
+    retriever = RunnableLambda(lambda question: list(documents))
+    graph = build_graph(retriever, grader_chain=make_stub_grader(args.grade_latency))
+
+    start = time.perf_counter()
+    result = graph.invoke({"question": QUESTION})
+    blocking = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first_token = None
+    n_tokens = 0
+    for mode, output in graph.stream({"question": QUESTION}, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            message, metadata = output
+            if metadata.get("langgraph_node") == "generate" and message.content:
+                n_tokens += 1
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+    streaming = time.perf_counter() - start
+    server.shutdown()
+
+    stats = result["generation_stats"]
+    print(f"📊 生成节点: 首 Token {stats['ttft']:.2f}s，生成总耗时 {stats['total']:.2f}s")
+    print(f"⏳ 非流式：用户等待 {blocking:.2f}s 才看到回答")
+    print(f"⚡ 流式：  用户等待 {first_token:.2f}s 看到首字 ({n_tokens} 个 Token，全部完成 {streaming:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
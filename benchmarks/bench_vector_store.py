@@ -0,0 +1,177 @@
+"""
+向量库后端对比：Chroma vs flat (float16 / int8)，使用合成的聚类向量 (不需要 Ollama)
+
+指标：
+- 导入耗时与磁盘占用
+- 打开耗时、打开并查询后的进程内存 (每个后端在独立子进程中测量，互不干扰)
+- 查询延迟 p50 / p95 (similarity_search_with_relevance_scores，含正文读取)
+- 召回@10：与 float32 精确检索结果的重合率 (Chroma 为 HNSW 近似检索，flat 为量化后的精确检索)
+
+用法 (在项目根目录执行):
+    python -m benchmarks.bench_vector_store
+    python -m benchmarks.bench_vector_store --n 50000 --dim 768 --queries 300
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+from langchain_core.documents import Document
+
+BACKENDS = ["chroma", "flat-float16", "flat-int8"]
+_FILLER = "def handler(request):\n    return process(request.payload)\n" * 8
+
+
+def make_vectors(n, dim, n_queries, seed=0):
+    """围绕 n / 50 个中心的聚类向量 (比均匀随机更接近真实的代码向量分布)，查询为库内向量加扰动"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 50), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    queries = vectors[rng.integers(0, n, n_queries)] + 0.3 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    return vectors, queries
+
+
+class TableEmbeddings:
+    """按文本中的编号查表返回预先生成的向量："doc:<i>" 为库内向量，"query:<i>" 为查询向量"""
+
+    def __init__(self, vectors, queries):
+        self.vectors, self.queries = vectors, queries
+
+    def embed_documents(self, texts):
+        return [self.vectors[int(t.split("\n", 1)[0].split(":")[1])].tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.queries[int(text.split(":")[1])].tolist()
+
+
+def rss_mb():
+    """当前进程常驻内存 (MB)；非 Linux 平台退化为峰值内存"""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def open_store(backend, db_path, embeddings):
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        return Chroma(persist_directory=db_path, embedding_function=embeddings)
+    from flat_store import FlatVectorStore
+    return FlatVectorStore(db_path, embeddings, dtype=backend.split("-", 1)[1])
+
+
+def close_store(store):
+    if hasattr(store, "_client"):
+        store._client.close()
+    else:
+        store.close()
+
+
+def dir_mb(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+    return total / 1024 / 1024
+
+
+def worker(args):
+    """子进程：导入 (build) 或 打开并查询 (query)，结果以 JSON 输出到最后一行"""
+    vectors, queries = make_vectors(args.n, args.dim, args.queries)
+    embeddings = TableEmbeddings(vectors, queries)
+    result = {}
+    if args.phase == "build":
+        store = open_store(args.backend, args.db, embeddings)
+        start = time.perf_counter()
+        for i in range(0, args.n, 500):
+            docs = [Document(page_content=f"doc:{j}\n{_FILLER}", metadata={"chunk_id": f"f{j // 20}.py#{j}", "row": j})
+                    for j in range(i, min(i + 500, args.n))]
+            store.add_documents(docs, ids=[d.metadata["chunk_id"] for d in docs])
+        close_store(store)
+        result = {"build_seconds": time.perf_counter() - start, "disk_mb": dir_mb(args.db)}
+    else:
+        del vectors  # 只保留查询向量，内存统计不含合成数据
+        embeddings.vectors = None
+        base = rss_mb()
+        start = time.perf_counter()
+        store = open_store(args.backend, args.db, embeddings)
+        store.similarity_search_with_relevance_scores("query:0", k=10)  # Chroma 在首次查询时加载索引
+        open_seconds = time.perf_counter() - start
+        latencies, hits = [], []
+        for i in range(args.queries):
+            t0 = time.perf_counter()
+            results = store.similarity_search_with_relevance_scores(f"query:{i}", k=10)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits.append([d.metadata["row"] for d, _ in results])
+        result = {
+            "open_seconds": open_seconds, "rss_mb": rss_mb() - base,
+            "p50_ms": float(np.percentile(latencies, 50)), "p95_ms": float(np.percentile(latencies, 95)),
+            "hits": hits,
+        }
+        close_store(store)
+    print(json.dumps(result))
+
+
+def run_worker(backend, phase, db, args):
+    cmd = [sys.executable, "-m", "benchmarks.bench_vector_store", "--worker", "--backend", backend,
+           "--phase", phase, "--db", db, "--n", str(args.n), "--dim", str(args.dim), "--queries", str(args.queries)]
+    output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def exact_top10(args):
+    vectors, queries = make_vectors(args.n, args.dim, args.queries)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ vectors.T
+    return [set(np.argsort(-row)[:10].tolist()) for row in scores]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量库后端对比 (合成向量)")
+    parser.add_argument("--n", type=int, default=20000, help="向量数 (切片数)")
+    parser.add_argument("--dim", type=int, default=768, help="向量维度 (nomic-embed-text 为 768)")
+    parser.add_argument("--queries", type=int, default=200, help="查询数")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="逗号分隔，可选 " + " / ".join(BACKENDS))
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--phase", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args)
+        return
+
+    root = tempfile.mkdtemp(prefix="navigator-vectors-")
+    print(f"📂 临时目录: {root} ({args.n} 个 {args.dim} 维向量，{args.queries} 个查询)")
+    truth = exact_top10(args)
+    rows = []
+    for backend in args.backends.split(","):
+        db = os.path.join(root, backend)
+        print(f"⏳ {backend}: 导入...")
+        built = run_worker(backend, "build", db, args)
+        print(f"⏳ {backend}: 查询...")
+        queried = run_worker(backend, "query", db, args)
+        recall = np.mean([len(truth[i] & set(hits)) / 10 for i, hits in enumerate(queried["hits"])])
+        rows.append((backend, built, queried, recall))
+
+    print(f"\n{'后端':<14}{'导入':>9}{'磁盘':>11}{'打开':>9}{'内存':>11}{'p50':>9}{'p95':>9}{'召回@10':>9}")
+    for backend, built, queried, recall in rows:
+        print(f"{backend:<14}{built['build_seconds']:>8.1f}s{built['disk_mb']:>9.1f}MB"
+              f"{queried['open_seconds']:>8.2f}s{queried['rss_mb']:>9.1f}MB"
+              f"{queried['p50_ms']:>7.1f}ms{queried['p95_ms']:>7.1f}ms{recall:>9.3f}")
+    shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+本地假 Ollama 服务 (仅标准库)：用于离线压测导入与查询流程，不需要真实模型
+
+- POST /api/embed：按词哈希生成确定性的向量 (相同文本得到相同向量，共享词越多越相似)
+- POST /api/chat：从评分 Prompt 中取出问题与文档，按词重叠给出确定性评分 (benchmarks.stubs.stub_grade)，
+  多文档评分返回等长的 scores 数组；支持 stream
+- GET /api/tags：健康检查
+- 可模拟每次调用的延迟，以及按固定间隔注入的 429 / 503 (server.faults 记录请求数与并发峰值)
+
+用法 (在项目根目录执行):
+    python -m benchmarks.fake_ollama_server --port 11435 --chat-latency 0.05
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 python main.py api
+"""
+import re
+import json
+import math
+import time
+import zlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.stubs import stub_grade, FaultInjector
+
+EMBED_DIM = 256
+_WORD = re.compile(r"\w+")
+_SINGLE_PROMPT = re.compile(r"问题: (.*?)\n文档: (.*)\nJSON 输出:", re.S)
+_BATCH_PROMPT = re.compile(r"问题: (.*?)\n文档:\n(.*)\nJSON 输出:", re.S)
+_BATCH_SPLIT = re.compile(r"\[文档 \d+\]\n")
+
+
+def fake_embedding(text, dim=EMBED_DIM):
+    """词袋哈希向量 (L2 归一化)"""
+    vector = [0.0] * dim
+    for word in _WORD.findall(text.lower()):
+        h = zlib.crc32(word.encode("utf-8"))
+        vector[h % dim] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def fake_verdict(messages):
+    """根据 Prompt 判断是单篇还是多篇评分，返回 JSON 文本"""
+    prompt = "\n".join(m.get("content", "") for m in messages)
+    match = _BATCH_PROMPT.search(prompt)
+    if match:
+        question, documents = match.groups()
+        parts = _BATCH_SPLIT.split(documents)[1:]
+        return json.dumps({"scores": [stub_grade(question, p) for p in parts]})
+    match = _SINGLE_PROMPT.search(prompt)
+    if match:
+        return json.dumps({"score": stub_grade(*match.groups())})
+    return json.dumps({"score": "yes"})
+
+
+def make_handler(embed_latency, chat_latency, faults):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            faults.write_body(self, data)
+
+        def do_GET(self):
+            if self.path.startswith("/api/tags"):
+                self._send_json({"models": []})
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            status = faults.enter(self)
+            try:
+                if status:
+                    faults.send_fault(self, status)
+                else:
+                    self._handle(body)
+            finally:
+                faults.leave(self)
+
+        def _handle(self, body):
+            model = body.get("model", "fake")
+
+            if self.path.startswith("/api/embed"):
+                texts = body.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                time.sleep(embed_latency)
+                self._send_json({"model": model, "embeddings": [fake_embedding(t) for t in texts]})
+                return
+
+            if not self.path.startswith("/api/chat"):
+                self.send_error(404)
+                return
+            content = fake_verdict(body.get("messages", []))
+            time.sleep(chat_latency)
+            message = {"role": "assistant", "content": content}
+            done = {"model": model, "created_at": "2024-01-01T00:00:00Z", "done": True, "done_reason": "stop"}
+            if body.get("stream") is False:
+                self._send_json({**done, "message": message})
+                return
+
+            # 默认流式：NDJSON，最后一行 done=true
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            lines = [
+                {"model": model, "created_at": done["created_at"], "done": False, "message": message},
+                {**done, "message": {"role": "assistant", "content": ""}},
+            ]
+            for line in lines:
+                self.wfile.write((json.dumps(line) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    # 默认的监听队列只有 5，并发压测时会出现连接被重置
+    request_queue_size = 128
+
+
+def start_server(port=0, embed_latency=0.0, chat_latency=0.05, fail_every=0):
+    """在后台线程启动服务，返回 (server, base_url)；port=0 时自动分配端口"""
+    faults = FaultInjector(fail_every)
+    server = _Server(("127.0.0.1", port), make_handler(embed_latency, chat_latency, faults))
+    server.faults = faults
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="假 Ollama 服务 (向量化 + 评分)")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="每次向量化请求的延迟 (秒)")
+    parser.add_argument("--chat-latency", type=float, default=0.05, help="每次评分请求的延迟 (秒)")
+    parser.add_argument("--fail-every", type=int, default=0, help="每 N 个请求注入一次 429 / 503 (0 表示不注入)")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.port, args.embed_latency, args.chat_latency, args.fail_every)
+    print(f"🧪 假 Ollama 服务已启动: {base_url} (Ctrl+C 退出)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+本地假 OpenAI 兼容服务 (仅标准库)：用于离线测试流式生成，不消耗 Kimi 额度
+
+- POST /v1/chat/completions，支持 stream=true (SSE 逐 Token 推送) 与普通响应
+- 可模拟首 Token 延迟与每个 Token 的间隔，以及按固定间隔注入的 429 / 503 (server.faults 记录请求数与并发峰值)
+
+用法 (在项目根目录执行):
+    python -m benchmarks.fake_openai_server --port 8001 --first-token 0.5 --token-interval 0.02
+    OPENAI_API_BASE=http://127.0.0.1:8001/v1 OPENAI_API_KEY=fake streamlit run app.py
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.stubs import FaultInjector
+
+DEFAULT_ANSWER = (
+    "根据上下文，`build_graph` 负责构建检索、评分与生成三个节点，"
+    "`OLLAMA_BASE_URL` 通过环境变量配置 Ollama 服务地址。"
+)
+
+
+def tokenize_answer(text):
+    """把回答切成模拟的 Token (中文按字，英文按空格)"""
+    tokens, word = [], ""
+    for ch in text:
+        if ch.isascii() and not ch.isspace():
+            word += ch
+            continue
+        if word:
+            tokens.append(word)
+            word = ""
+        tokens.append(ch)
+    if word:
+        tokens.append(word)
+    return tokens
+
+
+def make_handler(answer, first_token_delay, token_interval, faults):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _chunk(self, model, delta, finish_reason=None):
+            return {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            status = faults.enter(self)
+            try:
+                if status:
+                    faults.send_fault(self, status)
+                else:
+                    self._handle(body)
+            finally:
+                faults.leave(self)
+
+        def _handle(self, body):
+            model = body.get("model", "fake")
+            tokens = tokenize_answer(answer)
+            time.sleep(first_token_delay)
+
+            if not body.get("stream"):
+                time.sleep(token_interval * len(tokens))
+                payload = json.dumps({
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": answer}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                faults.write_body(self, payload)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+
+            def send(data):
+                self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            send(json.dumps(self._chunk(model, {"role": "assistant", "content": ""})))
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(token_interval)
+                send(json.dumps(self._chunk(model, {"content": token}), ensure_ascii=False))
+            send(json.dumps(self._chunk(model, {}, "stop")))
+            send("[DONE]")
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    # 默认的监听队列只有 5，并发压测时会出现连接被重置
+    request_queue_size = 128
+
+
+def start_server(port=0, answer=DEFAULT_ANSWER, first_token_delay=0.5, token_interval=0.02, fail_every=0):
+    """在后台线程启动服务，返回 (server, base_url)；port=0 时自动分配端口"""
+    faults = FaultInjector(fail_every)
+    server = _Server(("127.0.0.1", port), make_handler(answer, first_token_delay, token_interval, faults))
+    server.faults = faults
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="假 OpenAI 兼容流式服务")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token", type=float, default=0.5, help="首 Token 延迟 (秒)")
+    parser.add_argument("--token-interval", type=float, default=0.02, help="Token 间隔 (秒)")
+    parser.add_argument("--answer", default=DEFAULT_ANSWER, help="固定返回的回答")
+    parser.add_argument("--fail-every", type=int, default=0, help="每 N 个请求注入一次 429 / 503 (0 表示不注入)")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.port, args.answer, args.first_token, args.token_interval, args.fail_every)
+    print(f"🧪 假 OpenAI 服务已启动: {base_url} (Ctrl+C 退出)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+"""weather-bot: print the weather forecast for a city."""
+__version__ = "0.3.0"
@@ -0,0 +1,32 @@
+from weather.notify import send_email, send_webhook
+
+# Severe weather thresholds
+HEAT_WARNING_CELSIUS = 35
+FROST_WARNING_CELSIUS = -5
+STORM_WIND_KMH = 75
+
+
+def detect_alerts(forecast):
+    """Return a list of alert messages for days exceeding the severe weather thresholds."""
+    alerts = []
+    for day in forecast.get("days", []):
+        if day["max"] >= HEAT_WARNING_CELSIUS:
+            alerts.append(f"{day['date']}: heat warning ({day['max']}°C)")
+        if day["min"] <= FROST_WARNING_CELSIUS:
+            alerts.append(f"{day['date']}: frost warning ({day['min']}°C)")
+        if day.get("wind", 0) >= STORM_WIND_KMH:
+            alerts.append(f"{day['date']}: storm warning ({day['wind']} km/h)")
+    return alerts
+
+
+def dispatch_alerts(city, forecast, email=None, webhook=None):
+    """Send severe weather alerts by e-mail and/or webhook, returns the alerts sent."""
+    alerts = detect_alerts(forecast)
+    if not alerts:
+        return []
+    body = f"Severe weather alerts for {city}:\n" + "\n".join(alerts)
+    if email:
+        send_email(email, f"Weather alert: {city}", body)
+    if webhook:
+        send_webhook(webhook, {"city": city, "alerts": alerts})
+    return alerts
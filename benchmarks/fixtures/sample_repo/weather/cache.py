@@ -0,0 +1,41 @@
+import os
+import json
+import time
+import hashlib
+
+from weather.config import CACHE_DIR, CACHE_TTL
+
+
+class DiskCache:
+    """JSON files on disk, one per key; entries older than CACHE_TTL seconds are ignored."""
+
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        if time.time() - os.path.getmtime(path) > self.ttl:
+            os.remove(path)  # expired
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def set(self, key, value):
+        with open(self._path(key), "w", encoding="utf-8") as f:
+            json.dump(value, f)
+
+    def clear(self):
+        """Delete every cached forecast, returns the number of removed files."""
+        removed = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
@@ -0,0 +1,33 @@
+import argparse
+
+from weather.cache import DiskCache
+from weather.client import WeatherClient
+from weather.config import DEFAULT_CITY
+from weather.formatter import format_forecast
+
+
+def build_parser():
+    """Sub commands: forecast (print the forecast) and clear-cache (delete cached responses)."""
+    parser = argparse.ArgumentParser(prog="weather-bot")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    forecast = sub.add_parser("forecast", help="print the forecast of a city")
+    forecast.add_argument("--city", default=DEFAULT_CITY)
+    forecast.add_argument("--days", type=int, default=3)
+    forecast.add_argument("--unit", choices=["C", "F"], default="C")
+
+    sub.add_parser("clear-cache", help="delete every cached forecast")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "clear-cache":
+        print(f"removed {DiskCache().clear()} cached forecasts")
+        return
+    data = WeatherClient().fetch_forecast(args.city, args.days)
+    print(format_forecast(data, args.unit))
+
+
+if __name__ == "__main__":
+    main()
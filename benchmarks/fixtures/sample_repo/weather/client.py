@@ -0,0 +1,40 @@
+import time
+import requests
+
+from weather.config import API_BASE_URL, require_api_key
+from weather.cache import DiskCache
+
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 1.5
+
+
+class WeatherClient:
+    """HTTP client of the forecast provider with caching and retries."""
+
+    def __init__(self, cache=None, session=None):
+        self.cache = cache or DiskCache()
+        self.session = session or requests.Session()
+
+    def fetch_forecast(self, city, days=3):
+        """Return the forecast of a city, served from the cache when fresh."""
+        key = f"{city.lower()}:{days}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        data = self._request("/forecast", {"city": city, "days": days})
+        self.cache.set(key, data)
+        return data
+
+    def _request(self, path, params):
+        """GET with exponential backoff: retry timeouts and 5xx responses up to MAX_RETRIES times."""
+        params = dict(params, key=require_api_key())
+        for attempt in range(MAX_RETRIES):
+            try:
+                response = self.session.get(API_BASE_URL + path, params=params, timeout=10)
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    return response.json()
+            except requests.Timeout:
+                pass
+            time.sleep(BACKOFF_SECONDS * 2 ** attempt)
+        raise RuntimeError(f"forecast request failed after {MAX_RETRIES} retries")
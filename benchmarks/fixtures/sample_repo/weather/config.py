@@ -0,0 +1,17 @@
+import os
+
+# API key of the forecast provider, required for every request
+WEATHER_API_KEY = os.getenv("WEATHER_API_KEY", "")
+# City used when the command line does not pass --city
+DEFAULT_CITY = os.getenv("DEFAULT_CITY", "Beijing")
+# Seconds a cached forecast stays valid
+CACHE_TTL = int(os.getenv("CACHE_TTL", "600"))
+CACHE_DIR = os.path.expanduser(os.getenv("CACHE_DIR", "~/.cache/weather-bot"))
+API_BASE_URL = os.getenv("WEATHER_API_BASE_URL", "https://api.example-weather.com/v1")
+
+
+def require_api_key():
+    """Fail early with a readable message when WEATHER_API_KEY is missing."""
+    if not WEATHER_API_KEY:
+        raise SystemExit("WEATHER_API_KEY is not set, see README.md")
+    return WEATHER_API_KEY
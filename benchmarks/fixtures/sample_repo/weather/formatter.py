@@ -0,0 +1,17 @@
+from tabulate import tabulate
+
+
+def celsius_to_fahrenheit(celsius):
+    """Convert a temperature unit from Celsius to Fahrenheit."""
+    return celsius * 9 / 5 + 32
+
+
+def format_forecast(data, unit="C"):
+    """Render the forecast as a text table, converting temperatures when unit is F."""
+    rows = []
+    for day in data.get("days", []):
+        low, high = day["min"], day["max"]
+        if unit == "F":
+            low, high = celsius_to_fahrenheit(low), celsius_to_fahrenheit(high)
+        rows.append([day["date"], day["summary"], f"{low:.0f}°{unit}", f"{high:.0f}°{unit}"])
+    return tabulate(rows, headers=["Date", "Summary", "Min", "Max"])
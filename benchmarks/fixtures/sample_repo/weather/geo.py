@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class City:
+    name: str
+    lat: float
+    lon: float
+    timezone: str
+
+
+KNOWN_CITIES = {
+    "beijing": City("Beijing", 39.9042, 116.4074, "Asia/Shanghai"),
+    "shanghai": City("Shanghai", 31.2304, 121.4737, "Asia/Shanghai"),
+    "paris": City("Paris", 48.8566, 2.3522, "Europe/Paris"),
+    "new york": City("New York", 40.7128, -74.0060, "America/New_York"),
+}
+
+
+def geocode(name):
+    """Look up the coordinates of a city name; raises KeyError for unknown cities."""
+    key = " ".join(name.lower().split())
+    if key not in KNOWN_CITIES:
+        raise KeyError(f"unknown city: {name}")
+    return KNOWN_CITIES[key]
+
+
+def distance_km(a, b):
+    """Great circle distance between two cities using the haversine formula."""
+    from math import radians, sin, cos, asin, sqrt
+    dlat, dlon = radians(b.lat - a.lat), radians(b.lon - a.lon)
+    h = sin(dlat / 2) ** 2 + cos(radians(a.lat)) * cos(radians(b.lat)) * sin(dlon / 2) ** 2
+    return 2 * 6371 * asin(sqrt(h))
@@ -0,0 +1,34 @@
+import sqlite3
+import json
+import time
+
+from weather.config import CACHE_DIR
+
+HISTORY_DB = f"{CACHE_DIR}/history.sqlite"
+
+
+class ForecastHistory:
+    """Past forecasts are stored in a SQLite database, one row per fetch."""
+
+    def __init__(self, path=HISTORY_DB):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS history (city TEXT, fetched_at REAL, data TEXT)"
+        )
+
+    def record(self, city, forecast):
+        self.conn.execute(
+            "INSERT INTO history VALUES (?, ?, ?)", (city.lower(), time.time(), json.dumps(forecast))
+        )
+        self.conn.commit()
+
+    def recent(self, city, limit=30):
+        rows = self.conn.execute(
+            "SELECT data FROM history WHERE city = ? ORDER BY fetched_at DESC LIMIT ?", (city.lower(), limit)
+        )
+        return [json.loads(data) for (data,) in rows]
+
+    def purge(self, older_than_days=90):
+        cutoff = time.time() - older_than_days * 86400
+        self.conn.execute("DELETE FROM history WHERE fetched_at < ?", (cutoff,))
+        self.conn.commit()
@@ -0,0 +1,9 @@
+TRANSLATIONS = {
+    "zh": {"Sunny": "晴", "Cloudy": "多云", "Rain": "雨", "Snow": "雪", "Thunderstorm": "雷阵雨"},
+    "fr": {"Sunny": "Ensoleillé", "Cloudy": "Nuageux", "Rain": "Pluie", "Snow": "Neige"},
+}
+
+
+def translate_summary(summary, language):
+    """Translate a forecast summary; falls back to English for unknown languages or words."""
+    return TRANSLATIONS.get(language, {}).get(summary, summary)
@@ -0,0 +1,26 @@
+import os
+import smtplib
+from email.message import EmailMessage
+
+import requests
+
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_SENDER = os.getenv("SMTP_SENDER", "weather-bot@localhost")
+
+
+def send_email(recipient, subject, body):
+    """Send a plain text e-mail through the configured SMTP server."""
+    message = EmailMessage()
+    message["From"] = SMTP_SENDER
+    message["To"] = recipient
+    message["Subject"] = subject
+    message.set_content(body)
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
+        smtp.send_message(message)
+
+
+def send_webhook(url, payload):
+    """POST a JSON payload to a webhook (Slack, Discord, ...)."""
+    response = requests.post(url, json=payload, timeout=10)
+    response.raise_for_status()
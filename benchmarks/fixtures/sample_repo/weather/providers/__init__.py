@@ -0,0 +1,8 @@
+from weather.providers import metno, openmeteo
+
+PROVIDERS = {"openmeteo": openmeteo.fetch, "metno": metno.fetch}
+
+
+def get_provider(name):
+    """Return the fetch function of a forecast provider by name."""
+    return PROVIDERS[name]
@@ -0,0 +1,22 @@
+import requests
+
+BASE_URL = "https://api.met.no/weatherapi/locationforecast/2.0/compact"
+USER_AGENT = "weather-bot/0.3 github.com/example/weather-bot"
+
+
+def fetch(lat, lon, days=3):
+    """Fetch a forecast from MET Norway; the API requires an identifying User-Agent header."""
+    response = requests.get(BASE_URL, params={"lat": lat, "lon": lon},
+                            headers={"User-Agent": USER_AGENT}, timeout=10)
+    response.raise_for_status()
+    series = response.json()["properties"]["timeseries"]
+    by_date = {}
+    for point in series:
+        date = point["time"][:10]
+        temp = point["data"]["instant"]["details"]["air_temperature"]
+        low, high = by_date.get(date, (temp, temp))
+        by_date[date] = (min(low, temp), max(high, temp))
+    return {"days": [
+        {"date": date, "min": low, "max": high, "summary": ""}
+        for date, (low, high) in sorted(by_date.items())[:days]
+    ]}
@@ -0,0 +1,18 @@
+import requests
+
+BASE_URL = "https://api.open-meteo.com/v1/forecast"
+
+
+def fetch(lat, lon, days=3):
+    """Fetch a forecast from Open-Meteo and normalize it to {"days": [...]}."""
+    response = requests.get(BASE_URL, params={
+        "latitude": lat, "longitude": lon, "forecast_days": days,
+        "daily": "temperature_2m_min,temperature_2m_max,weathercode",
+    }, timeout=10)
+    response.raise_for_status()
+    daily = response.json()["daily"]
+    return {"days": [
+        {"date": date, "min": low, "max": high, "summary": str(code)}
+        for date, low, high, code in zip(daily["time"], daily["temperature_2m_min"],
+                                         daily["temperature_2m_max"], daily["weathercode"])
+    ]}
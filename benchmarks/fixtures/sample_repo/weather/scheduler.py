@@ -0,0 +1,15 @@
+import time
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def run_every(minutes, job, *args):
+    """Run a job forever with a fixed interval; errors are logged and do not stop the loop."""
+    while True:
+        started = time.monotonic()
+        try:
+            job(*args)
+        except Exception:
+            log.exception("scheduled job failed")
+        time.sleep(max(0, minutes * 60 - (time.monotonic() - started)))
@@ -0,0 +1,28 @@
+import json
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from weather.client import WeatherClient
+from weather.config import DEFAULT_CITY
+
+client = WeatherClient()
+
+
+class ForecastHandler(BaseHTTPRequestHandler):
+    """GET /forecast?city=Paris returns the forecast as JSON."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/forecast":
+            self.send_error(404)
+            return
+        city = parse_qs(url.query).get("city", [DEFAULT_CITY])[0]
+        body = json.dumps(client.fetch_forecast(city)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port=8080):
+    HTTPServer(("0.0.0.0", port), ForecastHandler).serve_forever()
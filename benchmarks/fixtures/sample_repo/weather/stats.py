@@ -0,0 +1,16 @@
+def average_temperature(forecasts):
+    """Mean of the daily average temperature over several forecasts."""
+    values = [(d["min"] + d["max"]) / 2 for f in forecasts for d in f.get("days", [])]
+    return sum(values) / len(values) if values else None
+
+
+def temperature_trend(forecasts):
+    """Simple linear trend (degrees per day) using least squares on daily maxima."""
+    points = [d["max"] for f in forecasts for d in f.get("days", [])]
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mean_x, mean_y = (n - 1) / 2, sum(points) / n
+    num = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(points))
+    den = sum((x - mean_x) ** 2 for x in range(n))
+    return num / den
@@ -0,0 +1,159 @@
+"""
+HTTP 查询接口压测：并发发起流式查询，统计延迟分位数、首 Token 延迟、吞吐与被拒绝 (429/503) 的请求数
+
+默认完全离线：启动假 Ollama (向量化 + 评分) 与假 OpenAI (生成) 服务，
+在临时目录中导入 --path 指定的源码目录，再在本进程内启动 API 服务
+也可以用 --url 压测已经运行的服务 (python main.py api)，此时需用 --project 指定已导入的项目
+
+用法 (在项目根目录执行):
+    python -m benchmarks.load_test --requests 64 --concurrency 16
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --project Open-AutoGLM
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+
+import httpx
+
+QUESTIONS = [
+    "这个项目如何部署？", "build_graph 是怎么构建的？", "如何配置 Ollama 地址？",
+    "评分节点如何并发执行？", "向量缓存存放在哪里？", "如何增量更新项目？",
+    "上下文的 Token 预算是多少？", "BM25 索引如何保存？",
+]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_stack(source_path, args):
+    """离线模式：假模型服务 + 临时目录中导入源码 + 后台线程运行 API，返回 (base_url, project)"""
+    from benchmarks.offline_env import start_offline_backends
+
+    # 模块在导入时读取配置，必须先启动假服务、设置环境变量并切换到临时目录
+    start_offline_backends(
+        grade_latency=args.grade_latency, first_token=args.first_token, token_interval=args.token_interval,
+        env={
+            "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+            "ANSWER_CACHE_PREWARM": "false",
+            "VERDICT_CACHE_ENABLED": "false",
+            "API_MAX_CONCURRENT_QUERIES": str(args.max_concurrent),
+            "API_MAX_QUEUED_QUERIES": str(args.max_queued),
+        },
+        prefix="navigator-load-",
+    )
+
+    from ingest import DB_ROOT, index_source_tree
+    project = "load-test"
+    n_chunks = index_source_tree(source_path, os.path.join(DB_ROOT, project), f"file://{source_path}")
+    if not n_chunks:
+        sys.exit(f"❌ {source_path} 中没有可导入的文件")
+
+    import uvicorn
+    from api_server import app
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", project
+
+
+async def one_query(client, base_url, project, question, results):
+    start = time.perf_counter()
+    first_token = None
+    try:
+        async with client.stream("POST", f"{base_url}/query",
+                                 json={"project": project, "question": question, "stream": True}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                results["status"][response.status_code] = results["status"].get(response.status_code, 0) + 1
+                return
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["event"] == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif event["event"] == "done" and event.get("cached") and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif event["event"] == "error":
+                    results["status"]["error"] = results["status"].get("error", 0) + 1
+                    return
+    except httpx.HTTPError as e:
+        results["status"][type(e).__name__] = results["status"].get(type(e).__name__, 0) + 1
+        return
+    results["status"][200] = results["status"].get(200, 0) + 1
+    results["latency"].append(time.perf_counter() - start)
+    if first_token is not None:
+        results["ttft"].append(first_token)
+
+
+async def run_load(base_url, project, n_requests, concurrency):
+    results = {"latency": [], "ttft": [], "status": {}}
+    gate = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300), limits=limits, trust_env=False) as client:
+        async def task(i):
+            async with gate:
+                # 加上编号保证问题各不相同，避免全部命中答案缓存
+                question = f"{QUESTIONS[i % len(QUESTIONS)]} (#{i})"
+                await one_query(client, base_url, project, question, results)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(task(i) for i in range(n_requests)))
+        elapsed = time.perf_counter() - start
+        metrics = (await client.get(f"{base_url}/metrics")).json()
+    return results, elapsed, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 查询接口并发压测")
+    parser.add_argument("--url", help="压测已运行的服务 (不指定则在本进程内启动离线服务)")
+    parser.add_argument("--project", help="--url 模式下要查询的项目名")
+    parser.add_argument("--path", default=".", help="离线模式下导入的源码目录 (默认当前目录)")
+    parser.add_argument("--requests", type=int, default=64, help="总请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="客户端并发数")
+    parser.add_argument("--max-concurrent", type=int, default=4, help="离线模式：服务端查询并发")
+    parser.add_argument("--max-queued", type=int, default=16, help="离线模式：服务端排队上限")
+    parser.add_argument("--grade-latency", type=float, default=0.05, help="离线模式：假评分延迟 (秒)")
+    parser.add_argument("--first-token", type=float, default=0.3, help="离线模式：假生成首 Token 延迟 (秒)")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="离线模式：假生成 Token 间隔 (秒)")
+    parser.add_argument("--answer-cache", action="store_true", help="离线模式：开启语义答案缓存")
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.project:
+            parser.error("--url 模式需要 --project")
+        base_url, project = args.url.rstrip("/"), args.project
+    else:
+        base_url, project = start_local_stack(os.path.abspath(args.path), args)
+
+    print(f"🚀 压测 {base_url}：{args.requests} 个请求，客户端并发 {args.concurrency}")
+    results, elapsed, metrics = asyncio.run(run_load(base_url, project, args.requests, args.concurrency))
+
+    ok = len(results["latency"])
+    print(f"📊 状态码: {results['status']}")
+    print(f"⏱️ 总耗时 {elapsed:.2f}s，吞吐 {ok / elapsed if elapsed else 0:.2f} 请求/秒")
+    print(f"   延迟   p50 {percentile(results['latency'], 50):.2f}s  p95 {percentile(results['latency'], 95):.2f}s")
+    print(f"   首Token p50 {percentile(results['ttft'], 50):.2f}s  p95 {percentile(results['ttft'], 95):.2f}s")
+    print(f"🧮 服务端: {metrics['queries']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+离线压测环境：启动假 Ollama 与假 OpenAI 服务，设置对应的环境变量，并切换到临时工作目录
+
+项目模块在导入时读取配置 (OLLAMA_BASE_URL、缓存路径等)，因此必须在导入 ingest / graph_brain 等模块之前调用
+"""
+import os
+import tempfile
+
+from benchmarks.fake_ollama_server import start_server as start_ollama
+from benchmarks.fake_openai_server import start_server as start_openai
+
+
+def start_offline_backends(embed_latency=0.0, grade_latency=0.05, first_token=0.3, token_interval=0.01,
+                           env=None, prefix="navigator-bench-"):
+    """
+    :param env: 额外设置的环境变量 (如关闭答案缓存)
+    :return: 临时工作目录 (向量库、向量缓存等都写在这里，不影响真实数据)
+    """
+    _, ollama_url = start_ollama(0, embed_latency=embed_latency, chat_latency=grade_latency)
+    _, openai_url = start_openai(0, first_token_delay=first_token, token_interval=token_interval)
+    os.environ.update({
+        "OLLAMA_BASE_URL": ollama_url,
+        "OPENAI_API_BASE": openai_url,
+        "OPENAI_API_KEY": "fake",
+        **(env or {}),
+    })
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    os.chdir(workdir)
+    print(f"📂 临时工作目录: {workdir}")
+    return workdir
@@ -0,0 +1,111 @@
+"""
+本地桩模型 (Stub LLM)：不依赖 Ollama / Kimi，用固定延迟模拟模型调用，便于离线压测
+"""
+import re
+import threading
+import time
+from langchain_core.runnables import RunnableLambda
+
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]+|[一-鿿]")
+
+
+def stub_grade(question, document):
+    """确定性评分：按问题与文档的词重叠程度给出 yes / partial / no"""
+    q_words = set(w.lower() for w in _WORD_RE.findall(question))
+    d_words = set(w.lower() for w in _WORD_RE.findall(document))
+    overlap = len(q_words & d_words)
+    if overlap >= 2:
+        return "yes"
+    if overlap == 1:
+        return "partial"
+    return "no"
+
+
+class CallCounter:
+    """线程安全的调用计数器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def incr(self):
+        with self._lock:
+            self.calls += 1
+
+
+def make_stub_grader(latency=0.2, counter=None):
+    """单文档评分桩：与 local_worker.get_grader_chain 输入输出一致"""
+    def _grade(inputs):
+        if counter is not None:
+            counter.incr()
+        time.sleep(latency)
+        return {"score": stub_grade(inputs["question"], inputs["document"])}
+    return RunnableLambda(_grade)
+
+
+def make_stub_batch_grader(latency=0.2, per_doc_latency=0.05, counter=None):
+    """多文档评分桩：一次调用的延迟 = 固定开销 + 每篇文档的增量"""
+    def _grade(inputs):
+        if counter is not None:
+            counter.incr()
+        parts = re.split(r"\[文档 \d+\]\n", inputs["documents"])[1:]
+        time.sleep(latency + per_doc_latency * len(parts))
+        return {"scores": [stub_grade(inputs["question"], p) for p in parts]}
+    return RunnableLambda(_grade)
+
+
+class FaultInjector:
+    """
+    假服务的请求统计与故障注入：每 fail_every 个请求返回一次 429 (带 Retry-After) 或 503 (交替)，
+    同时记录服务端观察到的并发峰值，用于验证客户端的重试与并发限制
+    """
+
+    def __init__(self, fail_every=0):
+        self.fail_every = fail_every
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.injected = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def enter(self, handler):
+        """请求开始：返回需要注入的状态码，None 表示正常处理"""
+        handler.fault_counted = True
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.fail_every and self.requests % self.fail_every == 0:
+                self.injected += 1
+                return 429 if self.injected % 2 else 503
+        return None
+
+    def leave(self, handler):
+        """请求结束 (每个请求只计一次，重复调用无效)"""
+        if not getattr(handler, "fault_counted", False):
+            return
+        handler.fault_counted = False
+        with self._lock:
+            self.in_flight -= 1
+
+    def write_body(self, handler, data):
+        """
+        写出带 Content-Length 的完整响应体：先登记请求结束再写。客户端读完响应体就会释放并发名额并发出下一个请求，
+        若写完才登记，服务端会短暂把已经结束的请求也算进并发峰值
+        """
+        self.leave(handler)
+        handler.wfile.write(data)
+
+    def send_fault(self, handler, status):
+        body = b'{"error": {"message": "injected fault"}}'
+        handler.send_response(status)
+        if status == 429:
+            handler.send_header("Retry-After", "0")
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        self.write_body(handler, body)
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "injected": self.injected, "peak_in_flight": self.peak_in_flight}
@@ -0,0 +1,162 @@
+import os
+import ast
+from langchain_core.documents import Document
+
+# 切分策略：language = 按文件类型选择切分器，Python 按 AST 边界切分；legacy = 旧版 (所有文件按 Python 规则切分)
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "language")
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1500"))
+# 非 AST 切分时的重叠字符数 (AST 切分按完整函数/类切块，不需要重叠)
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
+
+# 文件后缀 -> 切分语言 (langchain_text_splitters.Language 的取值)，未列出的后缀 (txt、yaml 等) 使用通用切分器
+# 切分器在首次切分时才导入 langchain_text_splitters
+LANGUAGE_BY_EXTENSION = {
+    ".md": "markdown",
+    ".js": "js",
+    ".ts": "ts",
+    ".java": "java",
+    ".go": "go",
+    ".py": "python",
+}
+
+_splitters = {}
+
+
+def get_text_splitter(extension, strategy=CHUNK_STRATEGY):
+    """按后缀返回 (缓存的) 文本切分器"""
+    key = (extension, strategy)
+    if key not in _splitters:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter, Language
+        if strategy == "legacy":
+            splitter = RecursiveCharacterTextSplitter.from_language(
+                language=Language.PYTHON, chunk_size=1500, chunk_overlap=200
+            )
+        elif extension in LANGUAGE_BY_EXTENSION:
+            splitter = RecursiveCharacterTextSplitter.from_language(
+                language=Language(LANGUAGE_BY_EXTENSION[extension]), chunk_size=CHUNK_SIZE,
+                chunk_overlap=CHUNK_OVERLAP, add_start_index=True
+            )
+        else:
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, add_start_index=True
+            )
+        _splitters[key] = splitter
+    return _splitters[key]
+
+
+def module_path(rel_path):
+    """source/pkg/mod.py -> source.pkg.mod"""
+    path = rel_path[:-3] if rel_path.endswith(".py") else rel_path
+    parts = [p for p in path.replace(os.sep, "/").split("/") if p]
+    if parts and parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+def _node_start(node):
+    """包含装饰器在内的起始行"""
+    lines = [d.lineno for d in getattr(node, "decorator_list", [])]
+    return min(lines + [node.lineno])
+
+
+def _python_units(source):
+    """
+    把 Python 源码按 AST 切成语义单元：(起始行, 结束行, 符号名)
+    - 每个顶层函数/类是一个单元；连续的模块级语句 (import、常量) 合成一个单元
+    - 单元之间的注释/空行归入下一个单元，保证整个文件不丢行
+    - 超过 CHUNK_SIZE 的类拆成 类头 + 每个方法
+    """
+    tree = ast.parse(source)
+    lines = source.splitlines(keepends=True)
+    n_lines = len(lines)
+
+    def span_len(start, end):
+        return sum(len(lines[i]) for i in range(start - 1, end))
+
+    # 顶层节点的起点：函数/类各自独立，连续的其他语句只取第一条作为起点
+    starts = []
+    prev_is_block = True
+    for node in tree.body:
+        is_block = isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        if is_block or prev_is_block:
+            starts.append((_node_start(node), node if is_block else None))
+        prev_is_block = is_block
+    if not starts:
+        return [(1, n_lines, "")] if n_lines else []
+
+    units = []
+    for i, (start, node) in enumerate(starts):
+        start = 1 if i == 0 else start
+        end = starts[i + 1][0] - 1 if i + 1 < len(starts) else n_lines
+        if node is None:
+            units.append((start, end, ""))
+            continue
+        if isinstance(node, ast.ClassDef) and span_len(start, end) > CHUNK_SIZE:
+            methods = [m for m in node.body if isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            if methods:
+                method_starts = [_node_start(m) for m in methods]
+                units.append((start, method_starts[0] - 1, node.name))
+                for j, method in enumerate(methods):
+                    m_end = method_starts[j + 1] - 1 if j + 1 < len(methods) else end
+                    units.append((method_starts[j], m_end, f"{node.name}.{method.name}"))
+                continue
+        units.append((start, end, node.name))
+    return units
+
+
+def split_python_ast(doc, rel_path=""):
+    """
+    Python 文件按 AST 边界切分：完整的函数/类为一个切片，相邻的小单元合并到 CHUNK_SIZE 以内
+    metadata 记录 module (模块路径)、symbols (切片内的函数/类，含所属类)、start_line / end_line
+    解析失败 (语法错误、Python 2 代码等) 时退回普通切分器
+    """
+    source = doc.page_content
+    try:
+        units = _python_units(source)
+    except (SyntaxError, ValueError, RecursionError):
+        return get_text_splitter(".py").split_documents([doc])
+
+    lines = source.splitlines(keepends=True)
+    module = module_path(rel_path)
+    chunks = []
+    pending = None  # 正在合并的切片: [起始行, 结束行, 符号列表, 文本]
+
+    def flush():
+        if pending and pending[3].strip():
+            start, end, symbols, text = pending
+            chunks.append(Document(page_content=text, metadata=dict(
+                doc.metadata, module=module, symbols=",".join(s for s in symbols if s),
+                start_line=start, end_line=end
+            )))
+
+    def sub_split(start, text):
+        """单个函数/类本身超长：在单元内部再按 Python 规则切分，并换算各段的行号"""
+        parts = []
+        for part in get_text_splitter(".py").split_documents([Document(page_content=text)]):
+            part_start = start + text[:part.metadata["start_index"]].count("\n")
+            parts.append((part_start, part_start + part.page_content.rstrip("\n").count("\n"), part.page_content))
+        return parts
+
+    # 贪心合并相邻的小单元，减少切片数量；超长单元拆分后的最后一段也可以继续与后面的单元合并
+    for start, end, symbol in units:
+        text = "".join(lines[start - 1:end])
+        pieces = sub_split(start, text) if len(text) > CHUNK_SIZE else [(start, end, text)]
+        for piece_start, piece_end, piece_text in pieces:
+            if pending and len(pending[3]) + len(piece_text) <= CHUNK_SIZE:
+                pending[1] = piece_end
+                pending[3] += piece_text if pending[3].endswith("\n") else "\n" + piece_text
+                if pending[2][-1] != symbol:
+                    pending[2].append(symbol)
+                continue
+            flush()
+            pending = [piece_start, piece_end, [symbol], piece_text]
+    flush()
+    return chunks
+
+
+def split_document(doc, rel_path="", strategy=CHUNK_STRATEGY):
+    """按文件类型切分单个文件"""
+    extension = os.path.splitext(rel_path or doc.metadata.get("source", ""))[1].lower()
+    if strategy != "legacy" and extension == ".py":
+        return split_python_ast(doc, rel_path)
+    return get_text_splitter(extension, strategy).split_documents([doc])
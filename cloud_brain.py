@@ -3,9 +3,8 @@ import os
 os.environ["NO_PROXY"] = "localhost,127.0.0.1"
 
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from telemetry import TelemetryCallback
+from model_clients import get_client
 
 load_dotenv()
 
@@ -16,14 +15,24 @@ CLOUD_LLM_MODEL = "moonshot-v1-8k"
 def build_generator_chain():
     """
     构建生成器链：Context + Question -> Answer
+    由 model_clients 在首次生成回答时调用 (get_client("generator"))，导入 langchain_openai 的开销推迟到此时
     """
+    from langchain_openai import ChatOpenAI
+    from http_clients import get_openai_http_client
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+
     print("🧠 初始化云端大脑 (Kimi Generator)...")
     
     llm = ChatOpenAI(
         model=CLOUD_LLM_MODEL,
         temperature=0.3, # 稍微有点温度，让回答自然些
         api_key=os.getenv("OPENAI_API_KEY"),
-        base_url=os.getenv("OPENAI_API_BASE")
+        base_url=os.getenv("OPENAI_API_BASE"),
+        # 共享连接池，并发 / 限速 / 429 重试由 http_clients 负责
+        http_client=get_openai_http_client(),
+        max_retries=0,
+        callbacks=[TelemetryCallback("llm.generate")]
     )
 
     prompt = ChatPromptTemplate.from_template(
@@ -48,8 +57,9 @@ def build_generator_chain():
     chain = prompt | llm | StrOutputParser()
     return chain
 
-# 实例化
-generator_chain = build_generator_chain()
+def get_generator_chain():
+    """进程内共用的生成器链 (首次调用时构建)"""
+    return get_client("generator")
 
 if __name__ == "__main__":
     print("🚀 Cloud Brain 独立测试")
@@ -73,7 +83,7 @@ if __name__ == "__main__":
     
     try:
         print("💡 Kimi 正在思考...")
-        response = generator_chain.invoke({
+        response = get_generator_chain().invoke({
             "context": mock_context,
             "question": mock_question
         })
@@ -0,0 +1,171 @@
+import os
+from grader import estimate_tokens
+
+# 发送给云端模型的上下文 Token 预算 (估算值)；moonshot-v1-8k 还需为 Prompt 与回答留出空间，0 表示不限制
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "5000"))
+
+# 没有位置信息的切片 (旧版切分)：在前一段末尾这么多字符内查找重叠，重叠至少要这么长才合并
+_TEXT_OVERLAP_WINDOW = 400
+_MIN_TEXT_OVERLAP = 40
+# 同一文件中不相邻的片段之间的分隔
+_GAP_MARKER = "\n...\n"
+# 标题中最多列出的副本路径数 (导入去重后记录在 metadata["aliases"])
+_MAX_ALIASES = 3
+
+
+def source_label(doc):
+    """片段所属文件的简短路径 (优先取 chunk_id 中的仓库内相对路径)；跨项目检索的片段前面加上项目名"""
+    chunk_id = doc.metadata.get("chunk_id")
+    label = chunk_id.rsplit("#", 1)[0] if chunk_id else doc.metadata.get("source", "unknown")
+    project = doc.metadata.get("project")
+    return f"{project}:{label}" if project else label
+
+
+def _span(doc):
+    """片段在文件中的位置：("line", 起始行, 结束行) / ("char", 起始偏移, 结束偏移) / (None, 0, 0)"""
+    metadata = doc.metadata
+    if "start_line" in metadata and "end_line" in metadata:
+        return "line", int(metadata["start_line"]), int(metadata["end_line"])
+    if "start_index" in metadata:
+        start = int(metadata["start_index"])
+        return "char", start, start + len(doc.page_content)
+    return None, 0, 0
+
+
+def _merge_text_overlap(a, b):
+    """无位置信息时按文本判断：b 被 a 包含返回 a；b 的开头与 a 的末尾重叠时返回合并结果；否则返回 None"""
+    if b in a:
+        return a
+    tail = a[-_TEXT_OVERLAP_WINDOW:]
+    idx = tail.find(b[:_MIN_TEXT_OVERLAP])
+    while idx != -1:
+        overlap = len(tail) - idx
+        if b.startswith(tail[idx:]):
+            return a + b[overlap:]
+        idx = tail.find(b[:_MIN_TEXT_OVERLAP], idx + 1)
+    return None
+
+
+def _merge_spans(pieces, kind):
+    """合并同一文件中重叠或相邻的片段 (按位置排序)，返回 [(起始, 结束, 文本)]"""
+    blocks = []
+    for start, end, text in sorted(pieces, key=lambda p: (p[0], p[1])):
+        if blocks:
+            b_start, b_end, b_text = blocks[-1]
+            if end <= b_end:
+                continue  # 完全包含在上一段中
+            if kind == "line" and start <= b_end + 1:
+                overlap = b_end - start + 1
+                rest = "".join(text.splitlines(keepends=True)[overlap:]) if overlap > 0 else text
+                joined = b_text if b_text.endswith("\n") else b_text + "\n"
+                blocks[-1] = (b_start, end, joined + rest)
+                continue
+            if kind == "char" and start <= b_end + 2:
+                overlap = b_end - start
+                rest = text[overlap:] if overlap > 0 else "\n" + text
+                blocks[-1] = (b_start, end, b_text + rest)
+                continue
+        blocks.append((start, end, text))
+    return blocks
+
+
+def _merge_unpositioned(texts):
+    """旧版切分没有位置信息：按文本重叠合并 (切片按文件顺序产生，重叠总在前一段末尾)"""
+    merged = []
+    for text in texts:
+        for i, existing in enumerate(merged):
+            combined = _merge_text_overlap(existing, text) or _merge_text_overlap(text, existing)
+            if combined is not None:
+                merged[i] = combined
+                break
+        else:
+            merged.append(text)
+    return merged
+
+
+def _render(documents):
+    """
+    把按相关性排好序的片段组装成上下文：
+    - 同一文件的片段归为一节，节的顺序取决于其中最相关片段的排名
+    - 节内按位置排序，重叠/相邻的片段合并，内容完全相同的片段只保留一次
+    - 每节以紧凑的文件路径 (及行号范围) 作为标题，去重时合并掉的副本路径附在标题后
+    """
+    sections = {}  # 文件 -> {"line": [...], "char": [...], None: [...]}
+    aliases = {}   # 文件 -> 副本路径
+    seen = set()
+    for doc in documents:
+        text = doc.page_content
+        key = text.strip()
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        kind, start, end = _span(doc)
+        label = source_label(doc)
+        groups = sections.setdefault(label, {})
+        groups.setdefault(kind, []).append((start, end, text) if kind else text)
+        for path in doc.metadata.get("aliases") or ():
+            aliases.setdefault(label, {})[path] = None
+
+    parts = []
+    for label, groups in sections.items():
+        blocks, ranges = [], []
+        for kind in ("line", "char"):
+            for start, end, text in _merge_spans(groups.get(kind, []), kind):
+                blocks.append(text.strip("\n"))
+                if kind == "line":
+                    ranges.append(f"L{start}-{end}")
+        blocks.extend(t.strip("\n") for t in _merge_unpositioned(groups.get(None, [])))
+        header = f"### {label}" + (f" ({', '.join(ranges)})" if ranges else "")
+        copies = list(aliases.get(label, ()))
+        if copies:
+            header += f" [副本: {', '.join(copies[:_MAX_ALIASES])}" + (
+                f" 等 {len(copies)} 个]" if len(copies) > _MAX_ALIASES else "]")
+        parts.append(header + "\n" + _GAP_MARKER.join(blocks))
+    return "\n\n".join(parts), len(parts)
+
+
+def render_context(documents):
+    """组装上下文文本 (不限制 Token 预算)"""
+    return _render(documents)[0]
+
+
+def pack_context(documents, budget=CONTEXT_TOKEN_BUDGET):
+    """
+    按相关性顺序把片段装入 Token 预算：装不下的片段跳过，继续尝试后面更短的片段
+    (合并与去重后再计算，因此与已选片段重叠的片段几乎不占额外预算)
+    :return: (上下文文本, 统计信息 dict)
+    """
+    raw_tokens = estimate_tokens("\n\n".join(d.page_content for d in documents))
+    selected, context, sections = [], "", 0
+    for doc in documents:
+        candidate, n_sections = _render(selected + [doc])
+        if budget <= 0 or estimate_tokens(candidate) <= budget:
+            selected, context, sections = selected + [doc], candidate, n_sections
+
+    truncated = not selected and bool(documents)
+    if truncated:
+        # 最相关的片段本身就超出预算：截断后发送，保证上下文不为空
+        doc = documents[0]
+        text = doc.page_content
+        context, sections = _render([doc])
+        while text and estimate_tokens(context) > budget:
+            text = text[:int(len(text) * 0.9)]
+            context, sections = _render([doc.model_copy(update={"page_content": text})])
+        selected = [doc]
+
+    tokens = estimate_tokens(context)
+    packed_raw = tokens if truncated else estimate_tokens("\n\n".join(d.page_content for d in selected))
+    stats = {
+        "documents": len(documents),
+        "packed": len(selected),
+        "dropped": len(documents) - len(selected),
+        "sections": sections,
+        "truncated": truncated,
+        "raw_tokens": raw_tokens,
+        "tokens": tokens,
+        # 合并重叠/去重节省的部分 (不含因超出预算而丢弃的片段)
+        "merge_saved": max(0, packed_raw - tokens),
+        "saved_tokens": max(0, raw_tokens - tokens),
+        "budget": budget,
+    }
+    return context, stats
@@ -0,0 +1,147 @@
+import os
+import re
+import zlib
+import hashlib
+
+import numpy as np
+
+# 导入阶段的重复切片消除：vendored 依赖、生成文件、复制的示例等产生的重复 / 近似重复切片只向量化一次，
+# 保留第一个出现的切片作为规范切片，其余切片的路径记入规范切片的 metadata["aliases"]
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+# 近似重复的判定阈值：两个切片 shingle 集合的 Jaccard 相似度 (0~1)
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+# 每个 shingle 包含的连续词数
+DEDUP_SHINGLE_SIZE = int(os.getenv("DEDUP_SHINGLE_SIZE", "5"))
+# MinHash 签名长度与 LSH 分段数 (每段 DEDUP_NUM_PERM / DEDUP_BANDS 行，任意一段完全相同即为候选)
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "64"))
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "16"))
+# 词数少于此值的切片只做完全相同的去重 (短片段的近似相似没有意义，例如只有几行 import)
+DEDUP_MIN_TOKENS = int(os.getenv("DEDUP_MIN_TOKENS", "20"))
+
+_TOKEN = re.compile(r"\w+")
+_MERSENNE_PRIME = (1 << 61) - 1
+_SEED = 20240601
+
+
+def normalized_hash(text):
+    """忽略空白差异 (缩进、换行符、行尾空格) 的内容哈希，用于识别完全相同的切片"""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()[:16]
+
+
+def shingles(text, size=DEDUP_SHINGLE_SIZE):
+    """
+    切片的 shingle 集合 (连续 size 个小写词的哈希，排好序且不重复的 uint32 数组) 与词数
+    使用 crc32 而不是内置 hash()，结果在不同进程间稳定，断点续传时去重结果一致
+    """
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) < size:
+        grams = [" ".join(tokens)] if tokens else []
+    else:
+        grams = [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    values = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+    return np.unique(values).astype(np.uint32), len(tokens)
+
+
+def jaccard(a, b):
+    """两个排好序且不重复的 shingle 数组的 Jaccard 相似度"""
+    if not len(a) or not len(b):
+        return 0.0
+    common = len(np.intersect1d(a, b, assume_unique=True))
+    return common / (len(a) + len(b) - common)
+
+
+def alias_path(chunk_id):
+    """切片 ID (<相对路径>#<内容哈希>[-序号]) 对应的文件路径"""
+    return chunk_id.rsplit("#", 1)[0]
+
+
+def group_aliases(duplicates):
+    """
+    重复切片 -> 规范切片 的映射，换算为 规范切片 -> 别名路径列表
+    (排序、去重；同一文件内的重复片段不算别名，没有其他文件副本的规范切片不出现在结果中)
+    """
+    grouped = {}
+    for dup_id, canonical in duplicates.items():
+        path = alias_path(dup_id)
+        if path != alias_path(canonical):
+            grouped.setdefault(canonical, set()).add(path)
+    return {canonical: sorted(paths) for canonical, paths in grouped.items()}
+
+
+class Deduper:
+    """
+    流式去重：按导入顺序逐个检查切片，第一次出现的内容登记为规范切片，之后完全相同或近似重复的切片
+    返回对应的规范切片 ID (调用方跳过向量化)
+    - 完全相同：忽略空白后的内容哈希
+    - 近似重复：MinHash 签名按段做 LSH 找候选，再用 shingle 集合的精确 Jaccard 相似度确认，
+      只有达到阈值的候选才算重复 (宁可漏判，不能误删不同的内容)
+    - 内存中每个规范切片保留 shingle 数组与各段的桶，与切片数成正比 (每个切片约数 KB)
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, shingle_size=DEDUP_SHINGLE_SIZE,
+                 num_perm=DEDUP_NUM_PERM, bands=DEDUP_BANDS, min_tokens=DEDUP_MIN_TOKENS):
+        if bands <= 0 or num_perm % bands:
+            raise ValueError(f"DEDUP_NUM_PERM ({num_perm}) 必须是 DEDUP_BANDS ({bands}) 的整数倍")
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.min_tokens = min_tokens
+        # 哈希族 h(x) = (a * x + b) mod p，a、b < 2^31 且 x < 2^32，乘积不会溢出 uint64
+        rng = np.random.RandomState(_SEED)
+        self._a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+        self._exact = {}                          # 规范化内容哈希 -> 规范切片 ID
+        self._buckets = [{} for _ in range(bands)]  # 每段：签名片段 -> [规范切片序号]
+        self._canonical = []                      # [(规范切片 ID, shingle 数组)]
+        self.duplicates = {}                      # 重复切片 ID -> 规范切片 ID
+        self.checked = self.exact = self.near = 0
+
+    @property
+    def removed(self):
+        return self.exact + self.near
+
+    def signature(self, values):
+        hashed = (values.astype(np.uint64)[:, None] * self._a + self._b) % np.uint64(_MERSENNE_PRIME)
+        return hashed.min(axis=0)
+
+    def check(self, chunk_id, text):
+        """
+        检查一个切片：重复时返回规范切片 ID (并记入 duplicates)，否则登记为规范切片并返回 None
+        """
+        self.checked += 1
+        key = normalized_hash(text)
+        canonical = self._exact.get(key)
+        if canonical is not None:
+            self.exact += 1
+            self.duplicates[chunk_id] = canonical
+            return canonical
+        self._exact[key] = chunk_id
+
+        values, n_tokens = shingles(text, self.shingle_size)
+        if n_tokens < self.min_tokens or not len(values):
+            return None
+        bands = self.signature(values).reshape(self.bands, -1)
+        keys = [band.tobytes() for band in bands]
+        best, best_score = None, 0.0
+        seen = set()
+        for bucket, band_key in zip(self._buckets, keys):
+            for index in bucket.get(band_key, ()):
+                if index in seen:
+                    continue
+                seen.add(index)
+                score = jaccard(values, self._canonical[index][1])
+                if score >= self.threshold and score > best_score:
+                    best, best_score = index, score
+        if best is not None:
+            canonical = self._canonical[best][0]
+            self.near += 1
+            self.duplicates[chunk_id] = canonical
+            # 近似重复的内容也登记完全相同的哈希，之后的完全相同的副本直接命中
+            self._exact[key] = canonical
+            return canonical
+
+        index = len(self._canonical)
+        self._canonical.append((chunk_id, values))
+        for bucket, band_key in zip(self._buckets, keys):
+            bucket.setdefault(band_key, []).append(index)
+        return None
@@ -0,0 +1,117 @@
+import os
+import hashlib
+import threading
+from array import array
+from langchain_core.embeddings import Embeddings
+from sqlite_lru import SQLiteLRUCache
+from telemetry import span
+
+# 向量缓存：按 (模型名, 文本 sha256) 寻址，所有项目共用一份
+# 同一段文本 (fork 的仓库、vendored 依赖、LICENSE、重复导入) 只需向量化一次
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join("embedding_cache", "embeddings.sqlite"))
+# 缓存条目上限，超出后按最近使用时间 (LRU) 淘汰
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "500000"))
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache(SQLiteLRUCache):
+    """
+    基于 SQLite 的向量缓存 (线程安全，WAL 模式支持多进程共享)
+    向量以 float32 二进制存储
+    """
+
+    table = "embeddings"
+    scope_columns = ("model",)
+    hash_column = "text_hash"
+    value_columns = ("vector",)
+    schema = (
+        """CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (model, text_hash)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)",
+    )
+    label = "Embed Cache"
+
+    def __init__(self, path=EMBED_CACHE_PATH, max_entries=EMBED_CACHE_MAX_ENTRIES):
+        super().__init__(path, max_entries)
+
+    def get_many(self, model, hashes):
+        """批量查询，返回 {text_hash: 向量}，命中的条目会刷新最近使用时间"""
+        found = {}
+        for h, (blob,) in self._get((model,), hashes).items():
+            vec = array("f")
+            vec.frombytes(blob)
+            found[h] = vec.tolist()
+        return found
+
+    def put_many(self, model, items):
+        """批量写入 {text_hash: 向量}，写入后按需淘汰"""
+        self._put((model,), {h: (array("f", vec).tobytes(),) for h, vec in items.items()})
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    向量缓存包装器：先查缓存，只把未命中的文本交给底层模型 (如 OllamaEmbeddings)
+    """
+
+    def __init__(self, underlying, model_name, cache=None):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache = cache or get_embedding_cache()
+
+    def embed_documents(self, texts):
+        with span("embed.documents", texts=len(texts)) as s:
+            hashes = [text_hash(t) for t in texts]
+            found = self.cache.get_many(self.model_name, hashes)
+
+            # 未命中的文本去重后再调用模型
+            pending = {}
+            for h, t in zip(hashes, texts):
+                if h not in found and h not in pending:
+                    pending[h] = t
+            s.set(cache_hits=len(texts) - len(pending), computed=len(pending))
+            if pending:
+                vectors = self.underlying.embed_documents(list(pending.values()))
+                computed = dict(zip(pending.keys(), vectors))
+                self.cache.put_many(self.model_name, computed)
+                found.update(computed)
+            return [found[h] for h in hashes]
+
+    def embed_query(self, text):
+        with span("embed.query") as s:
+            h = text_hash(text)
+            found = self.cache.get_many(self.model_name, [h])
+            if h in found:
+                s.set(cache_hits=1)
+                return found[h]
+            vector = self.underlying.embed_query(text)
+            self.cache.put_many(self.model_name, {h: vector})
+            s.set(computed=1)
+            return vector
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """进程内共享的缓存实例"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+def format_stats(stats):
+    return (
+        f"命中 {stats['hits']} / 未命中 {stats['misses']} "
+        f"(命中率 {stats['hit_rate']:.1%})，缓存 {stats['entries']} 条，淘汰 {stats['evictions']} 条"
+    )
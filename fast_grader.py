@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from lexical_index import tokenize
+from flat_store import relevance_from_cosine
+from symbol_index import query_identifiers
+from telemetry import record
+from model_clients import get_client
+
+# 校准结果 (特征权重与阈值)，由 python main.py calibrate-grader 根据评分样本生成，所有项目共用
+GRADER_CALIBRATION_PATH = os.getenv(
+    "GRADER_CALIBRATION_PATH", os.path.join("embedding_cache", "grader_calibration.json")
+)
+# 记录 LLM 评分样本 (只保存特征与评分，不保存问题与代码)，作为校准数据
+# 默认关闭：开启后每次 LLM 评分都会在后台提取特征 (只被 BM25 命中的切片需要调用向量模型)，校准前临时开启即可
+GRADER_SAMPLE_LOG = os.getenv("GRADER_SAMPLE_LOG", "false").lower() == "true"
+GRADER_SAMPLE_PATH = os.getenv("GRADER_SAMPLE_PATH", os.path.join("embedding_cache", "grader_samples.jsonl"))
+# 样本文件超过该大小 (MB) 后轮转为 .1，校准时两份都会读取
+GRADER_SAMPLE_MAX_MB = float(os.getenv("GRADER_SAMPLE_MAX_MB", "20"))
+# fast / cascade 下按该比例抽取查询，在后台用 LLM 复评快速判定的文档，统计一致率 (0 表示不抽样)
+GRADER_SHADOW_RATE = float(os.getenv("GRADER_SHADOW_RATE", "0"))
+# 校准 cascade 阈值时要求的精确率：直接判定为 no / yes 的区间内，与 LLM 评分一致的比例不低于该值
+GRADER_CASCADE_PRECISION = float(os.getenv("GRADER_CASCADE_PRECISION", "0.95"))
+
+FEATURES = ("similarity", "overlap", "identifier")
+# 未校准时的保守默认值：cascade 只直接判定明显无关 / 明显相关的文档
+DEFAULT_CALIBRATION = {
+    "weights": {"similarity": 1.0, "overlap": 0.5, "identifier": 0.5},
+    "partial": 0.6, "yes": 0.9, "cascade_no": 0.35, "cascade_yes": 1.4, "samples": 0,
+}
+_GRADE_LABELS = {"no": 0, "partial": 1, "yes": 2}
+# 问题中的常见虚词不参与词重叠
+_STOPWORDS = {
+    "the", "a", "an", "is", "are", "do", "does", "did", "how", "what", "which", "where", "when", "why", "who",
+    "to", "of", "in", "on", "for", "with", "by", "and", "or", "it", "its", "this", "that", "be", "can", "i",
+    "my", "we", "you", "from", "as", "at", "used", "use", "if", "into", "there",
+    "如何", "怎么", "什么", "哪些", "哪个", "是否", "可以", "这个", "一个",
+}
+# 评分特征与样本记录在后台线程中进行，不占用查询的关键路径
+_background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grader-bg")
+
+
+def load_calibration(path=GRADER_CALIBRATION_PATH):
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return {**DEFAULT_CALIBRATION, **json.load(f)}
+        except Exception as e:
+            print(f"⚠️ 评分校准文件读取失败，使用默认阈值: {e}")
+    return dict(DEFAULT_CALIBRATION)
+
+
+def save_calibration(calibration, path=GRADER_CALIBRATION_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_samples(path=GRADER_SAMPLE_PATH):
+    """读取样本 (含轮转后的 .1 文件)，返回 (特征矩阵, 评分标签 0/1/2)"""
+    features, labels = [], []
+    for sample_path in (path + ".1", path):
+        if not os.path.exists(sample_path):
+            continue
+        with open(sample_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    sample = json.loads(line)
+                    features.append([float(x) for x in sample["f"]])
+                    labels.append(_GRADE_LABELS[sample["g"]])
+                except (ValueError, KeyError, TypeError):
+                    continue  # 写入中断的半行
+    return np.asarray(features, dtype=np.float64).reshape(-1, len(FEATURES)), np.asarray(labels, dtype=np.int64)
+
+
+def _fit_thresholds(scores, labels, precision):
+    """
+    在分数的分位点上搜索阈值：
+    - partial / yes：三分类与 LLM 评分一致的样本数最多
+    - cascade_no / cascade_yes：低于 cascade_no 的样本中 no 的比例、不低于 cascade_yes 的样本中 yes 的比例均达到 precision，
+      在此前提下让直接判定的区间尽量大
+    """
+    candidates = np.unique(np.concatenate([np.quantile(scores, np.linspace(0, 1, 65)), [np.inf]]))
+    # below[label][i] = 分数低于 candidates[i] 的该类样本数
+    below = {label: np.searchsorted(np.sort(scores[labels == label]), candidates, side="left") for label in (0, 1, 2)}
+    totals = {label: int((labels == label).sum()) for label in (0, 1, 2)}
+    # agreement[p, y] = no 在 t_p 之下 + partial 在 [t_p, t_y) + yes 在 t_y 及以上
+    agreement = (below[0][:, None] + (below[1][None, :] - below[1][:, None]) + (totals[2] - below[2][None, :]))
+    agreement = np.where(np.triu(np.ones_like(agreement, dtype=bool)), agreement, -1)
+    p, y = np.unravel_index(np.argmax(agreement), agreement.shape)
+
+    n_below = below[0] + below[1] + below[2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        no_precision = np.where(n_below > 0, below[0] / n_below, 0)
+        n_above = len(scores) - n_below
+        yes_precision = np.where(n_above > 0, (totals[2] - below[2]) / n_above, 0)
+    no_ok = np.nonzero(no_precision >= precision)[0]
+    yes_ok = np.nonzero(yes_precision >= precision)[0]
+    cascade_no = float(candidates[no_ok.max()]) if len(no_ok) else float(candidates[0])
+    cascade_yes = float(candidates[yes_ok.min()]) if len(yes_ok) else float("inf")
+    return {
+        "partial": float(candidates[p]), "yes": float(candidates[y]),
+        "cascade_no": min(cascade_no, cascade_yes), "cascade_yes": cascade_yes,
+        "agreement": float(agreement[p, y] / len(scores)),
+    }
+
+
+def calibrate(features, labels, precision=GRADER_CASCADE_PRECISION):
+    """网格搜索特征权重 (每组权重各自拟合阈值)，取三分类一致率最高的一组"""
+    best = None
+    for w_sim in (0.0, 1.0):
+        for w_overlap in (0.0, 0.25, 0.5, 1.0, 2.0):
+            for w_ident in (0.0, 0.25, 0.5, 1.0, 2.0):
+                weights = np.array([w_sim, w_overlap, w_ident])
+                if not weights.any():
+                    continue
+                fitted = _fit_thresholds(features @ weights, labels, precision)
+                if best is None or fitted["agreement"] > best["agreement"]:
+                    best = dict(fitted, weights=dict(zip(FEATURES, weights.tolist())))
+    scores = features @ np.array([best["weights"][name] for name in FEATURES])
+    auto = (scores < best["cascade_no"]) | (scores >= best["cascade_yes"])
+    auto_agree = ((scores < best["cascade_no"]) & (labels == 0)) | ((scores >= best["cascade_yes"]) & (labels == 2))
+    best.update({
+        "samples": int(len(labels)),
+        # cascade 直接判定 (不调用 LLM) 的样本比例，以及这部分与 LLM 评分的一致率
+        "cascade_auto_share": float(auto.mean()),
+        "cascade_auto_agreement": float(auto_agree.sum() / auto.sum()) if auto.any() else 1.0,
+        "created": time.time(),
+    })
+    return best
+
+
+class FastGrader:
+    """
+    非 LLM 评分引擎：按 问题-切片相似度、词重叠、标识符命中 三个特征的加权和给出 yes / partial / no
+    - fast：直接按 partial / yes 两个阈值三分类
+    - cascade (triage)：低于 cascade_no 判 no、不低于 cascade_yes 判 yes，中间的交给 LLM
+    - 阈值与权重来自 LLM 评分样本的校准结果，未校准时使用保守默认值
+    """
+
+    def __init__(self, embeddings=None, calibration_path=GRADER_CALIBRATION_PATH, sample_path=GRADER_SAMPLE_PATH,
+                 sample_log=GRADER_SAMPLE_LOG, shadow_rate=GRADER_SHADOW_RATE):
+        self.embeddings = embeddings
+        self.calibration = load_calibration(calibration_path)
+        self.sample_path = sample_path
+        self.sample_log = sample_log
+        self.shadow_rate = shadow_rate
+        self._weights = np.array([self.calibration["weights"][name] for name in FEATURES])
+        self._lock = threading.Lock()
+        self.counts = {"fast_graded": 0, "llm_graded": 0, "shadow_compared": 0, "shadow_agreed": 0}
+        if not self.calibration.get("samples"):
+            print("⚠️ [Grader] 快速评分尚未校准，使用默认阈值 (python main.py calibrate-grader)")
+
+    def features(self, question, documents):
+        """与 documents 一一对应的特征矩阵 (列顺序见 FEATURES)"""
+        terms = set(tokenize(question)) - _STOPWORDS
+        identifiers = query_identifiers(question)
+        missing = [i for i, d in enumerate(documents) if "score" not in d.metadata]
+        similarity = [d.metadata.get("score", 0.0) for d in documents]
+        if missing and self.embeddings is not None:
+            # 只被 BM25 命中的切片没有向量分数，现场计算 (向量走共享缓存，导入时已算过)
+            query_vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+            vectors = np.asarray(self.embeddings.embed_documents([documents[i].page_content for i in missing]),
+                                 dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+            cosines = vectors @ query_vector / np.where(norms == 0, 1.0, norms)
+            for i, cosine in zip(missing, cosines):
+                similarity[i] = relevance_from_cosine(float(cosine))
+        rows = []
+        for doc, sim in zip(documents, similarity):
+            doc_terms = set(tokenize(doc.page_content)) if terms else set()
+            overlap = len(terms & doc_terms) / len(terms) if terms else 0.0
+            ident = sum(1 for name in identifiers if name in doc.page_content) / len(identifiers) if identifiers else 0.0
+            rows.append([float(sim), overlap, ident])
+        return np.asarray(rows, dtype=np.float64).reshape(-1, len(FEATURES))
+
+    def scores(self, question, documents):
+        return self.features(question, documents) @ self._weights
+
+    def grade(self, question, documents):
+        """fast 引擎：全部文档直接三分类"""
+        scores = self.scores(question, documents)
+        grades = [
+            "yes" if s >= self.calibration["yes"] else "partial" if s >= self.calibration["partial"] else "no"
+            for s in scores
+        ]
+        self._count(fast_graded=len(grades))
+        return grades
+
+    def triage(self, question, documents):
+        """cascade 引擎：明显无关判 no、明显相关判 yes，其余为 None (交给 LLM)"""
+        scores = self.scores(question, documents)
+        grades = [
+            "no" if s < self.calibration["cascade_no"] else "yes" if s >= self.calibration["cascade_yes"] else None
+            for s in scores
+        ]
+        self._count(fast_graded=sum(1 for g in grades if g is not None))
+        return grades
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self.counts[key] += value
+
+    def record_llm_grades(self, question, documents, grades):
+        """LLM 给出的有效评分：计数，并在后台提取特征写入样本文件"""
+        self._count(llm_graded=len(documents))
+        if self.sample_log and documents:
+            _background.submit(self._write_samples, question, list(documents), list(grades))
+
+    def _write_samples(self, question, documents, grades):
+        try:
+            features = self.features(question, documents)
+            os.makedirs(os.path.dirname(self.sample_path) or ".", exist_ok=True)
+            if os.path.exists(self.sample_path) and os.path.getsize(self.sample_path) > GRADER_SAMPLE_MAX_MB * 1024 * 1024:
+                os.replace(self.sample_path, self.sample_path + ".1")
+            with open(self.sample_path, "a", encoding="utf-8") as f:
+                for row, grade in zip(features, grades):
+                    f.write(json.dumps({"f": [round(x, 4) for x in row.tolist()], "g": grade}) + "\n")
+        except Exception as e:
+            print(f"⚠️ 评分样本写入失败: {e}")
+
+    def maybe_shadow(self, question, documents, grades, llm_grade):
+        """
+        抽样复评：在后台用 LLM 重新评分快速判定的文档，统计一致率 (记为 grade.shadow span)
+        :param llm_grade: 回调 llm_grade(documents) -> 评分列表
+        """
+        if not documents or self.shadow_rate <= 0 or random.random() >= self.shadow_rate:
+            return
+        context = contextvars.copy_context()
+        _background.submit(context.run, self._shadow, question, list(documents), list(grades), llm_grade)
+
+    def _shadow(self, question, documents, grades, llm_grade):
+        start = time.perf_counter()
+        try:
+            reference = llm_grade(documents)
+        except Exception as e:
+            record("grade.shadow", time.perf_counter() - start, error=str(e))
+            return
+        agreed = sum(1 for a, b in zip(grades, reference) if a == b)
+        self._count(shadow_compared=len(documents), shadow_agreed=agreed)
+        record("grade.shadow", time.perf_counter() - start, compared=len(documents), agreed=agreed)
+        self.record_llm_grades(question, documents, reference)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        compared = counts["shadow_compared"]
+        return {
+            **counts,
+            "shadow_agreement": round(counts["shadow_agreed"] / compared, 4) if compared else None,
+            "calibration_samples": self.calibration.get("samples", 0),
+            "calibration_agreement": self.calibration.get("agreement"),
+        }
+
+
+_fast_grader = None
+_fast_grader_lock = threading.Lock()
+
+
+def get_fast_grader():
+    """进程内共用的快速评分引擎 (所有项目共用同一份校准结果)"""
+    global _fast_grader
+    with _fast_grader_lock:
+        if _fast_grader is None:
+            _fast_grader = FastGrader(embeddings=get_client("embeddings"))
+        return _fast_grader
+
+
+def run_calibration(sample_path=GRADER_SAMPLE_PATH, calibration_path=GRADER_CALIBRATION_PATH):
+    """根据样本文件校准并保存 (python main.py calibrate-grader)"""
+    features, labels = load_samples(sample_path)
+    if len(labels) < 50:
+        print(f"⚠️ 评分样本不足 ({len(labels)} 条，至少 50 条)，先以 GRADER_ENGINE=llm、GRADER_SAMPLE_LOG=true 运行一段时间")
+        return None
+    calibration = calibrate(features, labels)
+    save_calibration(calibration, calibration_path)
+    counts = np.bincount(labels, minlength=3)
+    print(f"📐 评分校准完成: {len(labels)} 条样本 (no {counts[0]} / partial {counts[1]} / yes {counts[2]})")
+    print(f"   权重 {calibration['weights']}，阈值 partial {calibration['partial']:.3f} / yes {calibration['yes']:.3f}")
+    print(f"   fast 与 LLM 一致率 {calibration['agreement']:.1%}")
+    print(f"   cascade: < {calibration['cascade_no']:.3f} 判 no，>= {calibration['cascade_yes']:.3f} 判 yes，"
+          f"直接判定 {calibration['cascade_auto_share']:.1%} 的文档 (一致率 {calibration['cascade_auto_agreement']:.1%})")
+    return calibration
@@ -0,0 +1,181 @@
+import os
+import time
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from local_worker import RRF_K
+from model_clients import get_client
+from telemetry import span
+
+# 跨项目检索：问题并行发往每个项目 (或选定的子集) 的检索器，归一化分数后按项目配额合并，结果标注项目名
+# 合并后保留的片段数 (之后照常进入评分 / 生成)
+FEDERATED_K = int(os.getenv("FEDERATED_K", "20"))
+# 单个项目最多贡献的片段数，避免一个大项目占满上下文
+FEDERATED_PROJECT_QUOTA = int(os.getenv("FEDERATED_PROJECT_QUOTA", "6"))
+# 单个项目检索 (含首次加载) 的等待上限 (秒)，从分片开始执行时计时，超时的项目本次不参与合并，0 表示一直等待
+# (线程池被占满时，提交后这么久仍未开始执行的分片直接取消)
+FEDERATED_SHARD_TIMEOUT = float(os.getenv("FEDERATED_SHARD_TIMEOUT", "30"))
+# 同时检索的项目数上限
+FEDERATED_MAX_WORKERS = int(os.getenv("FEDERATED_MAX_WORKERS", "8"))
+# 缓存编译好的跨项目 Graph 的组合数 (按项目集合区分)
+_GRAPH_CACHE_SIZE = 8
+
+_shard_executor = ThreadPoolExecutor(max_workers=FEDERATED_MAX_WORKERS, thread_name_prefix="federated")
+
+
+def normalize_shard(documents, rrf_k=RRF_K):
+    """
+    把一个项目的检索结果换算为可跨项目比较的分数 (写入 metadata["federated_score"])
+    各项目的原始分数量纲不同 (混合检索是 RRF 分数，纯向量检索是相似度)，直接比较没有意义，
+    因此与混合检索的融合方式一致，按分片内的排名换算为倒数排名分数 1 / (rrf_k + rank)
+    """
+    for rank, doc in enumerate(documents, start=1):
+        doc.metadata["federated_score"] = 1.0 / (rrf_k + rank)
+    return documents
+
+
+def merge_shards(results, k=FEDERATED_K, quota=FEDERATED_PROJECT_QUOTA):
+    """按归一化分数合并各项目的结果，每个项目最多 quota 个，共 k 个 (results: 项目名 -> 已归一化的文档列表)"""
+    candidates = [doc for documents in results.values() for doc in documents]
+    # 排名相同的片段按向量相关度排序 (各项目的嵌入模型相同，相似度可以比较)
+    candidates.sort(key=lambda d: (d.metadata["federated_score"], d.metadata.get("score", 0.0)), reverse=True)
+    merged, per_project = [], {}
+    for doc in candidates:
+        project = doc.metadata["project"]
+        if quota > 0 and per_project.get(project, 0) >= quota:
+            continue
+        per_project[project] = per_project.get(project, 0) + 1
+        merged.append(doc)
+        if len(merged) >= k:
+            break
+    return merged
+
+
+class FederatedRetriever(BaseRetriever):
+    """
+    跨项目检索器：每次查询时从项目缓存中取各项目的检索器并行检索 (未加载的项目在各自的线程中并行加载)，
+    耗时取决于最慢的项目而不是所有项目之和
+    - projects 为空时检索所有已导入的项目 (查询时重新列出，新导入的项目自动加入)
+    - 检索期间持有各项目，避免被并发的淘汰关闭向量库连接
+    """
+    registry: Any
+    projects: Optional[List[str]] = None
+    k: int = FEDERATED_K
+    quota: int = FEDERATED_PROJECT_QUOTA
+    timeout: float = FEDERATED_SHARD_TIMEOUT
+
+    def resolve_projects(self):
+        from ingest import list_existing_projects
+        existing = list_existing_projects()
+        if not self.projects:
+            return sorted(existing)
+        return [name for name in self.projects if name in existing]
+
+    def _search_shard(self, name, query):
+        with span("retrieve.shard", project=name) as s:
+            with self.registry.use(name) as project:
+                documents = project.retriever.invoke(query)
+            for doc in documents:
+                doc.metadata["project"] = name
+            s.set(docs_out=len(documents))
+        return normalize_shard(documents)
+
+    def _gather(self, names, query):
+        """
+        并行检索各项目，返回 (结果, 失败数, 超时的项目, 未开始即取消的项目)
+        超时从分片开始执行时计算，在线程池中排队等待 (如其他查询的分片占满线程) 的时间不计入；
+        提交后 timeout 秒仍未开始执行的分片直接取消，不再占用线程池
+        """
+        submitted = time.monotonic()
+        started = {}
+
+        def run(name):
+            started[name] = time.monotonic()
+            return self._search_shard(name, query)
+
+        # 在当前上下文中执行，各项目的 retrieve.shard 属于同一个 trace
+        futures = {_shard_executor.submit(contextvars.copy_context().run, run, name): name for name in names}
+        pending = set(futures)
+        results, failed, timed_out, cancelled = {}, 0, [], []
+        while pending:
+            wait_for = None
+            if self.timeout:
+                now = time.monotonic()
+                for future in [f for f in pending if not f.done()]:
+                    name = futures[future]
+                    if name not in started and now - submitted >= self.timeout:
+                        if future.cancel():
+                            pending.discard(future)
+                            cancelled.append(name)
+                            continue
+                        # 恰好开始执行，从现在起计时
+                        started.setdefault(name, now)
+                    if name in started and now - started[name] >= self.timeout:
+                        # 已在执行的线程无法中断，结果不再等待
+                        pending.discard(future)
+                        timed_out.append(name)
+                if not pending:
+                    break
+                # 等到最早的截止时间 (未开始的分片按提交时间计算，开始执行后的截止时间只会更晚)
+                wait_for = max(0.0, min(started.get(futures[f], submitted) for f in pending) + self.timeout - now)
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                try:
+                    results[futures[future]] = future.result()
+                except Exception:
+                    # 错误已记录在该项目的 retrieve.shard 中
+                    failed += 1
+        return results, failed, sorted(timed_out), sorted(cancelled)
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        names = self.resolve_projects()
+        if not names:
+            return []
+        with span("retrieve.federated", projects=len(names)) as s:
+            if len(names) > self.registry.max_projects:
+                # 参与检索的项目数超过 PROJECT_CACHE_MAX_PROJECTS，每次查询都会重新加载部分项目
+                s.set(over_capacity=len(names) - self.registry.max_projects)
+            # 先算一次问题向量 (写入向量缓存)，各项目检索时直接命中，不会对同一问题并发请求多次 Ollama
+            get_client("embeddings").embed_query(query)
+
+            results, failed, timed_out, cancelled = self._gather(names, query)
+            merged = merge_shards(results, k=self.k, quota=self.quota)
+            contributed = {}
+            for doc in merged:
+                contributed[doc.metadata["project"]] = contributed.get(doc.metadata["project"], 0) + 1
+            s.set(shards_ok=len(results), shards_failed=failed, shards_timed_out=len(timed_out),
+                  shards_cancelled=len(cancelled), timed_out=timed_out + cancelled,
+                  contributed=contributed, docs_out=len(merged))
+        return merged
+
+
+_graphs = OrderedDict()
+_graphs_lock = threading.Lock()
+
+
+def get_federated_graph(projects=None, registry=None):
+    """跨项目查询用的 Graph (与单项目相同的 检索 -> 评分 -> 生成 流程)，按项目集合缓存"""
+    from project_registry import get_project_registry, get_shared_grader_chains
+    from graph_brain import build_graph
+    registry = registry or get_project_registry()
+    key = (id(registry), tuple(sorted(projects or ())))
+    with _graphs_lock:
+        graph = _graphs.get(key)
+        if graph is not None:
+            _graphs.move_to_end(key)
+            return graph
+    retriever = FederatedRetriever(registry=registry, projects=list(projects or []) or None)
+    grader_chain, batch_chain = get_shared_grader_chains()
+    graph = build_graph(retriever, grader_chain=grader_chain, batch_chain=batch_chain)
+    with _graphs_lock:
+        _graphs[key] = graph
+        while len(_graphs) > _GRAPH_CACHE_SIZE:
+            _graphs.popitem(last=False)
+    return graph
@@ -0,0 +1,363 @@
+import os
+import json
+import mmap
+import math
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+
+# 向量库后端 (新导入的项目)：chroma / flat；已导入的项目按目录中的文件自动识别，不受该配置影响
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# flat 后端的向量存储精度：float16 (默认) / int8 (按行对称量化，体积再减半)
+VECTOR_FLAT_DTYPE = os.getenv("VECTOR_FLAT_DTYPE", "float16")
+
+# 状态文件：维度、精度、已提交的行数、删除标记与文件代号；写入该文件即提交一批数据
+FLAT_INDEX_FILENAME = "flat_index.json"
+# 正文与元数据旁路文件 (每行 "id\t{text, metadata}")，查询时按偏移读取，不常驻内存
+FLAT_DOCS_PREFIX = "flat_docs"
+CHROMA_FILENAME = "chroma.sqlite3"
+# 分块计算相似度：float16 / int8 逐块转换到复用的 float32 缓冲区再走 BLAS，块小到能留在 CPU 缓存中
+_BLOCK_ROWS = 1024
+# 关闭写入时，删除的行超过该比例则压缩重写
+_COMPACT_RATIO = 0.25
+
+
+def detect_backend(db_path):
+    """已有项目按目录中的文件识别后端，新项目使用 VECTOR_BACKEND"""
+    if os.path.exists(os.path.join(db_path, FLAT_INDEX_FILENAME)):
+        return "flat"
+    if os.path.exists(os.path.join(db_path, CHROMA_FILENAME)):
+        return "chroma"
+    return VECTOR_BACKEND
+
+
+def open_vector_store(db_path, embedding_function):
+    """打开项目的向量库 (Chroma 或 FlatVectorStore，两者提供导入与检索用到的同一组方法)"""
+    if detect_backend(db_path) == "flat":
+        return FlatVectorStore(db_path, embedding_function)
+    from langchain_community.vectorstores import Chroma
+    return Chroma(persist_directory=db_path, embedding_function=embedding_function)
+
+
+def relevance_from_cosine(cosine):
+    """
+    余弦相似度 -> 相关性：沿用 Chroma 默认 (L2 平方距离) 的换算 1 - (2 - 2cos) / √2，
+    并截断到 [0, 1] (余弦低于约 0.29 时为 0)，两种后端的分数与阈值类配置 (EARLY_EXIT_MIN_SCORE 等) 通用
+    """
+    return min(1.0, max(0.0, 1.0 - (2.0 - 2.0 * cosine) / math.sqrt(2)))
+
+
+def search_with_relevance(vectorstore, query, k):
+    """
+    返回 [(Document, 相关性 0~1)]，按相关性从高到低
+    Chroma 直接取距离再按集合的距离类型换算并截断，不经过 similarity_search_with_relevance_scores
+    (未归一化或方向相反的向量会换算出负数，langchain 只告警不处理)
+    """
+    if isinstance(vectorstore, FlatVectorStore):
+        return vectorstore.similarity_search_with_relevance_scores(query, k=k)
+    to_relevance = vectorstore._select_relevance_score_fn()
+    return [
+        (doc, min(1.0, max(0.0, to_relevance(distance))))
+        for doc, distance in vectorstore.similarity_search_with_score(query, k=k)
+    ]
+
+
+class FlatVectorStore:
+    """
+    紧凑的内存映射向量库：适合中小型仓库的精确 (暴力) 检索
+    - 向量归一化后以 float16 或 int8 (每行一个缩放系数) 追加写入二进制文件，查询时内存映射，按块矩阵乘法求 Top-K
+    - 正文与元数据追加写入 JSONL 旁路文件，内存中只保留 ID 与行偏移
+    - 删除只做标记；写入端关闭时删除过多则压缩重写 (新文件代号 + 原子替换状态文件)
+    - 写入线程安全 (导入时多个批次并发写入)；读取端打开后看到的是打开时已提交的数据
+    """
+
+    def __init__(self, db_path, embedding_function, dtype=VECTOR_FLAT_DTYPE):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"不支持的 VECTOR_FLAT_DTYPE: {dtype}")
+        self.db_path = db_path
+        self.embedding_function = embedding_function
+        self._lock = threading.Lock()
+        self._writable = False
+        self._vectors = self._scales = self._docs = None
+        state = self._read_state()
+        self.dim = state.get("dim")
+        self.dtype = state.get("dtype", dtype)
+        self.rows = state.get("rows", 0)
+        self.generation = state.get("generation", 0)
+        self._deleted = set(state.get("deleted", []))
+        self._deleted_rows = None
+        self._load_ids()
+
+    # ---------- 文件与状态 ----------
+
+    def _path(self, kind, generation=None):
+        generation = self.generation if generation is None else generation
+        suffix = "jsonl" if kind == FLAT_DOCS_PREFIX else "bin"
+        return os.path.join(self.db_path, f"{kind}.{generation}.{suffix}")
+
+    def _read_state(self):
+        path = os.path.join(self.db_path, FLAT_INDEX_FILENAME)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_state(self):
+        path = os.path.join(self.db_path, FLAT_INDEX_FILENAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self.dim, "dtype": self.dtype, "rows": self.rows,
+                "generation": self.generation, "deleted": sorted(self._deleted),
+            }, f)
+        os.replace(tmp_path, path)
+
+    def _load_ids(self):
+        """只读取已提交行的 ID 与偏移 (正文按需读取)"""
+        self.ids = []
+        self._offsets = [0]
+        self._row_of = {}
+        path = self._path(FLAT_DOCS_PREFIX)
+        if not self.rows or not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            for row, line in enumerate(f):
+                if row >= self.rows:
+                    break
+                doc_id = json.loads(line.split(b"\t", 1)[0])
+                self.ids.append(doc_id)
+                self._offsets.append(self._offsets[-1] + len(line))
+                if row not in self._deleted:
+                    self._row_of[doc_id] = row
+
+    def _prepare_write(self):
+        """首次写入前截掉上次中断时写了一半、未提交的数据 (读取端从不截断，避免影响进行中的导入)"""
+        if self._writable:
+            return
+        os.makedirs(self.db_path, exist_ok=True)
+        width = self._row_bytes()
+        for kind, size in (("flat_vectors", self.rows * width), ("flat_scales", self.rows * 4),
+                           (FLAT_DOCS_PREFIX, self._offsets[-1])):
+            path = self._path(kind)
+            if kind == "flat_scales" and self.dtype != "int8":
+                continue
+            with open(path, "ab") as f:
+                f.truncate(size)
+        self._writable = True
+
+    def _row_bytes(self):
+        return (self.dim or 0) * (2 if self.dtype == "float16" else 1)
+
+    def _release_maps(self):
+        self._vectors = self._scales = None
+        if self._docs is not None:
+            self._docs.close()
+            self._docs = None
+
+    # ---------- 写入 ----------
+
+    def _encode(self, vectors):
+        """归一化 (余弦相似度 = 点积) 后按精度编码，返回 (编码后的矩阵, 每行缩放系数或 None)"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def add_documents(self, documents, ids=None):
+        """向量化并追加写入 (同一 ID 再次写入时覆盖旧行)"""
+        if not documents:
+            return []
+        ids = list(ids) if ids is not None else [d.metadata.get("chunk_id") or str(i) for i, d in enumerate(documents)]
+        # 向量化在锁外进行，多个批次可并发请求模型
+        vectors = np.asarray(
+            self.embedding_function.embed_documents([d.page_content for d in documents]), dtype=np.float32
+        )
+        lines = [
+            (json.dumps(doc_id) + "\t" + json.dumps(
+                {"text": d.page_content, "metadata": d.metadata}, ensure_ascii=False, default=str
+            ) + "\n").encode("utf-8")
+            for doc_id, d in zip(ids, documents)
+        ]
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度不一致: {vectors.shape[1]} != {self.dim}")
+            self._prepare_write()
+            encoded, scales = self._encode(vectors)
+            self._append_rows(ids, lines, encoded, scales)
+        return ids
+
+    def _append_rows(self, ids, lines, encoded, scales):
+        """追加已编码的行并提交 (调用方持有锁)；同一 ID 的旧行标记删除"""
+        self._release_maps()
+        with open(self._path("flat_vectors"), "ab") as f:
+            f.write(encoded.tobytes())
+        if scales is not None:
+            with open(self._path("flat_scales"), "ab") as f:
+                f.write(scales.tobytes())
+        with open(self._path(FLAT_DOCS_PREFIX), "ab") as f:
+            f.writelines(lines)
+        for doc_id, line in zip(ids, lines):
+            old = self._row_of.get(doc_id)
+            if old is not None:
+                self._deleted.add(old)
+            self._row_of[doc_id] = self.rows
+            self.ids.append(doc_id)
+            self._offsets.append(self._offsets[-1] + len(line))
+            self.rows += 1
+        self._deleted_rows = None
+        self._write_state()
+
+    def update_metadata(self, ids, metadatas):
+        """
+        合并更新已写入切片的元数据 (与 Chroma 的 update 一致：值为 None 的键删除，不存在的 ID 忽略)
+        复制原行的向量追加为新行、旧行标记删除，不重新向量化
+        """
+        with self._lock:
+            rows, lines = [], []
+            for doc_id, patch in zip(ids, metadatas):
+                row = self._row_of.get(doc_id)
+                if row is None:
+                    continue
+                doc = self._read_document(row)
+                metadata = {k: v for k, v in {**doc.metadata, **patch}.items() if v is not None}
+                rows.append(row)
+                lines.append((json.dumps(doc_id) + "\t" + json.dumps(
+                    {"text": doc.page_content, "metadata": metadata}, ensure_ascii=False, default=str
+                ) + "\n").encode("utf-8"))
+            if not rows:
+                return
+            self._prepare_write()
+            vectors, scales = self._matrix()
+            index = np.asarray(rows, dtype=np.int64)
+            # 先复制出来再释放内存映射，之后才能追加写入同一文件
+            encoded = np.array(vectors[index])
+            scales = np.array(scales[index]) if scales is not None else None
+            self._append_rows([self.ids[row] for row in rows], lines, encoded, scales)
+
+    def delete(self, ids=None):
+        with self._lock:
+            for doc_id in ids or []:
+                row = self._row_of.pop(doc_id, None)
+                if row is not None:
+                    self._deleted.add(row)
+            self._deleted_rows = None
+            self._write_state()
+
+    def compact(self):
+        """只保留未删除的行，写入新代号的文件后原子切换状态文件，再删除旧文件"""
+        with self._lock:
+            live = [row for row in range(self.rows) if row not in self._deleted]
+            old_generation, new_generation = self.generation, self.generation + 1
+            vectors, scales = self._matrix()
+            live_index = np.asarray(live, dtype=np.int64)
+            with open(self._path("flat_vectors", new_generation), "wb") as f:
+                if len(live):
+                    f.write(np.ascontiguousarray(vectors[live_index]).tobytes())
+            if scales is not None:
+                with open(self._path("flat_scales", new_generation), "wb") as f:
+                    if len(live):
+                        f.write(np.ascontiguousarray(scales[live_index]).tobytes())
+            docs = self._doc_map()
+            with open(self._path(FLAT_DOCS_PREFIX, new_generation), "wb") as f:
+                for row in live:
+                    f.write(docs[self._offsets[row]:self._offsets[row + 1]])
+            removed = self.rows - len(live)
+            self._release_maps()
+            self.generation, self.rows, self._deleted = new_generation, len(live), set()
+            self._deleted_rows = None
+            self._write_state()
+            for kind in ("flat_vectors", "flat_scales", FLAT_DOCS_PREFIX):
+                try:
+                    os.remove(self._path(kind, old_generation))
+                except OSError:
+                    pass  # 不存在 (float16 没有缩放文件)，或 Windows 上仍被映射
+            self._load_ids()
+            self._writable = False
+        print(f"🗜️ [Flat] 压缩向量库: 移除 {removed} 行，剩余 {self.rows} 行")
+
+    def close(self, compact=False):
+        """释放内存映射；写入端可要求在删除过多时压缩"""
+        if compact and self.rows and len(self._deleted) > self.rows * _COMPACT_RATIO:
+            self.compact()
+        with self._lock:
+            self._release_maps()
+
+    # ---------- 读取 ----------
+
+    def _matrix(self):
+        """已提交行的向量矩阵 (内存映射) 与 int8 的缩放系数"""
+        if self._vectors is None and self.rows:
+            dtype = np.float16 if self.dtype == "float16" else np.int8
+            self._vectors = np.memmap(self._path("flat_vectors"), dtype=dtype, mode="r", shape=(self.rows, self.dim))
+            if self.dtype == "int8":
+                self._scales = np.memmap(self._path("flat_scales"), dtype=np.float32, mode="r", shape=(self.rows,))
+        return self._vectors, self._scales
+
+    def _doc_map(self):
+        if self._docs is None:
+            with open(self._path(FLAT_DOCS_PREFIX), "rb") as f:
+                self._docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._docs
+
+    def _read_document(self, row):
+        line = self._doc_map()[self._offsets[row]:self._offsets[row + 1]]
+        payload = json.loads(line.split(b"\t", 1)[1])
+        return Document(page_content=payload["text"], metadata=payload.get("metadata") or {})
+
+    def _scores(self, query_vector):
+        """余弦相似度 (向量均已归一化)，已删除的行为 -inf"""
+        vectors, scales = self._matrix()
+        scores = np.empty(self.rows, dtype=np.float32)
+        buffer = np.empty((min(_BLOCK_ROWS, self.rows), self.dim), dtype=np.float32)
+        for start in range(0, self.rows, _BLOCK_ROWS):
+            end = min(start + _BLOCK_ROWS, self.rows)
+            block = buffer[:end - start]
+            block[...] = vectors[start:end]
+            np.dot(block, query_vector, out=scores[start:end])
+        if scales is not None:
+            scores *= scales
+        if self._deleted:
+            if self._deleted_rows is None:
+                self._deleted_rows = np.fromiter(self._deleted, dtype=np.int64)
+            scores[self._deleted_rows] = -np.inf
+        return scores
+
+    def similarity_search_with_relevance_scores(self, query, k=4, **kwargs):
+        """
+        返回 [(Document, 相关性 0~1)]，按相关性从高到低 (换算见 relevance_from_cosine)
+        """
+        query_vector = np.asarray(self.embedding_function.embed_query(query), dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        with self._lock:
+            live = self.rows - len(self._deleted)
+            k = min(k, live)
+            if k <= 0:
+                return []
+            scores = self._scores(query_vector)
+            top = np.argpartition(-scores, k - 1)[:k] if k < self.rows else np.arange(self.rows)
+            top = top[np.argsort(-scores[top])][:k]
+            results = []
+            for row in top:
+                # 量化误差可能使自身相似度略超过 1，换算时一并截断
+                results.append((self._read_document(int(row)), relevance_from_cosine(float(scores[row]))))
+        return results
+
+    def get(self, ids=None, include=None, **kwargs):
+        """按 ID 取回正文与元数据 (与 Chroma 的 get 返回结构相同)，ids 为空时返回全部"""
+        with self._lock:
+            rows = [self._row_of[i] for i in ids if i in self._row_of] if ids is not None \
+                else sorted(self._row_of.values())
+            documents = [self._read_document(row) for row in rows]
+        return {
+            "ids": [self.ids[row] for row in rows],
+            "documents": [d.page_content for d in documents],
+            "metadatas": [d.metadata for d in documents],
+        }
+
+    def stats(self):
+        return {"rows": self.rows, "deleted": len(self._deleted), "dim": self.dim, "dtype": self.dtype}
@@ -0,0 +1,155 @@
+import os
+import re
+import time
+import hashlib
+import threading
+import subprocess
+
+from telemetry import span
+
+# 克隆深度：只索引工作区，默认只拉取最新一个提交；0 表示完整历史
+CLONE_DEPTH = int(os.getenv("CLONE_DEPTH", "1"))
+# 部分克隆过滤器 (如 blob:none)：与 CLONE_DEPTH=0 搭配时保留完整提交历史但不下载历史文件内容
+CLONE_FILTER = os.getenv("CLONE_FILTER", "")
+# 本地裸仓库缓存：所有项目共用一个对象库，重新导入与 Fork 项目只需拉取新增的对象
+CLONE_CACHE_ENABLED = os.getenv("CLONE_CACHE_ENABLED", "false").lower() == "true"
+CLONE_CACHE_DIR = os.getenv("CLONE_CACHE_DIR", os.path.join("git_cache", "objects.git"))
+
+_FULL_SHA = re.compile(r"^[0-9a-f]{40}$")
+# 同一进程内串行更新缓存仓库 (不同项目写不同的 ref，但 git 的 gc / 打包不宜并发)
+_cache_lock = threading.Lock()
+
+
+class GitError(Exception):
+    pass
+
+
+def _git(*args):
+    """执行 git 命令，失败时抛出带 stderr 的 GitError"""
+    result = subprocess.run(["git", *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise GitError(f"git {' '.join(args[:3])}... 失败: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+
+def objects_bytes(git_dir):
+    """对象库的磁盘大小 (拉取前后的差值即本次下载的对象大小)"""
+    total = 0
+    for dirpath, _, filenames in os.walk(os.path.join(git_dir, "objects")):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _cache_branch(url):
+    """缓存仓库中每个项目 URL 对应一个分支"""
+    return "nav-" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+
+def _ensure_cache():
+    if not os.path.isdir(CLONE_CACHE_DIR):
+        os.makedirs(os.path.dirname(CLONE_CACHE_DIR) or ".", exist_ok=True)
+        _git("init", "-q", "--bare", CLONE_CACHE_DIR)
+        # 允许工作区按 commit 拉取、按过滤器部分克隆
+        _git("-C", CLONE_CACHE_DIR, "config", "uploadpack.allowAnySHA1InWant", "true")
+        _git("-C", CLONE_CACHE_DIR, "config", "uploadpack.allowFilter", "true")
+    return "file://" + os.path.abspath(CLONE_CACHE_DIR)
+
+
+def _phase(stats, name, git_dir, func):
+    """执行一个阶段并统计耗时与新增对象大小，同时记为 git.<阶段> span"""
+    before = objects_bytes(git_dir) if os.path.isdir(git_dir) else 0
+    start = time.perf_counter()
+    with span(f"git.{name}") as s:
+        result = func()
+        received = max(0, objects_bytes(git_dir) - before)
+        s.set(bytes=received)
+    stats[name] = {"seconds": time.perf_counter() - start, "bytes": received}
+    return result
+
+
+def update_cache(url, ref, stats):
+    """把上游的 ref (为空时为默认分支) 拉取到缓存仓库，返回 (缓存地址, 缓存分支)"""
+    branch = _cache_branch(url)
+    with _cache_lock:
+        cache_url = _ensure_cache()
+        _phase(stats, "cache", CLONE_CACHE_DIR, lambda: _git(
+            "-C", CLONE_CACHE_DIR, "fetch", "-q", "--no-tags", url, f"+{ref or 'HEAD'}:refs/heads/{branch}"
+        ))
+    return cache_url, branch
+
+
+def _depth_args():
+    return ["--depth", str(CLONE_DEPTH)] if CLONE_DEPTH > 0 else []
+
+
+def clone_source(url, target_dir, ref=None):
+    """
+    克隆到 target_dir (目录需不存在)：浅克隆 / 部分克隆，可选固定分支、Tag 或完整 commit
+    启用缓存时先把上游拉取到本地裸仓库，再从缓存克隆工作区
+    :return: 各阶段统计 {阶段: {"seconds", "bytes"}}
+    """
+    stats = {}
+    pinned_sha = ref if ref and _FULL_SHA.match(ref) else None
+    if CLONE_CACHE_ENABLED:
+        source, branch = update_cache(url, ref, stats)
+        pinned_sha = None
+    else:
+        source, branch = url, None if pinned_sha else ref
+
+    git_dir = os.path.join(target_dir, ".git")
+    args = ["clone", "-q", "--no-checkout", "--single-branch", "--no-tags", *_depth_args()]
+    if CLONE_FILTER:
+        args.append(f"--filter={CLONE_FILTER}")
+    if branch:
+        args += ["--branch", branch]
+    _phase(stats, "clone", git_dir, lambda: _git(*args, source, target_dir))
+    if pinned_sha:
+        # 固定的 commit 不一定在默认分支的浅克隆中，单独按 commit 拉取
+        _phase(stats, "fetch", git_dir, lambda: _git(
+            "-C", target_dir, "fetch", "-q", "--no-tags", *_depth_args(), "origin", pinned_sha
+        ))
+    # 部分克隆的文件内容在检出时才下载，计入检出阶段
+    _phase(stats, "checkout", git_dir, lambda: _git(
+        "-C", target_dir, "reset", "-q", "--hard", pinned_sha or "HEAD"
+    ))
+    if ref:
+        # 记下固定的 ref，增量更新时沿用
+        _git("-C", target_dir, "config", "navigator.ref", ref)
+    return stats
+
+
+def fetch_source(url, source_path, ref=None):
+    """
+    在已有克隆中拉取上游最新提交 (ref 为空时沿用克隆时固定的 ref，否则为默认分支) 并检出
+    :return: 各阶段统计
+    """
+    stats = {}
+    if ref is None:
+        try:
+            ref = _git("-C", source_path, "config", "navigator.ref") or None
+        except GitError:
+            ref = None
+    git_dir = os.path.join(source_path, ".git")
+    if CLONE_CACHE_ENABLED:
+        origin, want = update_cache(url, ref, stats)
+    else:
+        origin, want = url, ref or "HEAD"
+    # 缓存开关变化后 origin 地址随之切换；部分克隆的过滤器配置在 origin 上，因此始终通过 origin 拉取
+    _git("-C", source_path, "remote", "set-url", "origin", origin)
+    _phase(stats, "fetch", git_dir, lambda: _git(
+        "-C", source_path, "fetch", "-q", "--no-tags", *_depth_args(), "origin", want
+    ))
+    _phase(stats, "checkout", git_dir, lambda: _git("-C", source_path, "reset", "-q", "--hard", "FETCH_HEAD"))
+    if ref:
+        _git("-C", source_path, "config", "navigator.ref", ref)
+    return stats
+
+
+def format_stats(stats):
+    return "，".join(
+        f"{name} {s['seconds']:.2f}s / {s['bytes'] / 1024 / 1024:.2f} MB" for name, s in stats.items()
+    )
@@ -0,0 +1,328 @@
+import os
+import time
+
+from telemetry import add
+
+# 配置：评分并发度与批量大小 (均可通过环境变量调整)
+# - GRADER_MAX_WORKERS: 同时向 Ollama 发起的评分请求上限
+# - GRADER_BATCH_SIZE: 单个 Prompt 中一次评分的文档数量，1 表示逐篇评分
+GRADER_MAX_WORKERS = int(os.getenv("GRADER_MAX_WORKERS", "8"))
+GRADER_BATCH_SIZE = int(os.getenv("GRADER_BATCH_SIZE", "1"))
+
+# 评分策略：full = 评完全部检索结果；early_exit = 按顺序分批评分，找够上下文就提前结束
+GRADER_STRATEGY = os.getenv("GRADER_STRATEGY", "full")
+# early_exit 的停止条件与遍历顺序
+# - EARLY_EXIT_MAX_YES: 累计多少个 "yes" 后停止
+# - EARLY_EXIT_TOKEN_BUDGET: 已选上下文的估算 Token 数达到预算后停止
+# - EARLY_EXIT_MIN_SCORE: 相似度低于该阈值的文档跳过评分 (0 表示不启用；没有相似度分数的文档照常评分)
+# - EARLY_EXIT_ORDER: rank = 检索器排名顺序；score = 相似度分数从高到低
+EARLY_EXIT_MAX_YES = int(os.getenv("EARLY_EXIT_MAX_YES", "5"))
+EARLY_EXIT_TOKEN_BUDGET = int(os.getenv("EARLY_EXIT_TOKEN_BUDGET", "4000"))
+EARLY_EXIT_MIN_SCORE = float(os.getenv("EARLY_EXIT_MIN_SCORE", "0"))
+EARLY_EXIT_ORDER = os.getenv("EARLY_EXIT_ORDER", "rank")
+
+# 评分引擎：llm = 本地模型逐篇评分；fast = 按相似度与词/标识符重叠直接判定 (不调用模型)；
+# cascade = 明显相关/无关的直接判定，只有拿不准的交给模型 (阈值见 fast_grader.py 的校准)
+GRADER_ENGINE = os.getenv("GRADER_ENGINE", "llm")
+
+VALID_GRADES = ("yes", "partial", "no")
+
+
+def estimate_tokens(text):
+    """粗略估算 Token 数：中日韩字符按 1 个计，其余字符按 4 个字符 1 个 Token 计"""
+    cjk = sum(1 for ch in text if "\u4e00" <= ch <= "\u9fff")
+    return cjk + (len(text) - cjk) // 4
+
+
+def normalize_grade(value):
+    """把模型输出规范化为 yes / partial / no，无法识别的一律视为 no"""
+    grade = str(value or "no").strip().lower()
+    return grade if grade in VALID_GRADES else "no"
+
+
+def format_batch_documents(documents):
+    """把多篇文档拼成带编号的文本块，供批量评分 Prompt 使用"""
+    return "\n\n".join(
+        f"[文档 {i}]\n{d.page_content}" for i, d in enumerate(documents, start=1)
+    )
+
+
+def _grade_single(grader_chain, question, documents, max_workers):
+    """
+    逐篇评分：通过 Runnable.batch 在线程池中并发调用，最多 max_workers 个请求同时进行
+    :return: (评分列表, 模型调用次数, 评分失败的下标集合)
+    """
+    inputs = [{"question": question, "document": d.page_content} for d in documents]
+    results = grader_chain.batch(
+        inputs, config={"max_concurrency": max_workers}, return_exceptions=True
+    )
+
+    grades = []
+    failed = set()
+    for i, result in enumerate(results):
+        if isinstance(result, Exception) or not isinstance(result, dict):
+            # 评分失败时，保守地将文档归入 partial
+            grades.append("partial")
+            failed.add(i)
+        else:
+            grades.append(normalize_grade(result.get("score", "no")))
+    if failed:
+        add(grade_failed=len(failed))
+    return grades, len(documents), failed
+
+
+def _grade_batched(grader_chain, batch_chain, question, documents, max_workers, batch_size):
+    """多文档评分：每个 Prompt 评分 batch_size 篇文档，返回逐篇的 JSON 判定数组"""
+    groups = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+    inputs = [
+        {"question": question, "count": len(group), "documents": format_batch_documents(group)}
+        for group in groups
+    ]
+    results = batch_chain.batch(
+        inputs, config={"max_concurrency": max_workers}, return_exceptions=True
+    )
+
+    grades = []
+    failed = set()
+    calls = len(groups)
+    for group, result in zip(groups, results):
+        scores = result.get("scores") if isinstance(result, dict) else None
+        if isinstance(scores, list) and len(scores) == len(group):
+            grades.extend(normalize_grade(s) for s in scores)
+        else:
+            # 批量输出不可用 (异常或数量对不上)，退回逐篇评分，保证每篇文档都有判定
+            add(batch_fallback=len(group))
+            group_grades, group_calls, group_failed = _grade_single(grader_chain, question, group, max_workers)
+            failed.update(len(grades) + i for i in group_failed)
+            grades.extend(group_grades)
+            calls += group_calls
+    return grades, calls, failed
+
+
+def _grade(question, documents, grader_chain, batch_chain, max_workers, batch_size, verdicts=None, on_graded=None):
+    """
+    评分一组文档，返回 (评分列表, 模型调用次数, 缓存命中数)
+    提供 verdicts (verdict_cache.ScopedVerdicts) 时先查评分缓存，只把未命中的文档交给模型，
+    模型给出的有效评分写回缓存 (评分失败的兜底 partial 不缓存)
+    :param on_graded: 可选回调 on_graded(question, 文档, 评分)，接收模型新给出的有效评分 (用于校准样本)
+    """
+    if not documents:
+        return [], 0, 0
+    grades = verdicts.lookup(question, documents) if verdicts is not None else [None] * len(documents)
+    pending = [i for i, g in enumerate(grades) if g is None]
+    cached = len(documents) - len(pending)
+    if not pending:
+        return grades, 0, cached
+
+    pending_docs = [documents[i] for i in pending]
+    max_workers = max(1, max_workers)
+    if batch_chain is not None and batch_size > 1:
+        new_grades, calls, failed = _grade_batched(
+            grader_chain, batch_chain, question, pending_docs, max_workers, batch_size
+        )
+    else:
+        new_grades, calls, failed = _grade_single(grader_chain, question, pending_docs, max_workers)
+    for i, grade in zip(pending, new_grades):
+        grades[i] = grade
+
+    keep = [j for j in range(len(pending_docs)) if j not in failed]
+    if verdicts is not None:
+        verdicts.store(question, [pending_docs[j] for j in keep], [new_grades[j] for j in keep])
+    if on_graded is not None:
+        on_graded(question, [pending_docs[j] for j in keep], [new_grades[j] for j in keep])
+    return grades, calls, cached
+
+
+def grade_documents_concurrent(question, documents, grader_chain, batch_chain=None,
+                               max_workers=GRADER_MAX_WORKERS, batch_size=GRADER_BATCH_SIZE, verdicts=None):
+    """
+    评分引擎入口：返回与 documents 一一对应的评分列表 ("yes" / "partial" / "no")
+    :param grader_chain: 单文档评分链 (local_worker.get_grader_chain)
+    :param batch_chain: 多文档评分链 (local_worker.get_batch_grader_chain)，为空时只做逐篇评分
+    :param max_workers: 并发请求上限
+    :param batch_size: 每个 Prompt 评分的文档数，>1 且提供 batch_chain 时启用多文档模式
+    :param verdicts: 评分缓存视图 (verdict_cache.ScopedVerdicts)，为空时不使用缓存
+    """
+    grades, _, _ = _grade(question, documents, grader_chain, batch_chain, max_workers, batch_size, verdicts)
+    return grades
+
+
+def _calls_needed(n_docs, batch_chain, batch_size):
+    """评完 n_docs 篇文档所需的模型调用次数 (用于计算提前结束节省了多少调用)"""
+    if batch_chain is not None and batch_size > 1:
+        return -(-n_docs // batch_size)
+    return n_docs
+
+
+def _order_documents(documents, order):
+    """按检索排名或相似度分数 (metadata["score"]，越高越相关) 排列待评分文档"""
+    if order == "score" and any("score" in d.metadata for d in documents):
+        return sorted(documents, key=lambda d: d.metadata.get("score", float("-inf")), reverse=True)
+    return list(documents)
+
+
+def _below_min_score(document, min_score):
+    """文档有相似度分数且低于阈值 (min_score <= 0 时不启用；没有分数的文档不算低于阈值)"""
+    score = document.metadata.get("score")
+    return min_score > 0 and score is not None and score < min_score
+
+
+def _context_tokens(documents, grades):
+    """估算按 select_documents 规则最终会进入上下文的 Token 数"""
+    yes_docs = [d for d, g in zip(documents, grades) if g == "yes"]
+    partial_docs = [d for d, g in zip(documents, grades) if g == "partial"]
+    selected = yes_docs + partial_docs[:2] if yes_docs else partial_docs
+    return sum(estimate_tokens(d.page_content) for d in selected)
+
+
+def grade_documents_early_exit(question, documents, grader_chain, batch_chain=None,
+                               max_workers=GRADER_MAX_WORKERS, batch_size=GRADER_BATCH_SIZE,
+                               max_yes=EARLY_EXIT_MAX_YES, token_budget=EARLY_EXIT_TOKEN_BUDGET,
+                               min_score=EARLY_EXIT_MIN_SCORE, order=EARLY_EXIT_ORDER, verdicts=None,
+                               on_graded=None):
+    """
+    流式评分：按顺序一波一波地评分 (每波 max_workers * batch_size 篇，波内并发)，
+    满足任一停止条件即结束，剩余文档不再调用模型
+    :return: (排序后的文档, 与之对应的评分列表 (未评分为 None), 模型调用次数, 缓存命中数, 停止原因)
+    """
+    ordered = _order_documents(documents, order)
+    grades = [None] * len(ordered)
+    use_batch = batch_chain is not None and batch_size > 1
+    wave_size = max(1, max_workers) * (batch_size if use_batch else 1)
+    calls = cached = 0
+    stop_reason = "exhausted"
+
+    # 相似度低于阈值的文档逐篇跳过 (不评分)，不假设排名顺序就是分数顺序：
+    # 混合检索按 RRF 排名，低分文档之后仍可能有高分文档；只有 BM25 命中、没有相似度分数的文档照常评分
+    candidates = [i for i, d in enumerate(ordered) if not _below_min_score(d, min_score)]
+    skipped = len(ordered) - len(candidates)
+
+    pos = 0
+    while pos < len(candidates):
+        indices = candidates[pos:pos + wave_size]
+        wave_grades, wave_calls, wave_cached = _grade(
+            question, [ordered[i] for i in indices], grader_chain, batch_chain, max_workers, batch_size,
+            verdicts, on_graded
+        )
+        for i, grade in zip(indices, wave_grades):
+            grades[i] = grade
+        calls += wave_calls
+        cached += wave_cached
+        pos += len(indices)
+
+        if sum(1 for g in grades if g == "yes") >= max_yes:
+            stop_reason = "max_yes"
+            break
+        if token_budget > 0 and _context_tokens(ordered, grades) >= token_budget:
+            stop_reason = "token_budget"
+            break
+    else:
+        if skipped:
+            stop_reason = "min_score"
+
+    return ordered, grades, calls, cached, stop_reason
+
+
+def _grade_with_llm(question, documents, grader_chain, batch_chain, strategy, verdicts, on_graded,
+                    max_yes=EARLY_EXIT_MAX_YES):
+    """按评分策略 (全量 / 提前结束) 调用模型评分，返回 (文档, 评分, 模型调用次数, 缓存命中数, 停止原因)"""
+    if strategy == "early_exit":
+        if max_yes <= 0:
+            return documents, [None] * len(documents), 0, 0, "max_yes"
+        return grade_documents_early_exit(
+            question, documents, grader_chain, batch_chain, max_yes=max_yes, verdicts=verdicts, on_graded=on_graded
+        )
+    grades, calls, cached = _grade(
+        question, documents, grader_chain, batch_chain, GRADER_MAX_WORKERS, GRADER_BATCH_SIZE, verdicts, on_graded
+    )
+    return documents, grades, calls, cached, "exhausted"
+
+
+def run_grader(question, documents, grader_chain, batch_chain=None, strategy=GRADER_STRATEGY, verdicts=None,
+               engine=GRADER_ENGINE, fast_grader=None):
+    """
+    按配置的评分引擎与策略执行评分，并汇总本次查询的评分统计
+    :param verdicts: 评分缓存视图 (verdict_cache.ScopedVerdicts)，为空时不使用缓存
+    :param engine: llm / fast / cascade；fast 与 cascade 需要提供 fast_grader，否则退回 llm
+    :param fast_grader: fast_grader.FastGrader，同时负责记录 LLM 评分样本与抽样复评
+    :return: (文档列表, 评分列表, 统计信息 dict)
+    """
+    baseline_calls = _calls_needed(len(documents), batch_chain, GRADER_BATCH_SIZE)
+    if fast_grader is None:
+        engine = "llm"
+    on_graded = fast_grader.record_llm_grades if fast_grader is not None else None
+
+    def llm_grade(docs):
+        # 抽样复评只用于统计，不读写评分缓存、不记样本 (由复评本身记录)
+        return _grade(question, docs, grader_chain, batch_chain, GRADER_MAX_WORKERS, GRADER_BATCH_SIZE)[0]
+
+    start = time.perf_counter()
+    fast_graded = 0
+    if engine == "fast":
+        ordered = documents
+        grades = fast_grader.grade(question, documents)
+        calls = cached = 0
+        stop_reason = "fast"
+        fast_graded = len(documents)
+        fast_seconds = time.perf_counter() - start
+        fast_grader.maybe_shadow(question, documents, grades, llm_grade)
+    elif engine == "cascade":
+        triaged = fast_grader.triage(question, documents)
+        fast_seconds = time.perf_counter() - start
+        auto = [i for i, g in enumerate(triaged) if g is not None]
+        borderline = [documents[i] for i, g in enumerate(triaged) if g is None]
+        fast_graded = len(auto)
+        auto_yes = sum(1 for g in triaged if g == "yes")
+        # 直接判定的 yes 计入提前结束的 yes 数
+        graded_docs, graded, calls, cached, stop_reason = _grade_with_llm(
+            question, borderline, grader_chain, batch_chain, strategy, verdicts, on_graded,
+            max_yes=EARLY_EXIT_MAX_YES - auto_yes
+        )
+        # 保持检索顺序，把模型的评分按文档对应回去 (提前结束可能调整了顺序)
+        by_doc = {id(d): g for d, g in zip(graded_docs, graded)}
+        ordered = documents
+        grades = [g if g is not None else by_doc.get(id(d)) for d, g in zip(documents, triaged)]
+        fast_grader.maybe_shadow(question, [documents[i] for i in auto], [triaged[i] for i in auto], llm_grade)
+    else:
+        ordered, grades, calls, cached, stop_reason = _grade_with_llm(
+            question, documents, grader_chain, batch_chain, strategy, verdicts, on_graded
+        )
+        fast_seconds = 0.0
+
+    graded = sum(1 for g in grades if g is not None)
+    stats = {
+        "engine": engine,
+        "strategy": strategy,
+        "retrieved": len(documents),
+        "graded": graded,
+        "skipped": len(documents) - graded,
+        "cached": cached,
+        "fast_graded": fast_graded,
+        "fast_ms": round(fast_seconds * 1000, 1),
+        "grader_calls": calls,
+        "calls_saved": max(0, baseline_calls - calls),
+        "stop_reason": stop_reason,
+    }
+    return ordered, grades, stats
+
+
+def select_documents(documents, grades):
+    """
+    根据评分结果挑选最终上下文
+    兜底策略：优先 yes，其次 partial，最后用原始 Top-3
+    """
+    yes_docs = [d for d, g in zip(documents, grades) if g == "yes"]          # 直接相关
+    partial_docs = [d for d, g in zip(documents, grades) if g == "partial"]  # 间接相关
+    # "no" 的文档直接丢弃
+
+    if yes_docs:
+        filtered_docs = yes_docs + partial_docs[:2]  # yes 全部 + 最多2个 partial
+        add(selected_yes=len(yes_docs), selected_partial=min(len(partial_docs), 2))
+    elif partial_docs:
+        filtered_docs = partial_docs
+        add(selected_partial=len(partial_docs))
+    else:
+        # 最终兜底：使用原始检索结果的前3个
+        filtered_docs = documents[:3]
+        add(selected_fallback=len(filtered_docs))
+    return filtered_docs
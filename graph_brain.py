@@ -1,9 +1,15 @@
 import os
+import time
 from typing import TypedDict, List
 from langchain_core.documents import Document
 from langgraph.graph import StateGraph, END
-from cloud_brain import generator_chain
-from local_worker import get_grader_chain
+from local_worker import LOCAL_LLM, GRADER_PROMPT_VERSION, BATCH_GRADER_PROMPT_VERSION
+from model_clients import get_client
+from grader import GRADER_BATCH_SIZE, GRADER_ENGINE, run_grader, select_documents
+from fast_grader import GRADER_SAMPLE_LOG, get_fast_grader
+from verdict_cache import VERDICT_CACHE_ENABLED, get_verdict_cache
+from context_packer import pack_context
+from telemetry import span
 
 os.environ["NO_PROXY"] = "localhost,127.0.0.1"
 
@@ -12,67 +18,92 @@ class GraphState(TypedDict):
     question: str
     documents: List[Document]
     generation: str
+    # 评分统计：评分/跳过的文档数、模型调用次数、提前结束节省的调用次数
+    grade_stats: dict
+    # 生成统计：首 Token 延迟 (ttft)、生成总耗时 (total)，单位秒
+    generation_stats: dict
+    # 上下文统计：发送的估算 Token 数、合并/去重节省的 Token 数、超出预算丢弃的片段数等
+    context_stats: dict
     # 新增：将 retriever 放入 state 中传递不太合适（因为它不是数据），
     # 但为了简单，我们采用闭包方式构建 Graph
 
-def build_graph(retriever):
+def build_graph(retriever, grader_chain=None, batch_chain=None):
     """
     工厂函数：接收一个特定的 retriever，构建并编译一个新的 Graph
+    grader_chain / batch_chain 可由调用方传入 (多个项目共用同一份评分链)
     """
-    grader_chain = get_grader_chain()
+    grader_chain = grader_chain or get_client("grader")
+    # 仅在开启多文档评分时才需要批量评分链
+    if batch_chain is None and GRADER_BATCH_SIZE > 1:
+        batch_chain = get_client("batch_grader")
+    # 评分缓存：同一问题再次检索到相同切片时直接复用评分，按实际使用的评分 Prompt 分开记录
+    use_batch = batch_chain is not None and GRADER_BATCH_SIZE > 1
+    prompt_version = BATCH_GRADER_PROMPT_VERSION if use_batch else GRADER_PROMPT_VERSION
+    verdicts = get_verdict_cache().scoped(LOCAL_LLM, prompt_version) if VERDICT_CACHE_ENABLED else None
+    # 快速评分引擎：fast / cascade 模式下直接判定文档；llm 模式下只用来记录校准样本
+    fast_grader = get_fast_grader() if GRADER_ENGINE != "llm" or GRADER_SAMPLE_LOG else None
 
     # --- 节点定义 (闭包内部) ---
     def retrieve(state):
-        print("--- RETRIEVE ---")
         question = state["question"]
-        documents = retriever.invoke(question)
+        with span("retrieve", echo=True) as s:
+            documents = retriever.invoke(question)
+            s.set(docs_out=len(documents))
         return {"documents": documents, "question": question}
 
     def grade_documents(state):
-        print("--- GRADE ---")
         question = state["question"]
         documents = state["documents"]
-        original_docs = documents.copy()  # 保留原始文档用于兜底
-        
-        yes_docs = []      # 直接相关
-        partial_docs = []  # 间接相关
-        
-        
-        for d in documents:
-            try:
-                score = grader_chain.invoke({"question": question, "document": d.page_content})
-                grade = score.get("score", "no").lower()
-                if grade == "yes":
-                    yes_docs.append(d)
-                elif grade == "partial":
-                    partial_docs.append(d)
-                # "no" 的文档直接丢弃
-            except Exception as e:
-                # 评分失败时，保守地将文档归入 partial
-                print(f"⚠️ 评分异常，保留文档: {e}")
-                partial_docs.append(d)
-        
-        # 兜底策略：优先 yes，其次 partial，最后用原始 Top-3
-        if yes_docs:
-            filtered_docs = yes_docs + partial_docs[:2]  # yes 全部 + 最多2个 partial
-            print(f"✅ 使用 {len(yes_docs)} 个直接相关 + {min(len(partial_docs), 2)} 个间接相关文档")
-        elif partial_docs:
-            filtered_docs = partial_docs
-            print(f"⚠️ 无直接相关文档，使用 {len(partial_docs)} 个间接相关文档")
-        else:
-            # 最终兜底：使用原始检索结果的前3个
-            filtered_docs = original_docs[:3]
-            print(f"🔄 兜底模式：使用原始检索的前 {len(filtered_docs)} 个文档")
-        
-        return {"documents": filtered_docs, "question": question}
+
+        with span("grade", echo=True, docs_in=len(documents)) as s:
+            # 符号索引精确命中的定义切片不需要评分，直接放在上下文最前面
+            exact = [d for d in documents if d.metadata.get("symbol_match")]
+            documents = [d for d in documents if not d.metadata.get("symbol_match")]
+            # 按配置的引擎 (llm / fast / cascade) 与策略 (全量 / 提前结束) 评分，返回与 documents 一一对应的评分
+            documents, grades, grade_stats = run_grader(
+                question, documents, grader_chain, batch_chain, verdicts=verdicts, fast_grader=fast_grader
+            )
+            if exact and not any(g in ("yes", "partial") for g in grades):
+                # 已有精确定义时不再用原始检索结果兜底
+                filtered_docs = exact
+            else:
+                filtered_docs = exact + select_documents(documents, grades)
+            grade_stats["exact"] = len(exact)
+            s.set(docs_out=len(filtered_docs), grader_calls=grade_stats["grader_calls"],
+                  cached=grade_stats["cached"], exact=len(exact), fast_graded=grade_stats["fast_graded"],
+                  fast_ms=grade_stats["fast_ms"], skipped=grade_stats["skipped"],
+                  calls_saved=grade_stats["calls_saved"], stop_reason=grade_stats["stop_reason"])
+
+        return {"documents": filtered_docs, "question": question, "grade_stats": grade_stats}
 
     def generate(state):
-        print("--- GENERATE ---")
         question = state["question"]
         documents = state["documents"]
-        context = "\n\n".join([doc.page_content for doc in documents])
-        generation = generator_chain.invoke({"context": context, "question": question})
-        return {"documents": documents, "question": question, "generation": generation}
+        with span("generate", echo=True, docs_in=len(documents)) as s:
+            # 合并同一文件中重叠/相邻的片段、去重，并按相关性顺序装入 Token 预算
+            context, context_stats = pack_context(documents)
+            s.set(packed=context_stats["packed"], sections=context_stats["sections"],
+                  merge_saved=context_stats["merge_saved"], saved_tokens=context_stats["saved_tokens"])
+
+            # 流式生成：以 stream_mode="messages" 运行 Graph 时，Token 会实时推送给调用方
+            start = time.perf_counter()
+            ttft = None
+            parts = []
+            # 生成器 (langchain_openai) 在第一次生成回答时才构建
+            for token in get_client("generator").stream({"context": context, "question": question}):
+                if ttft is None and token:
+                    ttft = time.perf_counter() - start
+                parts.append(token)
+            total = time.perf_counter() - start
+            generation = "".join(parts)
+            generation_stats = {"ttft": total if ttft is None else ttft, "total": total}
+            s.set(input_tokens=context_stats["tokens"], ttft_ms=round(generation_stats["ttft"] * 1000))
+
+        return {
+            "documents": documents, "question": question,
+            "generation": generation, "generation_stats": generation_stats,
+            "context_stats": context_stats,
+        }
 
     def decide_to_generate(state):
         if not state["documents"]:
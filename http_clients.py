@@ -0,0 +1,261 @@
+import os
+import time
+import random
+import threading
+import urllib.request
+from urllib.parse import urlsplit
+
+import httpx
+
+from telemetry import record
+
+# 进程内共享的 HTTP 连接层：每个后端 (本地 Ollama / 云端 Kimi) 一个带连接池的 transport，
+# 所有模型客户端 (向量化、评分、生成、建议问题) 共用，连接保持复用，并发与速率按后端统一限制
+BACKEND_URLS = {
+    "ollama": lambda: os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434"),
+    "kimi": lambda: os.getenv("OPENAI_API_BASE") or "https://api.moonshot.cn/v1",
+}
+# 同时进行中的请求上限 (流式响应在读完 / 关闭前都占用名额)；默认与 GRADER_MAX_WORKERS 一致
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "8"))
+KIMI_MAX_CONCURRENCY = int(os.getenv("KIMI_MAX_CONCURRENCY", "4"))
+# 令牌桶速率 (每秒请求数，桶容量为 1 秒的量)，0 表示不限速
+OLLAMA_RATE_LIMIT = float(os.getenv("OLLAMA_RATE_LIMIT", "0"))
+KIMI_RATE_LIMIT = float(os.getenv("KIMI_RATE_LIMIT", "3"))
+# 遇到 429 / 503 / 建立连接失败时的重试次数与退避 (指数退避 + 全抖动，响应带 Retry-After 时以其为准)
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_RETRY_BASE_DELAY = float(os.getenv("HTTP_RETRY_BASE_DELAY", "0.5"))
+HTTP_RETRY_MAX_DELAY = float(os.getenv("HTTP_RETRY_MAX_DELAY", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# 只重试服务端明确没有处理请求的情况：生成请求是按 Token 计费的 POST，请求发出后连接断开、读超时、
+# 500 / 502 / 504 时服务端可能已经生成完毕，重发会重复计费，交给调用方处理
+RETRY_STATUSES = {429, 503}
+# 连接建立阶段的失败 (请求尚未发出)
+_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class TokenBucket:
+    """令牌桶：按 rate 个/秒补充，最多攒 capacity 个；acquire 在令牌不足时阻塞等待"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class Backend:
+    """一个后端的并发名额、令牌桶与统计"""
+
+    def __init__(self, name, max_concurrency, rate_limit):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.rate_limit = rate_limit
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+        self._bucket = TokenBucket(rate_limit) if rate_limit > 0 else None
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "retries": 0, "throttled": 0, "failed": 0, "in_flight": 0, "peak_in_flight": 0}
+        self.wait_seconds = 0.0
+
+    def acquire(self):
+        start = time.perf_counter()
+        if self._slots:
+            self._slots.acquire()
+        if self._bucket:
+            self._bucket.acquire()
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.counts["requests"] += 1
+            self.counts["in_flight"] += 1
+            self.counts["peak_in_flight"] = max(self.counts["peak_in_flight"], self.counts["in_flight"])
+            self.wait_seconds += waited
+
+    def release(self):
+        with self._lock:
+            self.counts["in_flight"] -= 1
+        if self._slots:
+            self._slots.release()
+
+    def count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counts,
+                "max_concurrency": self.max_concurrency,
+                "rate_limit": self.rate_limit,
+                "wait_s": round(self.wait_seconds, 3),
+            }
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """
+    响应体关闭、读取出错或调用方中途放弃迭代 (生成器结束，GeneratorExit) 时归还并发名额，只归还一次
+    流式生成在整个输出期间都算一个进行中的请求
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        completed = False
+        try:
+            yield from self._stream
+            completed = True
+        finally:
+            # 正常读完时由随后的 close 归还 (连接交还连接池之后)；中途放弃或读取出错时在这里归还
+            if not completed:
+                self._release_once()
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release_once()
+
+    def _release_once(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._release()
+
+
+def retry_delay(attempt, response=None, base=HTTP_RETRY_BASE_DELAY, max_delay=HTTP_RETRY_MAX_DELAY):
+    """第 attempt 次重试前的等待秒数：优先使用 Retry-After，否则指数退避 + 全抖动"""
+    if response is not None:
+        try:
+            return min(max_delay, float(response.headers.get("retry-after"))) + random.uniform(0, base)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(max_delay, base * 2 ** attempt))
+
+
+class LimitedTransport(httpx.BaseTransport):
+    """带连接池的 transport：每次发送前占用后端的并发名额与令牌，遇到可重试的失败时退避后重发"""
+
+    def __init__(self, backend, proxy=None, max_retries=HTTP_MAX_RETRIES):
+        self.backend = backend
+        self.max_retries = max_retries
+        pool_size = backend.max_concurrency if backend.max_concurrency > 0 else 20
+        self._transport = httpx.HTTPTransport(
+            proxy=proxy,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_size,
+                                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+        )
+
+    def handle_request(self, request):
+        request.read()  # 请求体缓存在内存中，重试时可以重发
+        for attempt in range(self.max_retries + 1):
+            self.backend.acquire()
+            try:
+                response = self._transport.handle_request(request)
+            except _RETRY_ERRORS as e:
+                self.backend.release()
+                if attempt >= self.max_retries:
+                    self.backend.count("failed")
+                    raise
+                self._backoff(attempt, None, type(e).__name__)
+                continue
+            except BaseException:
+                self.backend.release()
+                raise
+
+            if response.status_code in RETRY_STATUSES:
+                if response.status_code == 429:
+                    self.backend.count("throttled")
+                if attempt < self.max_retries:
+                    response.read()
+                    response.close()
+                    self.backend.release()
+                    self._backoff(attempt, response, response.status_code)
+                    continue
+                self.backend.count("failed")
+            response.stream = _ReleasingStream(response.stream, self.backend.release)
+            return response
+
+    def _backoff(self, attempt, response, reason):
+        delay = retry_delay(attempt, response)
+        self.backend.count("retries")
+        record("http.retry", delay, backend=self.backend.name, reason=str(reason), attempt=attempt + 1)
+        time.sleep(delay)
+
+    def close(self):
+        self._transport.close()
+
+
+_backends = {}
+_transports = {}
+_openai_client = None
+_lock = threading.Lock()
+
+
+def _env_proxy(url):
+    """按 HTTP(S)_PROXY / NO_PROXY 选择代理 (自定义 transport 时 httpx 不再读取这些环境变量)"""
+    parts = urlsplit(url)
+    if not parts.hostname or urllib.request.proxy_bypass(parts.hostname):
+        return None
+    return urllib.request.getproxies().get(parts.scheme)
+
+
+def get_backend(name):
+    with _lock:
+        if name not in _backends:
+            if name == "ollama":
+                _backends[name] = Backend(name, OLLAMA_MAX_CONCURRENCY, OLLAMA_RATE_LIMIT)
+            elif name == "kimi":
+                _backends[name] = Backend(name, KIMI_MAX_CONCURRENCY, KIMI_RATE_LIMIT)
+            else:
+                raise KeyError(f"未知的后端: {name}")
+        return _backends[name]
+
+
+def get_transport(name):
+    """后端共享的 transport (连接池在所有使用该后端的客户端之间复用)"""
+    backend = get_backend(name)
+    with _lock:
+        if name not in _transports:
+            _transports[name] = LimitedTransport(backend, proxy=_env_proxy(BACKEND_URLS[name]()))
+        return _transports[name]
+
+
+def ollama_client_kwargs():
+    """传给 ChatOllama / OllamaEmbeddings 的 sync_client_kwargs (异步客户端不经过这一层，项目中也未使用)"""
+    return {"transport": get_transport("ollama")}
+
+
+def get_openai_http_client():
+    """传给 ChatOpenAI 的 http_client (生成与建议问题共用)；重试由本层负责，ChatOpenAI 需设置 max_retries=0"""
+    global _openai_client
+    transport = get_transport("kimi")
+    with _lock:
+        if _openai_client is None:
+            _openai_client = httpx.Client(transport=transport, timeout=httpx.Timeout(600.0, connect=10.0))
+        return _openai_client
+
+
+def stats():
+    with _lock:
+        backends = list(_backends.values())
+    return {backend.name: backend.stats() for backend in backends}
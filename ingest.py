@@ -1,21 +1,49 @@
 import os
 import re
+import json
+import time
 import shutil
+import hashlib
 import subprocess
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter, Language
-from langchain_community.vectorstores import Chroma
-from langchain_ollama import OllamaEmbeddings
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from lexical_index import BM25Index, save_index, update_index
+from symbol_index import SymbolIndex, save_symbols, update_symbols
+from flat_store import FlatVectorStore, open_vector_store
+from embedding_cache import get_embedding_cache, format_stats
+from scanner import PathFilter, scan_documents, read_document, walk_files
+from chunker import CHUNK_STRATEGY, split_document
+from verdict_cache import get_verdict_cache
+from dedup import DEDUP_ENABLED, Deduper, group_aliases
+from telemetry import span, record
+from model_clients import get_client
+from project_manifest import MANIFEST_FILENAME
+from git_fetch import GitError, clone_source, fetch_source, format_stats as format_git_stats
 
 # 代理配置
 os.environ["NO_PROXY"] = "localhost,127.0.0.1"
 
-# 配置：支持从环境变量读取 Ollama 地址 (Docker 部署时使用)
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
-EMBED_MODEL = "nomic-embed-text"
 # 根存储目录
 DB_ROOT = "chroma_db_store"
 SOURCE_ROOT = "source_code"
+# 断点续传：导入过程中记录已完整写入向量库的文件
+CHECKPOINT_FILENAME = "ingest_checkpoint.json"
+
+# 流式导入：每批向量化的切片数、并发向量化的线程数
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+# 全局向量化并发上限：多个导入任务同时进行时共享，避免一起压垮 Ollama
+INGEST_EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", str(INGEST_WORKERS)))
+_embed_slots = threading.BoundedSemaphore(INGEST_EMBED_CONCURRENCY)
+
+# 允许导入的本地仓库目录 (逗号分隔)，其下的仓库可用 file:///绝对路径 导入，用于测试与内网部署；默认关闭
+ALLOW_LOCAL_REPOS = [os.path.realpath(p) for p in os.getenv("ALLOW_LOCAL_REPOS", "").split(",") if p.strip()]
+
+try:
+    import resource  # 仅 Unix 可用，用于统计峰值内存
+except ImportError:
+    resource = None
 
 # ==========================================
 # 🛡️ 安全：GitHub URL 验证
@@ -37,14 +65,26 @@ def is_valid_git_url(url):
     for pattern in patterns:
         if re.match(pattern, url.strip()):
             return True
-    return False
+    return is_allowed_local_repo(url.strip())
+
+def is_allowed_local_repo(url):
+    """file:// 本地仓库：路径 (解析符号链接后) 必须位于 ALLOW_LOCAL_REPOS 列出的目录之下"""
+    match = re.match(r'^file://(/[\w\-\./]+)$', url)
+    if not match or not ALLOW_LOCAL_REPOS:
+        return False
+    path = os.path.realpath(match.group(1))
+    return any(path == root or path.startswith(root + os.sep) for root in ALLOW_LOCAL_REPOS)
+
+def is_valid_git_ref(ref):
+    """分支 / Tag / commit 名称，同样防止被当作命令行参数"""
+    return bool(re.match(r'^[\w][\w\-\./]*$', ref)) and ".." not in ref
 
 def get_project_name(url):
     """从 GitHub URL 提取项目名称"""
-    return url.split("/")[-1].replace(".git", "")
+    return url.rstrip("/").split("/")[-1].replace(".git", "")
 
-def clone_repo(url, target_dir):
-    """克隆或更新代码库"""
+def clone_repo(url, target_dir, ref=None):
+    """克隆代码库 (浅克隆 / 部分克隆 / 本地缓存，见 git_fetch.py)，可固定分支、Tag 或 commit"""
     # 如果目录存在，先删除（确保干净的克隆）
     if os.path.exists(target_dir):
         print(f"⚠️ 正在清理旧目录 {target_dir} 以进行重新克隆...")
@@ -53,24 +93,565 @@ def clone_repo(url, target_dir):
         except Exception as e:
             print(f"⚠️ 删除失败 (可能被占用): {e}")
 
-    print(f"⬇️ 正在克隆 {url}...")
+    print(f"⬇️ 正在克隆 {url}" + (f" ({ref})" if ref else "") + "...")
     try:
-        subprocess.run(["git", "clone", url, target_dir], check=True)
-        return True
-    except Exception as e:
+        stats = clone_source(url, target_dir, ref)
+    except GitError as e:
         print(f"❌ 克隆失败: {e}")
         return False
+    print(f"📦 克隆完成: {format_git_stats(stats)}")
+    return True
+
+def content_hash(text):
+    """切片内容哈希 (sha256 前 16 位)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def assign_chunk_ids(chunks, source_path):
+    """
+    为每个切片生成稳定 ID：<相对路径>#<内容哈希>，同一文件内重复的切片追加序号
+    ID 同时写入 metadata["chunk_id"]，供 BM25 索引与向量检索结果对齐
+    """
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        rel_path = os.path.relpath(chunk.metadata.get("source", ""), source_path).replace(os.sep, "/")
+        digest = content_hash(chunk.page_content)
+        chunk_id = f"{rel_path}#{digest}"
+        seen[chunk_id] = seen.get(chunk_id, 0) + 1
+        if seen[chunk_id] > 1:
+            chunk_id = f"{chunk_id}-{seen[chunk_id] - 1}"
+        chunk.metadata["chunk_id"] = chunk_id
+        chunk.metadata["content_hash"] = digest
+        ids.append(chunk_id)
+    return ids
+
+def split_file(doc, source_path):
+    """按文件类型切分单个文件并生成切片 ID，返回 (相对路径, 切片列表)"""
+    rel_path = os.path.relpath(doc.metadata.get("source", ""), source_path).replace(os.sep, "/")
+    chunks = split_document(doc, rel_path)
+    assign_chunk_ids(chunks, source_path)
+    return rel_path, chunks
+
+def get_embeddings():
+    """Ollama 向量模型，外面包一层共享的向量缓存，已算过的文本不再请求 Ollama (与查询端共用同一个客户端)"""
+    return get_client("embeddings")
+
+def report_cache_stats(before):
+    """打印本次导入期间的向量缓存命中情况"""
+    after = get_embedding_cache().stats()
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    total = hits + misses
+    if total:
+        print(f"🗃️ [Embed Cache] 本次命中 {hits}/{total} ({hits / total:.1%})，累计: {format_stats(after)}")
+
+def git_head(source_path):
+    """返回当前检出的 commit，失败时返回 None"""
+    try:
+        result = subprocess.run(
+            ["git", "-C", source_path, "rev-parse", "HEAD"],
+            check=True, capture_output=True, text=True
+        )
+        return result.stdout.strip()
+    except Exception:
+        return None
+
+def fetch_updates(source_path, project_url, ref=None):
+    """在已有克隆中拉取上游新提交，并把工作区对齐到上游分支 (或固定的 ref)"""
+    print(f"🔄 正在拉取更新: {source_path}")
+    try:
+        stats = fetch_source(project_url, source_path, ref)
+    except GitError as e:
+        print(f"❌ 拉取更新失败: {e}")
+        return False
+    print(f"📦 拉取完成: {format_git_stats(stats)}")
+    return True
+
+def changed_files(source_path, old_commit, new_commit, indexed=()):
+    """
+    对比两个 commit，返回 (新增或修改的文件, 删除的文件)，均为相对路径
+    与全量扫描使用同一套过滤 (后缀、忽略目录、各级 .gitignore)，增量更新与重新全量导入得到相同的文件集合
+    .gitignore 本身有变化时按新规则重新核对：已索引 (indexed) 但现在被忽略的文件记为删除，
+    之前被忽略、现在需要索引的文件记为新增
+    """
+    result = subprocess.run(
+        ["git", "-C", source_path, "diff", "--name-status", "--no-renames", old_commit, new_commit],
+        check=True, capture_output=True, text=True
+    )
+    path_filter = PathFilter(source_path)
+    upserted, deleted = [], []
+    rules_changed = False
+    for line in result.stdout.splitlines():
+        status, _, path = line.partition("\t")
+        if path.rsplit("/", 1)[-1] == ".gitignore":
+            rules_changed = True
+        if status.startswith("D"):
+            # 已索引的文件被删除时一律移除 (不论其所在目录现在是否被忽略)
+            if path in indexed or path_filter.is_indexable(path):
+                deleted.append(path)
+        elif path_filter.is_indexable(path):
+            upserted.append(path)
+    if rules_changed:
+        current = {os.path.relpath(p, source_path).replace(os.sep, "/") for p in walk_files(source_path)}
+        changed = set(upserted) | set(deleted)
+        deleted.extend(sorted(p for p in indexed if p not in current and p not in changed))
+        upserted.extend(sorted(p for p in current if p not in indexed and p not in changed))
+    return upserted, deleted
+
+def report_progress(progress, stage, **counters):
+    """向调用方 (如后台导入任务) 报告当前阶段与计数"""
+    if progress is not None:
+        progress(stage, **counters)
+
+def load_manifest(db_path):
+    path = os.path.join(db_path, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ 清单读取失败: {e}")
+        return None
+
+def save_manifest(db_path, project_url, commit, files, duplicates=None):
+    """
+    :param files: {相对路径: [chunk_id, ...]}
+    :param duplicates: {重复切片 ID: 规范切片 ID}，重复切片没有写入向量库与 BM25 索引
+    """
+    manifest = {
+        "url": project_url, "commit": commit, "updated_at": time.time(),
+        "chunk_strategy": CHUNK_STRATEGY, "files": files, "duplicates": duplicates or {},
+    }
+    with open(os.path.join(db_path, MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+def load_file(source_path, rel_path):
+    """读取单个文件为 Document 列表，二进制/超大/读取失败时返回空列表"""
+    doc = read_document(os.path.join(source_path, rel_path))
+    return [doc] if doc is not None else []
+
+def manifest_hashes(files):
+    """清单中全部切片的内容哈希 (切片 ID 为 <路径>#<哈希>[-序号])"""
+    return {chunk_id.rsplit("#", 1)[1][:16] for ids in files.values() for chunk_id in ids}
+
+def drop_stale_verdicts(old_hashes, files):
+    """重新导入后，删除内容已变化或已删除的切片的评分缓存"""
+    stale = old_hashes - manifest_hashes(files)
+    if stale:
+        removed = get_verdict_cache().drop_hashes(stale)
+        print(f"🗂️ 已清理 {len(stale)} 个失效切片的评分缓存 ({removed} 条)")
+
+def update_chunk_metadata(vector_store, metadatas):
+    """
+    合并更新已写入切片的元数据，不重新向量化 (用于记录去重后的别名路径)
+    :param metadatas: {chunk_id: {键: 值}}，值为 None 的键删除
+    """
+    ids = list(metadatas)
+    if isinstance(vector_store, FlatVectorStore):
+        vector_store.update_metadata(ids, [metadatas[i] for i in ids])
+        return
+    for i in range(0, len(ids), 1000):
+        part = ids[i:i + 1000]
+        vector_store._collection.update(ids=part, metadatas=[metadatas[j] for j in part])
+
+def load_chunk(source_path, chunk_id):
+    """重新切分切片所在的文件，取回该切片 (文件已不存在或内容已变化时返回 None)"""
+    rel_path = chunk_id.rsplit("#", 1)[0]
+    for doc in load_file(source_path, rel_path):
+        for chunk in split_file(doc, source_path)[1]:
+            if chunk.metadata["chunk_id"] == chunk_id:
+                return chunk
+    return None
+
+def reconcile_duplicates(source_path, files, duplicates, removed_ids, added_chunks):
+    """
+    增量更新时维护 重复切片 -> 规范切片 的映射 (原地修改 duplicates)
+    - 删除的重复切片从映射中移除
+    - 规范切片被删除但仍有重复切片时，提升其中第一个为新的规范切片 (需要向量化)
+    - 新切片与已有切片内容完全相同时记为重复，不再向量化 (近似重复只在全量导入时识别)
+    :return: (需要写入的切片, 旧规范切片 -> 新规范切片, 别名需要刷新的规范切片 -> 别名路径列表或 None)
+    """
+    removed = set(removed_ids)
+    touched, orphans = set(), {}
+    for dup_id, canonical in list(duplicates.items()):
+        if dup_id in removed:
+            del duplicates[dup_id]
+            touched.add(canonical)
+        elif canonical in removed:
+            orphans.setdefault(canonical, []).append(dup_id)
+
+    to_write, promoted = list(added_chunks), {}
+    for canonical, dup_ids in orphans.items():
+        for dup_id in dup_ids:
+            del duplicates[dup_id]
+        chunk = None
+        while dup_ids and chunk is None:
+            chunk = load_chunk(source_path, dup_ids.pop(0))
+        if chunk is None:
+            continue
+        new_id = chunk.metadata["chunk_id"]
+        promoted[canonical] = new_id
+        for dup_id in dup_ids:
+            duplicates[dup_id] = new_id
+        touched.add(new_id)
+        to_write.append(chunk)
+
+    if DEDUP_ENABLED:
+        new_ids = {c.metadata["chunk_id"] for c in to_write}
+        by_hash = {}
+        for ids in files.values():
+            for chunk_id in ids:
+                if chunk_id not in new_ids:
+                    # 已有的重复切片的内容同样指向其规范切片
+                    by_hash.setdefault(chunk_id.rsplit("#", 1)[1][:16], duplicates.get(chunk_id, chunk_id))
+        unique = []
+        for chunk in to_write:
+            chunk_id = chunk.metadata["chunk_id"]
+            canonical = by_hash.setdefault(chunk.metadata["content_hash"], chunk_id)
+            if canonical != chunk_id and chunk_id not in promoted.values():
+                duplicates[chunk_id] = canonical
+                touched.add(canonical)
+            else:
+                unique.append(chunk)
+        to_write = unique
+
+    aliases = group_aliases(duplicates)
+    refresh = {canonical: aliases.get(canonical) for canonical in touched if canonical not in removed}
+    return to_write, promoted, refresh
+
+def update_project(project_url, source_path, db_path, manifest, progress=None, ref=None):
+    """
+    增量更新：拉取新提交 -> git diff 找出变更文件 -> 只对变更文件重新切分/向量化
+    切片 ID 由 路径 + 内容哈希 决定，修改文件中未变化的切片不会被重新向量化
+    """
+    start = time.perf_counter()
+    old_commit = manifest.get("commit")
+    report_progress(progress, "fetching")
+    with span("ingest.fetch", echo=True) as s:
+        fetched = fetch_updates(source_path, project_url, ref)
+        if not fetched:
+            s.error = "Fetch Failed"
+    if not fetched:
+        return None, "Fetch Failed"
+    new_commit = git_head(source_path)
+    if new_commit is None:
+        print("❌ 拉取后无法读取当前 commit，克隆可能已损坏")
+        return None, "Fetch Failed"
+
+    if old_commit == new_commit:
+        print(f"✅ 已是最新版本 ({new_commit[:8]})，无需重新处理")
+        return db_path, "Up to date: No new commits"
+
+    files = manifest.get("files", {})
+    upserted, deleted = changed_files(source_path, old_commit, new_commit, indexed=files)
+    print(f"🧮 变更文件: {len(upserted)} 个新增/修改, {len(deleted)} 个删除")
+    report_progress(progress, "splitting", files_scanned=len(upserted))
+
+    old_hashes = manifest_hashes(files)
+    removed_ids, added_chunks = [], []
+    symbol_files = []  # (相对路径, 文件内容, 全部切片)，用于更新符号索引
+
+    for rel_path in deleted:
+        removed_ids.extend(files.pop(rel_path, []))
+
+    with span("ingest.split", echo=True, files=len(upserted)) as s:
+        for rel_path in upserted:
+            old_ids = set(files.get(rel_path, []))
+            chunks = []
+            for doc in load_file(source_path, rel_path):
+                file_chunks = split_file(doc, source_path)[1]
+                chunks.extend(file_chunks)
+                symbol_files.append((rel_path, doc.page_content, file_chunks))
+            new_ids = [c.metadata["chunk_id"] for c in chunks]
+            removed_ids.extend(old_ids - set(new_ids))
+            added_chunks.extend(c for c in chunks if c.metadata["chunk_id"] not in old_ids)
+            if new_ids:
+                files[rel_path] = new_ids
+            else:
+                files.pop(rel_path, None)
+        s.set(chunks=len(added_chunks))
+
+    duplicates = dict(manifest.get("duplicates", {}))
+    added_chunks, promoted, refresh = reconcile_duplicates(source_path, files, duplicates, removed_ids, added_chunks)
+    # 新写入的规范切片直接带上别名，已写入的规范切片合并更新元数据
+    for chunk in added_chunks:
+        paths = refresh.pop(chunk.metadata["chunk_id"], None)
+        if paths:
+            chunk.metadata["aliases"] = paths
+    refresh = {chunk_id: {"aliases": paths} for chunk_id, paths in refresh.items()}
+    if promoted:
+        print(f"🧬 {len(promoted)} 个被删除的规范切片仍有副本，改由副本重新向量化")
+
+    cache_before = get_embedding_cache().stats()
+    vector_store = open_vector_store(db_path, get_embeddings())
+    if removed_ids:
+        vector_store.delete(ids=removed_ids)
+    if added_chunks:
+        print(f"💾 正在向量化 {len(added_chunks)} 个新切片...")
+        report_progress(progress, "embedding", chunks=len(added_chunks), chunks_embedded=0)
+        with _embed_slots, span("ingest.batch", echo=True, chunks=len(added_chunks)):
+            vector_store.add_documents(added_chunks, ids=[c.metadata["chunk_id"] for c in added_chunks])
+        report_progress(progress, "embedding", chunks=len(added_chunks), chunks_embedded=len(added_chunks))
+    if refresh:
+        update_chunk_metadata(vector_store, refresh)
+    # 写入完成后释放本次导入持有的连接 (查询端的检索器仍持有自己的引用)
+    close_vector_store_writer(vector_store)
+    report_cache_stats(cache_before)
+    update_index(db_path, removed_ids, added_chunks)
+    update_symbols(db_path, deleted + [p for p in upserted if p not in files], symbol_files,
+                   remap={**duplicates, **promoted})
+    save_manifest(db_path, project_url, new_commit, files, duplicates)
+    drop_stale_verdicts(old_hashes, files)
 
-def ingest_project(project_url, force_update=False):
+    elapsed = time.perf_counter() - start
+    print(f"✅ 增量更新完成 ({old_commit[:8]} -> {new_commit[:8]})，耗时 {elapsed:.1f}s")
+    return db_path, f"Updated: +{len(added_chunks)} / -{len(removed_ids)} chunks in {len(upserted) + len(deleted)} files"
+
+def load_checkpoint(db_path):
+    path = os.path.join(db_path, CHECKPOINT_FILENAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ 检查点读取失败: {e}")
+        return None
+
+def save_checkpoint(db_path, project_url, done_files):
+    path = os.path.join(db_path, CHECKPOINT_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"url": project_url, "done_files": sorted(done_files)}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def release_vector_store(db_path):
+    """
+    释放当前进程中对该目录的 Chroma 连接
+    Chroma 按目录复用底层连接，目录被删除重建后旧连接会变成只读，必须先释放
+    """
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+        system = SharedSystemClient._identifier_to_system.pop(db_path, None)
+        SharedSystemClient._identifier_to_refcount.pop(db_path, None)
+        if system is not None:
+            system.stop()
+    except Exception as e:
+        print(f"⚠️ 释放向量库连接失败: {e}")
+
+def close_vector_store_writer(vector_store):
+    """导入写入结束：Chroma 释放客户端；flat 后端释放内存映射，删除的行过多时顺带压缩"""
+    if isinstance(vector_store, FlatVectorStore):
+        vector_store.close(compact=True)
+    else:
+        vector_store._client.close()
+
+def peak_rss_mb():
+    """进程峰值内存 (MB)，平台不支持时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为 Byte
+    return peak / 1024 / 1024 if os.uname().sysname == "Darwin" else peak / 1024
+
+def iter_documents(source_path):
+    """单次遍历仓库 (遵循 .gitignore，跳过二进制与超大文件)，并行读取、逐个产出文件"""
+    return scan_documents(source_path)
+
+def iter_file_chunks(documents, source_path, timings=None, symbols=None):
+    """
+    逐个文件切分，产出 (相对路径, 该文件的全部切片)
+    :param timings: 可选 dict，累计 扫描读取 (scan) 与 切分 (split) 的耗时 (秒)
+    :param symbols: 可选 SymbolIndex，切分的同时提取文件中的符号定义
+    """
+    documents = iter(documents)
+    while True:
+        t0 = time.perf_counter()
+        doc = next(documents, None)
+        t1 = time.perf_counter()
+        if doc is None:
+            break
+        result = split_file(doc, source_path)
+        if symbols is not None:
+            symbols.add_file(result[0], doc.page_content, result[1])
+        if timings is not None:
+            timings["scan"] = timings.get("scan", 0.0) + t1 - t0
+            timings["split"] = timings.get("split", 0.0) + time.perf_counter() - t1
+        yield result
+
+def index_source_tree(source_path, db_path, project_url, done_files=None, progress=None):
+    """
+    流式导入管线：扫描 -> 读取 -> 切分 -> 分批向量化 (线程池并发) -> 写入向量库 (Chroma / flat)
+    - 同一时刻最多只有 INGEST_WORKERS * 2 个批次在内存中，内存占用与仓库大小无关
+    - 每个文件的切片全部写入后记入检查点；中断后再次导入时跳过已完成的文件
+    - 完全相同 / 近似重复的切片 (见 dedup.py) 不向量化、不进入 BM25 索引，其路径记入规范切片的 metadata["aliases"]
+      (断点续传时已完成的文件同样参与去重，遍历顺序不变时结果与中断前一致)
+    :param done_files: 检查点中已完成的文件 (相对路径)
+    :param progress: 可选回调 progress(阶段, **计数)，报告已扫描文件数、切片数、已向量化切片数
+    :return: 切片总数
+    """
+    done_files = set(done_files or ())
+    os.makedirs(db_path, exist_ok=True)
+    save_checkpoint(db_path, project_url, done_files)
+
+    print(f"💾 正在流式处理并存入: {db_path} (批大小 {INGEST_BATCH_SIZE}, 并发 {INGEST_WORKERS})...")
+    start = time.perf_counter()
+    cache_before = get_embedding_cache().stats()
+    vector_store = open_vector_store(db_path, get_embeddings())
+    lexical_index = BM25Index()
+    symbols = SymbolIndex()
+    deduper = Deduper() if DEDUP_ENABLED else None
+    files = {}        # 相对路径 -> 切片 ID (用于增量更新清单)
+    remaining = {}    # 相对路径 -> 尚未写入的切片数
+    batch, batch_files = [], []
+    in_flight = set()
+    n_chunks = n_embedded = 0
+    last_checkpoint = time.monotonic()
+
+    timings = {}
+
+    def write_batch(docs):
+        # 批次内先向量化 (子 span embed.documents) 再写入向量库，扣除子 span 即为写入耗时
+        with _embed_slots, span("ingest.batch", chunks=len(docs)) as s:
+            vector_store.add_documents(docs, ids=[d.metadata["chunk_id"] for d in docs])
+        return docs, s.children_seconds, s.self_seconds
+
+    def submit(docs):
+        # 在工作线程中沿用当前的 trace (每个任务复制一份上下文)
+        return pool.submit(contextvars.copy_context().run, write_batch, docs)
+
+    def finish(future):
+        nonlocal n_embedded
+        docs, embed_seconds, persist_seconds = future.result()  # 批次失败时在此抛出，中断导入并保留检查点
+        timings["embed"] = timings.get("embed", 0.0) + embed_seconds
+        timings["persist"] = timings.get("persist", 0.0) + persist_seconds
+        n_embedded += len(docs)
+        report_progress(progress, "embedding", files_scanned=len(files), chunks=n_chunks, chunks_embedded=n_embedded)
+        for d in docs:
+            rel_path = d.metadata["chunk_id"].rsplit("#", 1)[0]
+            remaining[rel_path] -= 1
+            if remaining[rel_path] == 0:
+                done_files.add(rel_path)
+
+    with ThreadPoolExecutor(max_workers=INGEST_WORKERS) as pool:
+        try:
+            documents = iter_documents(source_path)
+            for rel_path, chunks in iter_file_chunks(documents, source_path, timings, symbols):
+                n_chunks += len(chunks)
+                files[rel_path] = [c.metadata["chunk_id"] for c in chunks]
+                if deduper is not None:
+                    t0 = time.perf_counter()
+                    chunks = [c for c in chunks if deduper.check(c.metadata["chunk_id"], c.page_content) is None]
+                    timings["dedup"] = timings.get("dedup", 0.0) + time.perf_counter() - t0
+                t0 = time.perf_counter()
+                for chunk in chunks:
+                    lexical_index.add(chunk.metadata["chunk_id"], chunk.page_content)
+                lexical_index.build_seconds += time.perf_counter() - t0
+                report_progress(progress, "embedding", files_scanned=len(files), chunks=n_chunks,
+                                chunks_embedded=n_embedded)
+                if rel_path in done_files or not chunks:
+                    continue
+
+                remaining[rel_path] = len(chunks)
+                for chunk in chunks:
+                    batch.append(chunk)
+                    if len(batch) >= INGEST_BATCH_SIZE:
+                        in_flight.add(submit(batch))
+                        batch = []
+
+                # 背压：在途批次过多时，等待至少一个批次完成
+                while len(in_flight) >= INGEST_WORKERS * 2:
+                    completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        finish(future)
+
+                if time.monotonic() - last_checkpoint > 5:
+                    save_checkpoint(db_path, project_url, done_files)
+                    last_checkpoint = time.monotonic()
+
+            if batch:
+                in_flight.add(submit(batch))
+            for future in wait(in_flight).done:
+                finish(future)
+            # 所有批次写入后，把别名路径合并进规范切片的元数据 (规范切片写入时还不知道之后的副本)
+            aliases = group_aliases(deduper.duplicates) if deduper is not None else {}
+            if aliases:
+                update_chunk_metadata(vector_store, {chunk_id: {"aliases": paths} for chunk_id, paths in aliases.items()})
+        except BaseException:
+            for future in in_flight:
+                future.cancel()
+            save_checkpoint(db_path, project_url, done_files)
+            raise
+        finally:
+            close_vector_store_writer(vector_store)
+
+    # 各阶段的累计耗时 (向量化与写入在线程池中并行，累计值可能超过总耗时)
+    record("ingest.scan", timings.get("scan", 0.0), echo=True, files=len(files))
+    record("ingest.split", timings.get("split", 0.0), echo=True, chunks=n_chunks)
+    record("ingest.embed", timings.get("embed", 0.0), echo=True, chunks=n_embedded)
+    record("ingest.persist", timings.get("persist", 0.0), echo=True, chunks=n_embedded)
+    if deduper is not None:
+        # 节省的向量化耗时按本次平均每个切片的向量化耗时估算
+        saved = deduper.removed * timings.get("embed", 0.0) / n_embedded if n_embedded else 0.0
+        record("ingest.dedup", timings.get("dedup", 0.0), echo=True, chunks=n_chunks, exact=deduper.exact,
+               near=deduper.near, saved_embed_seconds=round(saved, 3))
+        if deduper.removed:
+            print(f"🧬 去重: {n_chunks} 个切片中 {deduper.removed} 个为重复 (完全相同 {deduper.exact} / "
+                  f"近似 {deduper.near})，{len(aliases)} 个规范切片记录了别名路径，"
+                  f"节省向量化约 {saved:.1f}s，去重耗时 {timings.get('dedup', 0.0):.2f}s")
+
+    if not n_chunks:
+        return 0
+
+    report_progress(progress, "finalizing", files_scanned=len(files), chunks=n_chunks, chunks_embedded=n_embedded)
+    # BM25 倒排索引 (与向量库存放在同一目录)，用于混合检索
+    save_index(lexical_index, db_path)
+    # 符号索引：函数 / 类 / 常量 / 配置键 -> 定义所在切片，查询时精确命中 (重复切片中的定义指向规范切片)
+    duplicates = deduper.duplicates if deduper is not None else {}
+    symbols.remap_chunks(duplicates)
+    save_symbols(symbols, db_path)
+    # 记录清单，供后续增量更新使用；导入完成后删除检查点
+    save_manifest(db_path, project_url, git_head(source_path), files, duplicates)
+    os.remove(os.path.join(db_path, CHECKPOINT_FILENAME))
+
+    elapsed = time.perf_counter() - start
+    report_cache_stats(cache_before)
+    rss = peak_rss_mb()
+    print(
+        f"📊 导入完成: {n_chunks} 个切片 (本次写入 {n_embedded})，耗时 {elapsed:.1f}s，"
+        f"吞吐 {n_embedded / elapsed if elapsed else 0:.1f} 切片/秒"
+        + (f"，峰值内存 {rss:.0f} MB" if rss is not None else "")
+    )
+    return n_chunks
+
+def ingest_project(project_url, force_update=False, incremental=False, progress=None, trace_id=None, ref=None):
     """
     主入口
     :param project_url: GitHub 地址
     :param force_update: 是否强制重新下载并向量化
+    :param incremental: 增量更新模式：在已有克隆中拉取新提交，只处理变更的文件
+    :param progress: 可选回调 progress(阶段, **计数)，供后台导入任务展示进度 (见 job_queue.py)
+    :param trace_id: 指定 trace ID (后台任务预先分配，便于在 JSON 日志中检索)
+    :param ref: 可选，固定导入的分支 / Tag / 完整 commit，默认为上游默认分支
     """
+    # 一次导入对应一个 trace：clone / scan / split / embed / persist 各阶段都挂在其下
+    with span("ingest", trace_id=trace_id, echo=True, project=get_project_name(project_url),
+              force=force_update, incremental=incremental) as s:
+        db_path, message = _ingest_project(project_url, force_update, incremental, progress, ref)
+        s.set(result=message)
+        if db_path is None:
+            s.error = message
+    return db_path, message
+
+def _ingest_project(project_url, force_update, incremental, progress, ref):
     # 🛡️ 安全检查：验证 URL 格式
     if not is_valid_git_url(project_url):
         print(f"❌ 无效的 Git URL: {project_url}")
         return None, "Invalid URL: Only GitHub/GitLab/Gitee/Bitbucket URLs are allowed"
+    if ref and not is_valid_git_ref(ref):
+        print(f"❌ 无效的 ref: {ref}")
+        return None, "Invalid ref"
     
     project_name = get_project_name(project_url)
     
@@ -79,69 +660,80 @@ def ingest_project(project_url, force_update=False):
     
     print(f"🚀 开始处理项目: {project_name}")
 
+    # --- 增量更新：需要已有克隆 + 已有清单，否则退回全量处理 ---
+    if incremental:
+        manifest = load_manifest(db_path)
+        if (manifest and manifest.get("commit") and os.path.isdir(os.path.join(source_path, ".git"))
+                and manifest.get("chunk_strategy", "legacy") == CHUNK_STRATEGY):
+            return update_project(project_url, source_path, db_path, manifest, progress, ref)
+        print("⚠️ 缺少已有克隆或导入清单 (或切分策略已变更)，改为全量处理")
+        force_update = True
+
+    # --- 断点续传：上次导入中断 (存在检查点) 且源码仍在，则从断点继续 ---
+    # 检查点存在说明向量库只写入了部分文件，不能当作缓存直接加载：源码已被删除、检查点损坏
+    # 或属于同名的其他仓库时，重新克隆并全量导入
+    checkpoint = load_checkpoint(db_path)
+    incomplete = os.path.exists(os.path.join(db_path, CHECKPOINT_FILENAME))
+    resume = (checkpoint is not None and not force_update and os.path.isdir(source_path)
+              and checkpoint.get("url") == project_url)
+    if incomplete and not resume and not force_update:
+        print("⚠️ 上次导入未完成且无法从断点继续 (源码缺失或检查点无效)，重新克隆并全量导入")
+        force_update = True
+
     # --- [关键优化] 智能缓存检查 ---
     # 如果数据库存在，且用户没有要求强制更新，直接返回现有数据库
-    if os.path.exists(db_path) and not force_update:
+    if os.path.exists(db_path) and not force_update and not resume:
         print(f"✅ 发现现有向量库: {db_path}")
         print(f"⏩ 跳过下载与计算，直接加载缓存。")
         return db_path, "Cached: Loaded existing database"
 
-    # --- 以下是原有逻辑 (下载 + 计算) ---
-    
-    # 1. 下载代码
-    if not clone_repo(project_url, source_path):
-        return None, "Clone Failed"
-
-    # 2. 加载文件
-    print("📂 正在扫描文件...")
-    documents = []
-    # 增加了一些常见后缀
-    file_patterns = ["**/*.py", "**/*.md", "**/*.js", "**/*.ts", "**/*.java", "**/*.go", "**/*.txt", "**/*.yaml"]
-    
-    for pattern in file_patterns:
-        try:
-            loader = DirectoryLoader(
-                source_path, glob=pattern, loader_cls=TextLoader,
-                silent_errors=True,
-                loader_kwargs={'encoding': 'utf-8', 'autodetect_encoding': True}
-            )
-            documents.extend(loader.load())
-        except Exception:
-            pass
-            
-    if not documents:
+    old_hashes = set()
+    if resume:
+        print(f"♻️ 检测到未完成的导入，已完成 {len(checkpoint['done_files'])} 个文件，从断点继续")
+    else:
+        # 1. 下载代码
+        report_progress(progress, "cloning")
+        with span("ingest.clone", echo=True) as s:
+            cloned = clone_repo(project_url, source_path, ref)
+            if not cloned:
+                s.error = "Clone Failed"
+        if not cloned:
+            return None, "Clone Failed"
+
+        # 如果有旧库，先清理，防止数据重复叠加 (记下旧切片，导入完成后清理失效的评分缓存)
+        old_manifest = load_manifest(db_path)
+        if old_manifest:
+            old_hashes = manifest_hashes(old_manifest.get("files", {}))
+        if os.path.exists(db_path):
+            release_vector_store(db_path)
+            shutil.rmtree(db_path)
+        checkpoint = {"url": project_url, "done_files": []}
+
+    # 2~5. 扫描 -> 切分 -> 分批向量化 -> 写入向量库 (流式)
+    try:
+        n_chunks = index_source_tree(source_path, db_path, project_url, set(checkpoint["done_files"]), progress)
+    except Exception as e:
+        print(f"❌ 导入中断: {e}")
+        return None, f"Ingest Interrupted: {e} (重新导入即可从断点继续)"
+
+    if not n_chunks:
+        release_vector_store(db_path)
+        shutil.rmtree(db_path, ignore_errors=True)
         return None, "No Documents Found"
 
-    # 3. 切分
-    print("✂️ 正在切分...")
-    splitter = RecursiveCharacterTextSplitter.from_language(
-        language=Language.PYTHON, chunk_size=1500, chunk_overlap=200
-    )
-    chunks = splitter.split_documents(documents)
-    
-    # 4. 向量化 (如果有旧库，先清理，防止数据重复叠加)
-    if os.path.exists(db_path):
-        shutil.rmtree(db_path)
-
-    print(f"💾 正在计算向量并存入: {db_path}...")
-    embeddings = OllamaEmbeddings(
-        model=EMBED_MODEL,
-        base_url=OLLAMA_BASE_URL
-    )
-    
-    vector_store = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=db_path
-    )
-    
-    return db_path, f"Success: Processed {len(chunks)} new chunks"
+    if old_hashes:
+        drop_stale_verdicts(old_hashes, (load_manifest(db_path) or {}).get("files", {}))
+    return db_path, f"Success: Processed {n_chunks} new chunks"
 
 def list_existing_projects():
     """列出已经存在的项目数据库"""
     if not os.path.exists(DB_ROOT):
         os.makedirs(DB_ROOT)
         return []
-    # 扫描文件夹，只返回目录名
-    projects = [d for d in os.listdir(DB_ROOT) if os.path.isdir(os.path.join(DB_ROOT, d))]
+    # 扫描文件夹，只返回目录名 (跳过仍在导入中、存在检查点的项目)
+    projects = [
+        d for d in os.listdir(DB_ROOT)
+        if os.path.isdir(os.path.join(DB_ROOT, d))
+        and not os.path.exists(os.path.join(DB_ROOT, d, CHECKPOINT_FILENAME))
+    ]
     return projects
\ No newline at end of file
@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ingest import DB_ROOT, ingest_project, get_project_name, is_valid_git_url, is_valid_git_ref
+from telemetry import new_trace_id
+
+# 同时执行的导入任务数 (每个任务内部还有 INGEST_WORKERS 个向量化线程，全局再受 INGEST_EMBED_CONCURRENCY 限制)
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+# 任务状态持久化文件 (SQLite，WAL 模式)：Web 界面与 API 服务等多个进程共享同一份任务列表，
+# 同一项目跨进程也只有一个进行中的任务；进程重启后仍可查询历史任务
+INGEST_JOB_STATE_PATH = os.getenv("INGEST_JOB_STATE_PATH", os.path.join(DB_ROOT, "ingest_jobs.sqlite"))
+# 保留的已结束任务数
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "50"))
+# 执行任务的进程定期刷新心跳；进行中的任务超过该时长 (秒) 没有心跳，视为所在进程已退出，标记为 interrupted
+INGEST_JOB_STALE_SECONDS = float(os.getenv("INGEST_JOB_STALE_SECONDS", "60"))
+# 进度更新的落盘间隔 (秒)；状态变化 (开始 / 结束) 总是立即落盘
+_SAVE_INTERVAL = 2.0
+_HEARTBEAT_INTERVAL = 10.0
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobConflictError(ValueError):
+    """同名项目 (source_code/<项目名>) 正在导入另一个仓库地址"""
+
+
+def _same_repo(a, b):
+    """忽略结尾的 / 与 .git 比较仓库地址"""
+    def normalize(url):
+        url = url.strip().rstrip("/")
+        return url[:-4] if url.endswith(".git") else url
+    return normalize(a) == normalize(b)
+
+
+class JobQueue:
+    """
+    后台导入任务队列
+    - 导入在工作线程池中执行，Streamlit / HTTP 请求只负责提交和轮询进度，不会被阻塞
+    - 同一项目 (source_code/<项目名>) 同时只有一个进行中的任务 (跨进程)，重复提交同一地址直接返回已有任务；
+      同名但地址不同的仓库 (例如 fork) 会写入同一目录，提交时抛出 JobConflictError
+    - 任务状态写入共享的 SQLite 文件，每个进程只写自己执行的任务；执行任务的进程退出后心跳停止，
+      其他进程 (或重启后的进程) 将这些任务标记为 interrupted，重新提交即可从导入检查点继续
+    """
+
+    def __init__(self, workers=INGEST_JOB_WORKERS, path=INGEST_JOB_STATE_PATH,
+                 history=INGEST_JOB_HISTORY, runner=ingest_project, stale_seconds=INGEST_JOB_STALE_SECONDS):
+        self.path = path
+        self.history = history
+        self.runner = runner
+        self.stale_seconds = stale_seconds
+        self.workers = max(1, workers)
+        self.owner = uuid.uuid4().hex[:12]
+        self._owned = {}      # 本进程执行的任务 (内存中的进度可能比落盘的新)
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest-job")
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 事务由代码显式控制 (BEGIN IMMEDIATE)，查重与插入之间其他进程不能写入
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                project TEXT NOT NULL,
+                status TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                heartbeat REAL NOT NULL,
+                created REAL NOT NULL,
+                data TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_project ON jobs (project, status)")
+        threading.Thread(target=self._heartbeat_loop, name="ingest-job-heartbeat", daemon=True).start()
+
+    def _write_locked(self, job):
+        """写入 (或覆盖) 一个本进程执行的任务；调用方需持有锁"""
+        job["heartbeat"] = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, project, status, owner, heartbeat, created, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job["id"], job["project"], job["status"], self.owner, job["heartbeat"], job["created"],
+             json.dumps(job, ensure_ascii=False)),
+        )
+
+    def _save_locked(self, job_id, force=True):
+        """调用方需持有锁；force=False 时按间隔节流"""
+        now = time.time()
+        if not force and now - self._last_save < _SAVE_INTERVAL:
+            return
+        self._last_save = now
+        try:
+            self._write_locked(self._owned[job_id])
+        except sqlite3.Error as e:
+            print(f"⚠️ 导入任务状态保存失败: {e}")
+
+    def _expire_stale_locked(self):
+        """其他进程执行、且心跳已停止的进行中任务标记为 interrupted；调用方需持有锁"""
+        rows = self._conn.execute(
+            "SELECT data FROM jobs WHERE status IN (?, ?) AND owner != ? AND heartbeat < ?",
+            (*ACTIVE_STATUSES, self.owner, time.time() - self.stale_seconds),
+        ).fetchall()
+        for (data,) in rows:
+            job = json.loads(data)
+            job["status"] = "interrupted"
+            job["message"] = "进程退出时任务未完成，重新导入即可从断点继续"
+            job["finished"] = job.get("finished") or time.time()
+            self._conn.execute("UPDATE jobs SET status = ?, data = ? WHERE id = ?",
+                               (job["status"], json.dumps(job, ensure_ascii=False), job["id"]))
+
+    def _prune_locked(self):
+        """只保留最近的已结束任务"""
+        self._conn.execute(
+            "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status NOT IN (?, ?) "
+            "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (*ACTIVE_STATUSES, self.history),
+        )
+
+    def _heartbeat_loop(self):
+        """定期刷新本进程执行中任务的心跳 (顺带落盘节流中的进度)"""
+        while True:
+            time.sleep(_HEARTBEAT_INTERVAL)
+            with self._lock:
+                try:
+                    for job in self._owned.values():
+                        self._write_locked(job)
+                except sqlite3.Error as e:
+                    print(f"⚠️ 导入任务心跳写入失败: {e}")
+
+    def _read_locked(self, where="", params=()):
+        self._expire_stale_locked()
+        rows = self._conn.execute(f"SELECT data FROM jobs {where}", params).fetchall()
+        jobs = {}
+        for (data,) in rows:
+            job = json.loads(data)
+            # 本进程执行的任务以内存中的最新进度为准
+            job = self._owned.get(job["id"], job)
+            jobs[job["id"]] = dict(job, progress=dict(job["progress"]))
+        return jobs
+
+    def active_for(self, project):
+        with self._lock:
+            jobs = self._read_locked("WHERE project = ? AND status IN (?, ?)", (project, *ACTIVE_STATUSES))
+        return next(iter(jobs.values()), None)
+
+    def submit(self, url, force_update=False, incremental=False, ref=None):
+        """
+        提交导入任务
+        :param ref: 可选，固定导入的分支 / Tag / 完整 commit
+        :return: (任务, 是否新建)；同一项目已有进行中的同一地址、同样选项的任务时返回该任务，新建为 False
+        :raises JobConflictError: 同名项目正在导入另一个仓库地址，或同一仓库的进行中任务使用了不同的 ref / 选项
+        """
+        url = url.strip()
+        if not is_valid_git_url(url):
+            raise ValueError("Invalid URL: Only GitHub/GitLab/Gitee/Bitbucket URLs are allowed")
+        ref = (ref or "").strip() or None
+        if ref and not is_valid_git_ref(ref):
+            raise ValueError(f"Invalid ref: {ref}")
+        project = get_project_name(url)
+        with self._lock:
+            # 查重与插入在同一个写事务中完成，两个进程同时提交同一项目时只有一个能创建任务
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                active = self._read_locked("WHERE project = ? AND status IN (?, ?)", (project, *ACTIVE_STATUSES))
+                existing = next(iter(active.values()), None)
+                if existing is None:
+                    job = {
+                        "id": uuid.uuid4().hex[:12], "project": project, "url": url,
+                        "ref": ref, "force": bool(force_update), "incremental": bool(incremental),
+                        "status": "queued", "stage": "queued", "progress": {}, "message": "",
+                        "db_path": None, "trace_id": new_trace_id(),
+                        "created": time.time(), "started": None, "finished": None,
+                    }
+                    self._write_locked(job)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            if existing is not None:
+                if not _same_repo(existing["url"], url):
+                    raise JobConflictError(
+                        f"项目 {project} 正在导入 {existing['url']} (任务 {existing['id']})，"
+                        f"与 {url} 使用同一目录，请等待该任务结束后再提交"
+                    )
+                # 同一仓库但 ref / 强制更新 / 增量模式不同：不能当作同一个任务静默丢弃新的请求
+                requested = (ref, bool(force_update), bool(incremental))
+                if (existing.get("ref"), existing["force"], existing["incremental"]) != requested:
+                    raise JobConflictError(
+                        f"项目 {project} 已有进行中的导入任务 {existing['id']} "
+                        f"(ref={existing.get('ref')}, force={existing['force']}, incremental={existing['incremental']})，"
+                        f"与本次请求的选项不同，请等待该任务结束后再提交"
+                    )
+                return existing, False
+            self._owned[job["id"]] = job
+            snapshot = dict(job, progress={})
+        print(f"📋 导入任务已排队: {project} ({job['id']})")
+        self._executor.submit(self._run, job["id"])
+        return snapshot, True
+
+    def _update(self, job_id, force=True, **fields):
+        with self._lock:
+            self._owned[job_id].update(fields)
+            self._save_locked(job_id, force)
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self._owned[job_id]
+            url, ref, force, incremental = job["url"], job.get("ref"), job["force"], job["incremental"]
+            trace_id = job["trace_id"]
+        self._update(job_id, status="running", stage="starting", started=time.time())
+
+        def progress(stage, **counters):
+            with self._lock:
+                job = self._owned[job_id]
+                job["stage"] = stage
+                job["progress"].update(counters)
+                self._save_locked(job_id, force=False)
+
+        try:
+            db_path, message = self.runner(url, force_update=force, incremental=incremental,
+                                           progress=progress, trace_id=trace_id, ref=ref)
+        except Exception as e:
+            print(f"❌ 导入任务失败 ({job_id}): {e}")
+            db_path, message = None, f"Ingest Failed: {e}"
+
+        if db_path:
+            # 向量库可能已更新或重建，丢弃缓存中的旧检索器
+            from project_registry import get_project_registry
+            get_project_registry().invalidate(get_project_name(url))
+        self._update(job_id, status="done" if db_path else "failed", stage="done" if db_path else "failed",
+                     db_path=db_path, message=message, finished=time.time())
+        with self._lock:
+            del self._owned[job_id]
+            self._prune_locked()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._read_locked("WHERE id = ?", (job_id,)).get(job_id)
+
+    def list(self, project=None):
+        """按提交时间倒序列出任务 (包括其他进程提交的任务)"""
+        with self._lock:
+            if project is None:
+                jobs = self._read_locked()
+            else:
+                jobs = self._read_locked("WHERE project = ?", (project,))
+        return sorted(jobs.values(), key=lambda j: j["created"], reverse=True)
+
+    def stats(self):
+        with self._lock:
+            self._expire_stale_locked()
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"workers": self.workers, "jobs": counts}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """进程内共享的任务队列 (Streamlit 各会话与 HTTP API 共用)"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def format_progress(job):
+    """任务进度的简短描述，供界面展示"""
+    p = job.get("progress", {})
+    labels = {
+        "queued": "排队中", "starting": "准备中", "cloning": "克隆代码", "fetching": "拉取更新",
+        "splitting": "切分变更文件", "embedding": "向量化", "finalizing": "构建 BM25 索引",
+        "done": "完成", "failed": "失败", "interrupted": "已中断",
+    }
+    text = labels.get(job.get("stage"), job.get("stage", ""))
+    if "files_scanned" in p:
+        text += f" · 已扫描 {p['files_scanned']} 个文件"
+    if "chunks" in p:
+        text += f" · 已向量化 {p.get('chunks_embedded', 0)}/{p['chunks']} 个切片"
+    return text
@@ -0,0 +1,189 @@
+import os
+import re
+import json
+import math
+import heapq
+import time
+from collections import Counter
+
+# BM25 倒排索引文件，与 Chroma 数据存放在同一个项目目录下
+INDEX_FILENAME = "bm25_index.json"
+
+# 标识符 (含 snake_case / camelCase / 常量名) 与中日韩字符
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+_CJK_RE = re.compile(r"[一-鿿]+")
+
+
+def tokenize(text):
+    """
+    代码友好的分词：
+    - 完整标识符 (小写) 保留，便于精确命中 `build_graph`、`OLLAMA_BASE_URL`
+    - 同时拆出 snake_case / camelCase 的各个部分，便于模糊命中
+    - 中文按相邻双字切分
+    """
+    tokens = []
+    for ident in _IDENT_RE.findall(text):
+        lower = ident.lower()
+        if len(lower) > 1:
+            tokens.append(lower)
+        parts = [p.lower() for piece in ident.split("_") for p in _CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if len(p) > 1)
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    轻量级 BM25 倒排索引 (纯 Python，JSON 持久化)
+    只保存 chunk_id、词频与文档长度，正文仍由向量库负责存取
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = []     # 槽位 -> chunk_id (删除后为 None)
+        self.doc_lens = []    # 槽位 -> 文档长度 (token 数)
+        self.postings = {}    # term -> {槽位: 词频}
+        self.build_seconds = 0.0
+
+    @property
+    def size(self):
+        return sum(1 for d in self.doc_ids if d is not None)
+
+    def add(self, doc_id, text):
+        """加入一篇文档"""
+        slot = len(self.doc_ids)
+        counts = Counter(tokenize(text))
+        self.doc_ids.append(doc_id)
+        self.doc_lens.append(sum(counts.values()))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[slot] = tf
+
+    def remove(self, doc_ids):
+        """删除一批文档 (按 chunk_id)"""
+        targets = set(doc_ids)
+        slots = {i for i, d in enumerate(self.doc_ids) if d in targets}
+        if not slots:
+            return 0
+        for slot in slots:
+            self.doc_ids[slot] = None
+            self.doc_lens[slot] = 0
+        for term in list(self.postings):
+            posting = self.postings[term]
+            for slot in slots & posting.keys():
+                del posting[slot]
+            if not posting:
+                del self.postings[term]
+        return len(slots)
+
+    def search(self, query, k=20):
+        """返回 [(chunk_id, bm25 分数)]，按分数从高到低"""
+        n_docs = self.size
+        if n_docs == 0:
+            return []
+        avg_len = sum(self.doc_lens) / n_docs or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for slot, tf in posting.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_lens[slot] / avg_len)
+                scores[slot] = scores.get(slot, 0.0) + idf * tf * (self.k1 + 1) / norm
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.doc_ids[slot], score) for slot, score in top]
+
+    def save(self, path):
+        """压缩掉已删除的槽位后写入 JSON"""
+        remap = {}
+        doc_ids, doc_lens = [], []
+        for slot, doc_id in enumerate(self.doc_ids):
+            if doc_id is not None:
+                remap[slot] = len(doc_ids)
+                doc_ids.append(doc_id)
+                doc_lens.append(self.doc_lens[slot])
+        postings = {
+            term: [[remap[slot], tf] for slot, tf in posting.items()]
+            for term, posting in self.postings.items()
+        }
+        data = {
+            "k1": self.k1, "b": self.b,
+            "doc_ids": doc_ids, "doc_lens": doc_lens, "postings": postings,
+            "build_seconds": self.build_seconds,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+        index.doc_ids = data["doc_ids"]
+        index.doc_lens = data["doc_lens"]
+        index.postings = {
+            term: {slot: tf for slot, tf in posting}
+            for term, posting in data["postings"].items()
+        }
+        index.build_seconds = data.get("build_seconds", 0.0)
+        return index
+
+
+def save_index(index, db_path):
+    """
+    在 ingest 阶段把 BM25 索引写入 db_path (与向量库存放在同一目录)
+    索引在流式切分时逐个切片构建，构建耗时记录在 index.build_seconds
+    """
+    start = time.perf_counter()
+    index.save(os.path.join(db_path, INDEX_FILENAME))
+    print(
+        f"📇 BM25 索引已构建: {index.size} 个切片, {len(index.postings)} 个词项, "
+        f"构建耗时 {index.build_seconds:.2f}s, 写入耗时 {time.perf_counter() - start:.2f}s"
+    )
+    return index
+
+
+def update_index(db_path, removed_ids, added_chunks):
+    """增量更新：从索引中删除旧切片并加入新切片 (无需重新分词未变化的文件)"""
+    index = load_index(db_path) or BM25Index()
+    start = time.perf_counter()
+    removed = index.remove(removed_ids)
+    for chunk in added_chunks:
+        index.add(chunk.metadata["chunk_id"], chunk.page_content)
+    index.build_seconds = time.perf_counter() - start
+    index.save(os.path.join(db_path, INDEX_FILENAME))
+    print(f"📇 BM25 索引已增量更新: -{removed} / +{len(added_chunks)} 个切片, 耗时 {index.build_seconds:.2f}s")
+    return index
+
+
+def load_index(db_path):
+    """读取项目的 BM25 索引，不存在时返回 None (旧项目仅使用向量检索)"""
+    path = os.path.join(db_path, INDEX_FILENAME)
+    if not os.path.exists(path):
+        return None
+    start = time.perf_counter()
+    index = BM25Index.load(path)
+    print(f"📇 已加载 BM25 索引: {index.size} 个切片, 耗时 {time.perf_counter() - start:.2f}s")
+    return index
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    倒数排名融合 (RRF)：score(d) = Σ 1 / (k + rank)
+    :param rankings: 多个按相关性排好序的 chunk_id 列表
+    :return: [(chunk_id, 融合分数)]，按分数从高到低
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,8 +1,14 @@
 import os
-from langchain_community.vectorstores import Chroma
-from langchain_ollama import OllamaEmbeddings, ChatOllama
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+import time
+from typing import Any, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from lexical_index import load_index, reciprocal_rank_fusion
+from symbol_index import load_symbols
+from flat_store import FlatVectorStore, open_vector_store, search_with_relevance
+from embedding_cache import CachedEmbeddings
+from telemetry import TelemetryCallback, record, span
+from model_clients import get_client
 
 os.environ["NO_PROXY"] = "localhost,127.0.0.1"
 
@@ -11,38 +17,182 @@ os.environ["NO_PROXY"] = "localhost,127.0.0.1"
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
 EMBED_MODEL = "nomic-embed-text"
 LOCAL_LLM = "qwen2.5:7b"
+# 评分 Prompt 版本：修改对应 Prompt 或 _GRADING_CRITERIA 时递增，使缓存的评分结果失效
+# 逐篇评分与多文档评分的 Prompt 不同，评分缓存按实际使用的 Prompt 分别记录
+GRADER_PROMPT_VERSION = "1"
+BATCH_GRADER_PROMPT_VERSION = "batch-1"
+# 检索数量：每次查询从向量库取回的片段数
+RETRIEVE_K = int(os.getenv("RETRIEVE_K", "50"))
+# 检索模式：hybrid = BM25 + 向量 (RRF 融合，项目有 BM25 索引时生效)；vector = 纯向量检索
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# 混合检索：每一路各取 HYBRID_FETCH_K 个候选，融合后保留 HYBRID_K 个
+HYBRID_K = int(os.getenv("HYBRID_K", "20"))
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "30"))
+RRF_K = 60
+# 精确符号查找：问题中提到的函数名 / 类名 / 常量 / 配置键直接命中定义所在切片 (项目有符号索引时生效)
+SYMBOL_LOOKUP_ENABLED = os.getenv("SYMBOL_LOOKUP_ENABLED", "true").lower() == "true"
 
 
+class ScoredRetriever(BaseRetriever):
+    """
+    向量检索器：与 as_retriever 返回相同的 Top-K，
+    额外把相似度分数 (0~1，越高越相关) 写入 metadata["score"]，供流式评分按分数排序/截断
+    """
+    vectorstore: Any
+    k: int = RETRIEVE_K
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        results = search_with_relevance(self.vectorstore, query, self.k)
+        documents = []
+        for doc, score in results:
+            doc.metadata["score"] = float(score)
+            documents.append(doc)
+        return documents
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    混合检索器：向量检索 + BM25 关键词检索，通过倒数排名融合 (RRF) 合并
+    精确的标识符命中 (函数名、常量名) 由 BM25 负责召回，因此只需更小的 k
+    """
+    vectorstore: Any
+    lexical_index: Any
+    k: int = HYBRID_K
+    fetch_k: int = HYBRID_FETCH_K
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        with span("retrieve.hybrid") as s:
+            t0 = time.perf_counter()
+            vector_results = search_with_relevance(self.vectorstore, query, self.fetch_k)
+            t1 = time.perf_counter()
+            lexical_results = self.lexical_index.search(query, k=self.fetch_k)
+            t2 = time.perf_counter()
+
+            docs_by_id = {}
+            vector_ranking = []
+            for doc, score in vector_results:
+                doc.metadata["score"] = float(score)
+                chunk_id = doc.metadata.get("chunk_id") or doc.page_content
+                docs_by_id.setdefault(chunk_id, doc)
+                vector_ranking.append(chunk_id)
+            lexical_ranking = [chunk_id for chunk_id, _ in lexical_results]
+
+            fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking], k=RRF_K)[:self.k]
+
+            # 只被 BM25 命中的切片，从向量库按 ID 取回正文
+            missing = [chunk_id for chunk_id, _ in fused if chunk_id not in docs_by_id]
+            if missing:
+                fetched = self.vectorstore.get(ids=missing, include=["documents", "metadatas"])
+                for chunk_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+                    docs_by_id[chunk_id] = Document(page_content=text, metadata=metadata or {})
+
+            documents = []
+            for chunk_id, rrf_score in fused:
+                doc = docs_by_id.get(chunk_id)
+                if doc is not None:
+                    doc.metadata["rrf_score"] = rrf_score
+                    documents.append(doc)
+            s.set(vector_ms=round((t1 - t0) * 1000), bm25_ms=round((t2 - t1) * 1000),
+                  fuse_ms=round((time.perf_counter() - t2) * 1000), docs_out=len(documents))
+        return documents
+
+class SymbolRetriever(BaseRetriever):
+    """
+    先查符号索引：问题中提到的标识符命中定义时，把定义所在的切片放在检索结果最前面，
+    并标记 metadata["symbol_match"]，评分节点直接保留这些切片，不再调用模型评分
+    """
+    base: Any
+    vectorstore: Any
+    symbol_index: Any
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        with span("retrieve.symbols") as s:
+            matches = self.symbol_index.lookup(query)
+            exact = []
+            if matches:
+                ids = [m["chunk_id"] for m in matches]
+                fetched = self.vectorstore.get(ids=ids, include=["documents", "metadatas"])
+                docs_by_id = {
+                    chunk_id: Document(page_content=text, metadata=metadata or {})
+                    for chunk_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+                }
+                for match in matches:
+                    doc = docs_by_id.get(match["chunk_id"])
+                    if doc is not None:
+                        doc.metadata["symbol_match"] = f"{match['name']} ({match['kind']}, {match['path']}:{match['start_line']})"
+                        exact.append(doc)
+            s.set(docs_out=len(exact), matches=[d.metadata["symbol_match"] for d in exact])
+
+        documents = self.base.invoke(query)
+        seen = {d.metadata.get("chunk_id") for d in exact}
+        return exact + [d for d in documents if d.metadata.get("chunk_id") not in seen]
+
+def build_embeddings():
+    """Ollama 向量模型，外面包一层共享的向量缓存 (导入与查询共用，由 model_clients 首次使用时构建)"""
+    from langchain_ollama import OllamaEmbeddings
+    from http_clients import ollama_client_kwargs
+    return CachedEmbeddings(
+        OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_BASE_URL, sync_client_kwargs=ollama_client_kwargs()),
+        model_name=EMBED_MODEL
+    )
+
+def get_query_embeddings():
+    """查询向量同样走共享缓存 (重复的问题、预置的建议问题不再请求 Ollama)"""
+    return get_client("embeddings")
+
 def get_retriever(db_path):
     """
     工厂函数：根据数据库路径，返回一个新的检索器
     """
-    print(f"🔌 [Local Worker] 正在连接知识库: {db_path}")
-    embeddings = OllamaEmbeddings(
-        model=EMBED_MODEL,
-        base_url=OLLAMA_BASE_URL
-    )
-    vectorstore = Chroma(
-        persist_directory=db_path, 
-        embedding_function=embeddings
-    )
-    # 扩大搜索范围到 50
-    return vectorstore.as_retriever(search_kwargs={"k": 50})
+    # 按项目目录中的文件选择后端 (Chroma / flat)
+    vectorstore = open_vector_store(db_path, get_query_embeddings())
+    # 有 BM25 索引时使用混合检索，k 可以大幅缩小
+    lexical_index = load_index(db_path) if RETRIEVAL_MODE == "hybrid" else None
+    if lexical_index is not None:
+        retriever = HybridRetriever(vectorstore=vectorstore, lexical_index=lexical_index)
+    else:
+        # 扩大搜索范围到 50 (RETRIEVE_K)，并附带相似度分数
+        retriever = ScoredRetriever(vectorstore=vectorstore, k=RETRIEVE_K)
+    symbol_index = load_symbols(db_path) if SYMBOL_LOOKUP_ENABLED else None
+    if symbol_index is not None:
+        return SymbolRetriever(base=retriever, vectorstore=vectorstore, symbol_index=symbol_index)
+    return retriever
 
-def get_grader_chain():
-    """返回评分链对象 (无状态，可复用)"""
-    llm = ChatOllama(
+def vector_store_system(vectorstore):
+    """检索器当前使用的 Chroma 底层连接 (按目录在进程内共享)；flat 后端每个检索器独占，即为自身"""
+    if isinstance(vectorstore, FlatVectorStore):
+        return vectorstore
+    from chromadb.api.shared_system_client import SharedSystemClient
+    return SharedSystemClient._identifier_to_system.get(vectorstore._client._identifier)
+
+def close_vector_store(vectorstore, system):
+    """
+    关闭检索器持有的 Chroma 客户端 (引用计数归零时释放底层连接与内存中的索引)
+    目录若已被重新导入 (旧连接已由 ingest 释放并重建)，不能再减新连接的引用计数，直接跳过
+    """
+    try:
+        if isinstance(vectorstore, FlatVectorStore):
+            vectorstore.close()
+        elif vector_store_system(vectorstore) is system:
+            vectorstore._client.close()
+    except Exception as e:
+        record("vector_store.close", 0.0, error=f"{type(e).__name__}: {e}")
+
+def _build_grader_llm():
+    """评分用的本地模型：温度为 0 且强制 JSON 输出 (连接池、并发与限速由 http_clients 统一管理)"""
+    from langchain_ollama import ChatOllama
+    from http_clients import ollama_client_kwargs
+    return ChatOllama(
         model=LOCAL_LLM, 
         temperature=0, 
         format="json",
-        base_url=OLLAMA_BASE_URL
+        base_url=OLLAMA_BASE_URL,
+        sync_client_kwargs=ollama_client_kwargs(),
+        callbacks=[TelemetryCallback("llm.grade")]
     )
 
-    # 优化后的 Prompt：更宽容的评分策略 + 三级评分
-    prompt = ChatPromptTemplate.from_template(
-        """你是一个宽容的文档相关性评分员。你的任务是判断文档是否可能对回答问题有帮助。
-
-评分标准（请倾向于保留文档）：
+# 逐篇评分与多文档评分共用的评分标准 (修改后需同时递增两个 Prompt 版本)
+_GRADING_CRITERIA = """评分标准（请倾向于保留文档）：
 - "yes": 文档**直接相关**，包含能回答问题的关键信息
 - "partial": 文档**间接相关**，包含背景信息、相关概念、或可能有用的上下文
 - "no": 文档**完全无关**，与问题毫无关联
@@ -51,7 +201,21 @@ def get_grader_chain():
 1. 如果文档来自同一项目/代码库，倾向于评为 "partial" 而非 "no"
 2. 代码文件中的函数名、类名、变量名如果与问题相关，应评为 "yes" 或 "partial"
 3. README、配置文件、注释通常包含有用上下文，倾向于保留
+"""
+
+
+def get_grader_chain():
+    """返回评分链对象 (无状态，可复用)"""
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import JsonOutputParser
+
+    llm = _build_grader_llm()
+
+    # 优化后的 Prompt：更宽容的评分策略 + 三级评分
+    prompt = ChatPromptTemplate.from_template(
+        """你是一个宽容的文档相关性评分员。你的任务是判断文档是否可能对回答问题有帮助。
 
+""" + _GRADING_CRITERIA + """
 必须输出严格的 JSON 格式：
 {{ "score": "yes" }} 或 {{ "score": "partial" }} 或 {{ "score": "no" }}
 
@@ -60,4 +224,26 @@ def get_grader_chain():
 JSON 输出:
 """
     )
-    return prompt | llm | JsonOutputParser()
\ No newline at end of file
+    return prompt | llm | JsonOutputParser()
+
+def get_batch_grader_chain():
+    """返回多文档评分链：一次 Prompt 评分多篇文档，输出逐篇的判定数组"""
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import JsonOutputParser
+
+    llm = _build_grader_llm()
+
+    prompt = ChatPromptTemplate.from_template(
+        """你是一个宽容的文档相关性评分员。你的任务是逐篇判断下面编号的文档是否可能对回答问题有帮助。
+
+""" + _GRADING_CRITERIA + """
+共有 {count} 篇文档，必须输出严格的 JSON 格式，scores 数组按文档编号顺序给出每篇的评分，长度必须为 {count}：
+{{ "scores": ["yes", "partial", "no"] }}
+
+问题: {question}
+文档:
+{documents}
+JSON 输出:
+"""
+    )
+    return prompt | llm | JsonOutputParser()
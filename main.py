@@ -3,6 +3,15 @@ import sys
 import subprocess
 import time
 
+def start_api():
+    """启动无界面的 HTTP 查询接口 (python main.py api)"""
+    from api_server import run
+    try:
+        run()
+    except KeyboardInterrupt:
+        print("\n\n👋 服务已停止。再见！")
+
+
 def start_application():
     """
     Project Synapse 统一启动入口
@@ -37,5 +46,16 @@ def start_application():
     except Exception as e:
         print(f"\n❌ 启动失败: {e}")
 
+def calibrate_grader():
+    """根据已记录的 LLM 评分样本校准快速评分引擎 (python main.py calibrate-grader)"""
+    from fast_grader import run_calibration
+    run_calibration()
+
+
 if __name__ == "__main__":
-    start_application()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "api":
+        start_api()
+    elif len(sys.argv) > 1 and sys.argv[1] == "calibrate-grader":
+        calibrate_grader()
+    else:
+        start_application()
\ No newline at end of file
@@ -0,0 +1,65 @@
+import os
+import time
+import importlib
+import threading
+
+from telemetry import record
+
+# 模型客户端注册表：名称 -> "模块:工厂函数"
+# 工厂函数在函数体内才导入 langchain_openai / langchain_ollama 等集成库，首次 get_client 时构建并在进程内复用，
+# 界面首屏与 HTTP 服务启动都不再为用不到的模型客户端付出导入开销
+CLIENT_FACTORIES = {
+    "embeddings": "local_worker:build_embeddings",
+    "grader": "local_worker:get_grader_chain",
+    "batch_grader": "local_worker:get_batch_grader_chain",
+    "generator": "cloud_brain:build_generator_chain",
+    "profiler": "profiler:build_profiler_chain",
+}
+# 首屏渲染后在后台预先构建的客户端 (首个查询不再等待集成库导入)；false 表示完全按需构建
+MODEL_CLIENTS_WARMUP = os.getenv("MODEL_CLIENTS_WARMUP", "true").lower() == "true"
+_WARMUP_CLIENTS = ("embeddings", "grader", "generator")
+
+_clients = {}
+_locks = {name: threading.Lock() for name in CLIENT_FACTORIES}
+_warmup_started = False
+_warmup_lock = threading.Lock()
+
+
+def get_client(name):
+    """返回名为 name 的模型客户端，首次调用时导入依赖并构建 (同一客户端只构建一次，不同客户端可并行构建)"""
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    if name not in CLIENT_FACTORIES:
+        raise KeyError(f"未注册的模型客户端: {name}")
+    with _locks[name]:
+        client = _clients.get(name)
+        if client is None:
+            module_name, factory_name = CLIENT_FACTORIES[name].split(":")
+            start = time.perf_counter()
+            client = getattr(importlib.import_module(module_name), factory_name)()
+            record("client.build", time.perf_counter() - start, client=name)
+            _clients[name] = client
+    return client
+
+
+def loaded_clients():
+    return sorted(_clients)
+
+
+def warm_up(names=_WARMUP_CLIENTS):
+    """在后台线程中预先构建客户端 (每个进程只执行一次)；构建失败不影响之后按需重试"""
+    global _warmup_started
+    with _warmup_lock:
+        if _warmup_started or not MODEL_CLIENTS_WARMUP:
+            return
+        _warmup_started = True
+
+    def run():
+        for name in names:
+            try:
+                get_client(name)
+            except Exception as e:
+                print(f"⚠️ 预先构建模型客户端失败 ({name}): {e}")
+
+    threading.Thread(target=run, name="model-clients-warmup", daemon=True).start()
@@ -1,9 +1,8 @@
 import os
 import json
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from telemetry import TelemetryCallback
+from model_clients import get_client
 
 # 保持代理白名单
 os.environ["NO_PROXY"] = "localhost,127.0.0.1"
@@ -34,6 +33,42 @@ def get_readme_content(project_name):
                 continue
     return None
 
+def build_profiler_chain():
+    """建议问题生成链 (由 model_clients 在首次生成建议时构建，届时才导入 langchain_openai)"""
+    from langchain_openai import ChatOpenAI
+    from http_clients import get_openai_http_client
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+
+    llm = ChatOpenAI(
+        model="moonshot-v1-8k",
+        temperature=0.5, # 稍微高一点，增加创造性
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_API_BASE"),
+        # 共享连接池，并发 / 限速 / 429 重试由 http_clients 负责
+        http_client=get_openai_http_client(),
+        max_retries=0,
+        callbacks=[TelemetryCallback("llm.profile")]
+    )
+
+    prompt = ChatPromptTemplate.from_template(
+        """你是一个资深的开源项目分析师。
+        请根据以下的项目 README 内容，为开发者提出 4 个最有价值的入门技术问题。
+
+        问题应该关注：安装配置、核心功能使用、架构逻辑或部署方式。
+        请直接输出问题列表，每行一个问题，不要带序号，不要带其他废话。
+
+        ---
+        README 摘要:
+        {context}
+        ---
+        建议问题列表:
+        """
+    )
+
+    chain = prompt | llm | StrOutputParser()
+    return chain
+
 def generate_suggestions(project_name):
     """
     核心功能：生成建议问题
@@ -63,29 +98,7 @@ def generate_suggestions(project_name):
 
     # 3. 调用 Cloud Brain (Kimi)
     try:
-        llm = ChatOpenAI(
-            model="moonshot-v1-8k",
-            temperature=0.5, # 稍微高一点，增加创造性
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_API_BASE")
-        )
-
-        prompt = ChatPromptTemplate.from_template(
-            """你是一个资深的开源项目分析师。
-            请根据以下的项目 README 内容，为开发者提出 4 个最有价值的入门技术问题。
-            
-            问题应该关注：安装配置、核心功能使用、架构逻辑或部署方式。
-            请直接输出问题列表，每行一个问题，不要带序号，不要带其他废话。
-            
-            ---
-            README 摘要:
-            {context}
-            ---
-            建议问题列表:
-            """
-        )
-
-        chain = prompt | llm | StrOutputParser()
+        chain = get_client("profiler")
         result = chain.invoke({"context": readme_content})
         
         # 处理结果：按行分割，过滤空行
@@ -0,0 +1,13 @@
+import os
+
+# 导入清单：位于项目向量库目录中，记录仓库地址、commit 与 文件 -> 切片 ID，供增量更新使用
+# 查询端只需要文件名与版本号，单独成模块，避免为此导入整个导入流程 (git、切分、扫描、向量库写入)
+MANIFEST_FILENAME = "ingest_manifest.json"
+
+
+def project_version(db_path):
+    """项目数据版本：导入清单的修改时间 (每次导入/增量更新都会重写清单；旧项目没有清单时为 None)"""
+    try:
+        return os.stat(os.path.join(db_path, MANIFEST_FILENAME)).st_mtime_ns
+    except OSError:
+        return None
@@ -0,0 +1,219 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flat_store import FLAT_DOCS_PREFIX
+from grader import GRADER_BATCH_SIZE
+from model_clients import get_client
+from project_manifest import project_version
+
+DB_ROOT = "chroma_db_store"
+# 进程内最多同时保留的已加载项目数 (所有 Streamlit 会话共享)
+PROJECT_CACHE_MAX_PROJECTS = int(os.getenv("PROJECT_CACHE_MAX_PROJECTS", "4"))
+# 已加载项目的估算内存上限 (MB)，按向量库目录的磁盘大小估算
+PROJECT_CACHE_MAX_MB = int(os.getenv("PROJECT_CACHE_MAX_MB", "2048"))
+
+
+def estimate_project_bytes(db_path):
+    """
+    用项目目录的磁盘大小估算加载后的内存占用 (HNSW 向量索引与 BM25 索引都会读入内存)
+    flat 后端的正文旁路文件只在命中时按偏移读取，不计入
+    """
+    total = 0
+    for dirpath, _, filenames in os.walk(db_path):
+        for name in filenames:
+            if name.startswith(FLAT_DOCS_PREFIX):
+                continue
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class LoadedProject:
+    """一个已加载的项目：检索器 + 编译好的 Graph (评分链由所有项目共用)"""
+
+    def __init__(self, name, db_path, retriever, graph, est_bytes, load_seconds):
+        self.name = name
+        self.db_path = db_path
+        self.retriever = retriever
+        self.graph = graph
+        self.est_bytes = est_bytes
+        self.load_seconds = load_seconds
+        # 加载时的 Chroma 底层连接 (flat 后端为向量库自身)，释放时用来判断目录是否已被重新导入
+        from local_worker import vector_store_system
+        self.system = vector_store_system(retriever.vectorstore)
+        self.active = 0        # 正在使用该项目的查询数
+        self.evicted = False   # 已移出缓存，等最后一个查询结束后再关闭
+        self.version = None    # 加载时的项目数据版本 (导入清单的修改时间)，由 ProjectRegistry 记录
+
+
+def get_shared_grader_chains():
+    """进程内共用的 (单文档评分链, 批量评分链)，由 model_clients 在首次加载项目时构建"""
+    batch_chain = get_client("batch_grader") if GRADER_BATCH_SIZE > 1 else None
+    return get_client("grader"), batch_chain
+
+
+def current_version(name):
+    """项目当前的数据版本；导入可能在其他进程 (后台任务、API 服务) 中完成，以磁盘上的清单为准"""
+    return project_version(os.path.join(DB_ROOT, name))
+
+
+def load_project(name):
+    """连接项目的向量库并编译 Graph (langgraph 与检索器依赖在首次加载项目时才导入)"""
+    from local_worker import get_retriever
+    from graph_brain import build_graph
+    db_path = os.path.join(DB_ROOT, name)
+    start = time.perf_counter()
+    retriever = get_retriever(db_path)
+    grader_chain, batch_chain = get_shared_grader_chains()
+    graph = build_graph(retriever, grader_chain=grader_chain, batch_chain=batch_chain)
+    elapsed = time.perf_counter() - start
+    project = LoadedProject(name, db_path, retriever, graph, estimate_project_bytes(db_path), elapsed)
+    print(f"📦 [Registry] 已加载项目 {name} (约 {project.est_bytes / 1024 / 1024:.1f} MB)，耗时 {elapsed:.2f}s")
+    return project
+
+
+class ProjectRegistry:
+    """
+    进程级的已加载项目缓存 (线程安全，所有会话共享)
+    - 按最近使用 (LRU) 淘汰，同时限制项目数与估算内存，至少保留最近使用的一个
+    - 同一项目并发加载时只加载一次，不同项目可以并行加载
+    - 被淘汰/失效的项目等正在进行的查询结束后才关闭向量库连接
+    - 每次取用时比较项目数据版本，其他进程重新导入了该项目时丢弃旧的检索器并重新加载
+      (清单不存在时视为导入进行中，继续使用已加载的版本)
+    """
+
+    def __init__(self, max_projects=PROJECT_CACHE_MAX_PROJECTS,
+                 max_bytes=PROJECT_CACHE_MAX_MB * 1024 * 1024, loader=load_project, version_of=current_version):
+        self.max_projects = max(1, max_projects)
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.version_of = version_of
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def _lookup(self, name, version, acquire, to_close):
+        """在锁内查找并刷新最近使用顺序，命中时返回条目；数据版本已变化的条目移出缓存 (需关闭的放入 to_close)"""
+        entry = self._entries.get(name)
+        if entry is not None and version is not None and entry.version != version:
+            del self._entries[name]
+            self.reloads += 1
+            print(f"🔄 [Registry] 项目 {name} 已被重新导入，重新加载")
+            if self._retire_locked(entry):
+                to_close.append(entry)
+            return None
+        if entry is not None:
+            self._entries.move_to_end(name)
+            self.hits += 1
+            if acquire:
+                entry.active += 1
+        return entry
+
+    def get(self, name, acquire=False):
+        """返回已加载的项目，未加载或数据版本已变化时加载并放入缓存"""
+        version = self.version_of(name)
+        to_close = []
+        with self._lock:
+            entry = self._lookup(name, version, acquire, to_close)
+            if entry is None:
+                load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        if entry is None:
+            with load_lock:
+                # 等锁期间可能已被其他会话加载完成
+                with self._lock:
+                    entry = self._lookup(name, version, acquire, to_close)
+                    if entry is None:
+                        self.misses += 1
+                if entry is None:
+                    entry = self.loader(name)
+                    # 记录加载前读到的版本：加载期间清单又有变化时，下次取用会再次重新加载
+                    entry.version = version
+                    with self._lock:
+                        if acquire:
+                            entry.active += 1
+                        self._entries[name] = entry
+                        to_close.extend(self._evict_locked())
+        for old in to_close:
+            self._close(old)
+        return entry
+
+    @contextmanager
+    def use(self, name):
+        """查询期间持有项目，期间即使被淘汰也不会关闭其向量库连接"""
+        entry = self.get(name, acquire=True)
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                entry.active -= 1
+                close_now = entry.evicted and entry.active == 0
+            if close_now:
+                self._close(entry)
+
+    def _retire_locked(self, entry):
+        """移出缓存后的条目：无人使用时返回 True (可以立即关闭)，否则延迟关闭"""
+        entry.evicted = True
+        return entry.active == 0
+
+    def _evict_locked(self):
+        to_close = []
+        total = sum(e.est_bytes for e in self._entries.values())
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_projects or total > self.max_bytes
+        ):
+            name, entry = self._entries.popitem(last=False)
+            total -= entry.est_bytes
+            self.evictions += 1
+            print(f"🧹 [Registry] 淘汰最久未使用的项目: {name}")
+            if self._retire_locked(entry):
+                to_close.append(entry)
+        return to_close
+
+    def invalidate(self, name):
+        """项目重新导入后调用：丢弃旧的检索器与 Graph，下次使用时重新加载"""
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            close_now = entry is not None and self._retire_locked(entry)
+        if close_now:
+            self._close(entry)
+        return entry is not None
+
+    def _close(self, entry):
+        from local_worker import close_vector_store
+        close_vector_store(entry.retriever.vectorstore, entry.system)
+
+    def metrics(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "projects": list(self._entries),
+                "est_mb": sum(e.est_bytes for e in self._entries.values()) / 1024 / 1024,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_project_registry():
+    """进程内共享的项目缓存实例"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProjectRegistry()
+        return _registry
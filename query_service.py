@@ -0,0 +1,128 @@
+import time
+
+from project_registry import get_project_registry
+from answer_cache import ANSWER_CACHE_ENABLED, get_answer_cache
+from context_packer import source_label
+from telemetry import span
+
+
+def describe_sources(documents):
+    """回答引用的片段 (可 JSON 序列化)"""
+    sources = []
+    for doc in documents:
+        item = {"source": source_label(doc)}
+        for key in ("project", "chunk_id", "start_line", "end_line", "score", "aliases"):
+            if key in doc.metadata:
+                item[key] = doc.metadata[key]
+        sources.append(item)
+    return sources
+
+
+def stream_query(project_name, question, registry=None, cancelled=None, trace_id=None):
+    """
+    执行一次查询，按顺序产出事件 dict (Streamlit 前端与 HTTP API 共用)：
+    - {"event": "cache_hit", "question", "similarity"}   命中语义答案缓存
+    - {"event": "retrieve", "documents"}                  检索完成
+    - {"event": "grade", "kept", "stats"}                 评分完成
+    - {"event": "token", "content"}                       生成节点输出的 Token
+    - {"event": "done", "answer", "sources", "cached", "stats", "trace_id"}
+    :param cancelled: 可选的 threading.Event，置位后停止生成 (客户端断开时使用)
+    :param trace_id: 可选的 trace ID (HTTP API 在响应头中返回)，为空时自动生成
+    """
+    # 本次查询的所有节点、模型调用、向量化都记录在同一个 trace 下
+    with span("query", trace_id=trace_id, echo=True, project=project_name) as trace:
+        yield from _run_query(project_name, question, registry, cancelled, trace)
+
+
+def _run_query(project_name, question, registry, cancelled, trace):
+    registry = registry or get_project_registry()
+    start = time.perf_counter()
+
+    # 先查语义答案缓存：相似的问题直接返回已有答案，跳过检索/评分/生成
+    answer_cache = get_answer_cache(project_name) if ANSWER_CACHE_ENABLED else None
+    cached = answer_cache.lookup(question) if answer_cache else None
+    if cached:
+        trace.set(cache_hit=1)
+        yield {"event": "cache_hit", "question": cached["question"], "similarity": cached["similarity"]}
+        yield {
+            "event": "done", "answer": cached["answer"], "sources": describe_sources(cached["documents"]),
+            "cached": True, "stats": {"total": time.perf_counter() - start}, "trace_id": trace.trace_id,
+        }
+        return
+
+    result = {}
+    # 查询期间持有项目，避免被其他会话触发的淘汰关闭
+    with registry.use(project_name) as project:
+        yield from _stream_graph(project.graph, question, cancelled, start, result)
+    if not result:
+        return
+
+    if answer_cache and result["answer"]:
+        answer_cache.store(question, result["answer"], result["documents"])
+    yield {
+        "event": "done", "answer": result["answer"], "sources": describe_sources(result["documents"]),
+        "cached": False, "stats": result["stats"], "trace_id": trace.trace_id,
+    }
+
+
+def stream_federated_query(question, projects=None, registry=None, cancelled=None, trace_id=None):
+    """
+    跨项目查询：问题并行发往 projects 中每个项目的检索器 (为空时为所有已导入的项目)，合并后照常评分与生成
+    产出的事件与 stream_query 相同，retrieve 事件额外带有各项目贡献的片段数 ("projects")；不使用答案缓存
+    """
+    from federated import get_federated_graph
+    with span("query", trace_id=trace_id, echo=True, project="*", federated=len(projects or ())) as trace:
+        start = time.perf_counter()
+        result = {}
+        graph = get_federated_graph(projects, registry or get_project_registry())
+        yield from _stream_graph(graph, question, cancelled, start, result)
+        if result:
+            yield {
+                "event": "done", "answer": result["answer"], "sources": describe_sources(result["documents"]),
+                "cached": False, "stats": result["stats"], "trace_id": trace.trace_id,
+            }
+
+
+def _stream_graph(graph, question, cancelled, start, result):
+    """
+    执行 Graph 并产出 retrieve / grade / token 事件，结束后把 answer、documents、stats 写入 result
+    (客户端断开时提前返回，result 保持为空)
+    """
+    answer, documents, stats = "", [], {}
+    first_token_at = None
+    # updates 推送各节点的结果，messages 推送模型输出的 Token
+    for mode, output in graph.stream({"question": question}, stream_mode=["updates", "messages"]):
+        if cancelled is not None and cancelled.is_set():
+            print("🛑 客户端已断开，停止生成")
+            return
+        if mode == "messages":
+            message, metadata = output
+            # 评分节点的本地模型输出 (JSON) 同样会出现在这里，只转发生成节点的 Token
+            if metadata.get("langgraph_node") == "generate" and message.content:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter() - start
+                yield {"event": "token", "content": message.content}
+            continue
+
+        for key, value in output.items():
+            if key == "retrieve":
+                event = {"event": "retrieve", "documents": len(value["documents"])}
+                by_project = {}
+                for doc in value["documents"]:
+                    if "project" in doc.metadata:
+                        by_project[doc.metadata["project"]] = by_project.get(doc.metadata["project"], 0) + 1
+                if by_project:
+                    event["projects"] = by_project
+                yield event
+            elif key == "grade_documents":
+                stats["grade"] = value.get("grade_stats") or {}
+                yield {"event": "grade", "kept": len(value["documents"]), "stats": stats["grade"]}
+            elif key == "generate":
+                answer = value["generation"]
+                documents = value["documents"]
+                stats["generation"] = value.get("generation_stats") or {}
+                stats["context"] = value.get("context_stats") or {}
+
+    stats["first_token"] = first_token_at
+    stats["total"] = time.perf_counter() - start
+    result.update(answer=answer, documents=documents, stats=stats)
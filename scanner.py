@@ -0,0 +1,260 @@
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+
+
+def _env_list(name, default):
+    value = os.getenv(name)
+    items = default if value is None else value.split(",")
+    return [item.strip() for item in items if item.strip()]
+
+
+# 配置：需要索引的文件后缀、一律跳过的目录、额外忽略规则 (gitignore 语法)
+SCAN_EXTENSIONS = tuple(_env_list(
+    "SCAN_EXTENSIONS", [".py", ".md", ".js", ".ts", ".java", ".go", ".txt", ".yaml"]
+))
+SCAN_IGNORE_DIRS = set(_env_list(
+    "SCAN_IGNORE_DIRS",
+    [".git", "node_modules", "__pycache__", ".venv", "venv", "dist", "build", "target",
+     ".tox", ".mypy_cache", ".pytest_cache", ".idea", ".vscode"]
+))
+SCAN_IGNORE_PATTERNS = _env_list("SCAN_IGNORE_PATTERNS", [])
+# 超过该大小的文件 (通常是生成文件、数据文件) 不做索引
+SCAN_MAX_FILE_BYTES = int(os.getenv("SCAN_MAX_FILE_BYTES", str(1024 * 1024)))
+# 并行读取文件的线程数
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "8"))
+
+# 用文件开头这么多字节判断是否为二进制 (包含 NUL 即视为二进制)
+_SNIFF_BYTES = 8192
+
+
+def _glob_to_regex(pattern):
+    """把 gitignore 的 glob 模式转换为正则 (支持 * ? ** 与 [...])"""
+    i, out = 0, []
+    while i < len(pattern):
+        ch = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if ch == "*":
+            out.append("[^/]*")
+        elif ch == "?":
+            out.append("[^/]")
+        elif ch == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(ch))
+            else:
+                out.append("[" + pattern[i + 1:end].replace("!", "^", 1) + "]")
+                i = end
+        else:
+            out.append(re.escape(ch))
+        i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """
+    .gitignore 规则 (常用子集)：注释、! 取反、结尾 / 仅匹配目录、开头 / 或中间含 / 时相对所在目录锚定
+    后出现的规则优先，与 git 行为一致
+    """
+
+    def __init__(self, patterns=()):
+        self.rules = []  # (所在目录, 正则, 是否取反, 是否仅匹配目录)
+        for pattern in patterns:
+            self.add(pattern, "")
+
+    def add(self, line, base):
+        line = line.rstrip("\n").rstrip()
+        if not line or line.startswith("#"):
+            return
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        if dir_only:
+            line = line[:-1]
+        anchored = "/" in line
+        line = line.lstrip("/")
+        regex = _glob_to_regex(line)
+        if not anchored:
+            regex = "(?:.*/)?" + regex
+        self.rules.append((base, re.compile(regex + "$"), negate, dir_only))
+
+    def load_gitignore(self, path, base):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    self.add(line, base)
+        except OSError:
+            pass
+
+    def is_ignored(self, rel_path, is_dir=False):
+        ignored = False
+        for base, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + "/"):
+                    continue
+                target = rel_path[len(base) + 1:]
+            else:
+                target = rel_path
+            if regex.match(target):
+                ignored = not negate
+        return ignored
+
+
+class PathFilter:
+    """
+    判断仓库中的相对路径是否需要索引：后缀、一律跳过的目录、额外规则与各级目录的 .gitignore
+    全量遍历 (walk_files) 与增量更新 (只检查 git diff 中的路径) 共用同一套判断，两者得到的文件集合一致
+    """
+
+    def __init__(self, root, extensions=SCAN_EXTENSIONS, ignore_dirs=SCAN_IGNORE_DIRS,
+                 extra_patterns=SCAN_IGNORE_PATTERNS):
+        self.root = root
+        self.extensions = tuple(extensions)
+        self.ignore_dirs = set(ignore_dirs)
+        self.rules = IgnoreRules(extra_patterns)
+        self._loaded = set()
+
+    def enter_dir(self, rel_dir):
+        """加载目录下的 .gitignore (每个目录只加载一次；先于子目录加载，子目录的规则优先)"""
+        if rel_dir not in self._loaded:
+            self._loaded.add(rel_dir)
+            self.rules.load_gitignore(os.path.join(self.root, rel_dir, ".gitignore"), rel_dir)
+
+    def skip_dir(self, rel_dir):
+        return rel_dir.rsplit("/", 1)[-1] in self.ignore_dirs or self.rules.is_ignored(rel_dir, is_dir=True)
+
+    def skip_file(self, rel_path):
+        return not rel_path.endswith(self.extensions) or self.rules.is_ignored(rel_path)
+
+    def is_indexable(self, rel_path):
+        """
+        单个路径是否需要索引 (增量更新时使用)：逐级检查上级目录并加载沿途的 .gitignore，
+        与 walk_files 剪掉被忽略的目录的行为一致
+        """
+        self.enter_dir("")
+        rel_dir = ""
+        for name in rel_path.split("/")[:-1]:
+            rel_dir = f"{rel_dir}/{name}" if rel_dir else name
+            if self.skip_dir(rel_dir):
+                return False
+            self.enter_dir(rel_dir)
+        return not self.skip_file(rel_path)
+
+
+def walk_files(root, extensions=SCAN_EXTENSIONS, ignore_dirs=SCAN_IGNORE_DIRS,
+               extra_patterns=SCAN_IGNORE_PATTERNS, max_file_bytes=SCAN_MAX_FILE_BYTES, stats=None):
+    """
+    单次遍历目录树，产出需要索引的文件绝对路径
+    遍历过程中直接剪掉忽略的目录 (.git、node_modules 等及 .gitignore 命中的目录)，不会进入其中
+    """
+    stats = stats if stats is not None else {}
+    path_filter = PathFilter(root, extensions, ignore_dirs, extra_patterns)
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir
+        path_filter.enter_dir(rel_dir)
+
+        kept = []
+        for name in dirnames:
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            if path_filter.skip_dir(rel):
+                stats["ignored_dirs"] = stats.get("ignored_dirs", 0) + 1
+            else:
+                kept.append(name)
+        dirnames[:] = kept
+
+        for name in filenames:
+            stats["seen"] = stats.get("seen", 0) + 1
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            if not name.endswith(path_filter.extensions):
+                continue
+            if path_filter.skip_file(rel):
+                stats["ignored"] = stats.get("ignored", 0) + 1
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                if os.path.getsize(path) > max_file_bytes:
+                    stats["too_large"] = stats.get("too_large", 0) + 1
+                    continue
+            except OSError:
+                continue
+            yield path
+
+
+def read_document(path, max_file_bytes=SCAN_MAX_FILE_BYTES):
+    """
+    读取单个文本文件为 Document；二进制 (含 NUL)、超大或无法读取的文件返回 None
+    编码依次尝试 UTF-8 (含 BOM)、GB18030，最后替换无法解码的字符
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read(max_file_bytes + 1)
+    except OSError as e:
+        print(f"⚠️ 读取失败 {path}: {e}")
+        return None
+    if len(data) > max_file_bytes or b"\0" in data[:_SNIFF_BYTES]:
+        return None
+    for encoding in ("utf-8-sig", "gb18030"):
+        try:
+            text = data.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        text = data.decode("utf-8", errors="replace")
+    return Document(page_content=text, metadata={"source": path})
+
+
+def scan_documents(root, workers=SCAN_WORKERS, **walk_kwargs):
+    """
+    单次遍历 + 多线程并行读取，按遍历顺序逐个产出 Document
+    预读窗口为 workers * 4 个文件，读取速度快于下游处理时不会无限占用内存
+    """
+    stats = {}
+    paths = walk_files(root, stats=stats, **walk_kwargs)
+    max_bytes = walk_kwargs.get("max_file_bytes", SCAN_MAX_FILE_BYTES)
+    loaded = skipped = 0
+    busy = 0.0  # 扫描自身耗时 (不含下游处理产出文档的时间)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        window = deque()
+        paths_done = False
+        while True:
+            t0 = time.perf_counter()
+            while not paths_done and len(window) < workers * 4:
+                path = next(paths, None)
+                if path is None:
+                    paths_done = True
+                else:
+                    window.append(pool.submit(read_document, path, max_bytes))
+            if not window:
+                busy += time.perf_counter() - t0
+                break
+            doc = window.popleft().result()
+            busy += time.perf_counter() - t0
+            if doc is None:
+                skipped += 1
+            else:
+                loaded += 1
+                yield doc
+
+    print(
+        f"📂 扫描完成: 遍历 {stats.get('seen', 0)} 个文件，读取 {loaded} 个，"
+        f"跳过 忽略规则 {stats.get('ignored', 0)} / 目录 {stats.get('ignored_dirs', 0)} / "
+        f"超大 {stats.get('too_large', 0)} / 二进制或不可读 {skipped}，"
+        f"扫描耗时 {busy:.2f}s"
+    )
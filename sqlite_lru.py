@@ -0,0 +1,149 @@
+import os
+import time
+import sqlite3
+import threading
+
+# SQLite 单条语句的参数个数有限，批量查询 / 删除按此分段
+_BATCH = 500
+
+
+class SQLiteLRUCache:
+    """
+    基于 SQLite 的 LRU 缓存表 (线程安全，WAL 模式支持多进程共享)，向量缓存与评分缓存共用
+    子类声明表名与列：scope_columns 为每次调用固定的键 (模型名等)，hash_column 为按批查询的内容哈希，
+    value_columns 为缓存的值；表结构 (schema) 需包含这些列与 last_used，主键为 scope_columns + hash_column
+
+    条目数按写入累加估算，只有估算值超过上限或累计写入达到上限的 10% 时才执行一次 COUNT(*)
+    (其他进程同时写入时估算值偏低，定期重新计数保证超出的部分有界)，写入不必每次扫描全表
+    """
+
+    table = None
+    scope_columns = ()
+    hash_column = None
+    value_columns = ()
+    schema = ()
+    label = ""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.schema:
+            self._conn.execute(statement)
+        self._conn.commit()
+        self._estimated = self._count()
+        self._since_count = 0
+        self._recount_every = max(1, max_entries // 10)
+
+    def _count(self):
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _scope_sql(self):
+        return " AND ".join(f"{column} = ?" for column in (*self.scope_columns, self.hash_column))
+
+    def _get(self, scope, hashes):
+        """批量查询，返回 {哈希: 值元组}，命中的条目会刷新最近使用时间"""
+        unique = list(dict.fromkeys(hashes))
+        values = ", ".join((self.hash_column, *self.value_columns))
+        prefix = "".join(f"{column} = ? AND " for column in self.scope_columns)
+        found = {}
+        with self._lock:
+            for i in range(0, len(unique), _BATCH):
+                part = unique[i:i + _BATCH]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT {values} FROM {self.table} WHERE {prefix}{self.hash_column} IN ({placeholders})",
+                    [*scope, *part],
+                ).fetchall()
+                for row in rows:
+                    found[row[0]] = row[1:]
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET last_used = ? WHERE {self._scope_sql()}",
+                    [(now, *scope, h) for h in found],
+                )
+                self._conn.commit()
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def _put(self, scope, items):
+        """批量写入 {哈希: 值元组}，写入后按需淘汰"""
+        if not items:
+            return
+        now = time.time()
+        columns = (*self.scope_columns, self.hash_column, *self.value_columns, "last_used")
+        rows = [(*scope, h, *values, now) for h, values in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                rows,
+            )
+            self._conn.commit()
+            # 覆盖写入也计入估算 (只会偏高，最多提前一次计数)
+            self._estimated += len(rows)
+            self._since_count += len(rows)
+            if self._estimated > self.max_entries or self._since_count >= self._recount_every:
+                self._evict()
+
+    def _evict(self):
+        """重新计数，超过上限时淘汰最久未使用的条目 (多淘汰 10%，避免每次写入都触发)"""
+        count = self._count()
+        self._since_count = 0
+        if count > self.max_entries:
+            excess = count - int(self.max_entries * 0.9)
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN "
+                f"(SELECT rowid FROM {self.table} ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+            self._conn.commit()
+            self.evictions += excess
+            count -= excess
+            print(f"🧹 [{self.label}] 淘汰 {excess} 条最久未使用的条目")
+        self._estimated = count
+
+    def drop_hashes(self, hashes):
+        """删除指定内容哈希的全部条目 (重新导入后内容已变化/已删除的切片)，返回删除的条数"""
+        hashes = list(set(hashes))
+        removed = 0
+        with self._lock:
+            for i in range(0, len(hashes), _BATCH):
+                part = hashes[i:i + _BATCH]
+                placeholders = ",".join("?" * len(part))
+                cursor = self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE {self.hash_column} IN ({placeholders})", part
+                )
+                removed += cursor.rowcount
+            self._conn.commit()
+            self._estimated = max(0, self._estimated - removed)
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+            self._estimated = self._since_count = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._count()
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,315 @@
+import os
+import re
+import ast
+import json
+import time
+
+# 符号索引文件，与 Chroma 数据、BM25 索引存放在同一个项目目录下
+SYMBOL_INDEX_FILENAME = "symbol_index.json"
+# 单次查询最多注入的精确定义切片数
+SYMBOL_MAX_CHUNKS = int(os.getenv("SYMBOL_MAX_CHUNKS", "4"))
+# 同名定义超过该数量 (如 main、__init__) 视为有歧义，不注入
+SYMBOL_MAX_DEFINITIONS = int(os.getenv("SYMBOL_MAX_DEFINITIONS", "3"))
+
+# 定义优先于读取配置的位置
+_KIND_PRIORITY = {"class": 0, "function": 0, "method": 0, "constant": 1, "type": 1, "variable": 2, "config": 3}
+
+# 读取环境变量 / 配置项：os.getenv("X")、os.environ["X"]、process.env.X、os.Getenv("X")、System.getenv("X")
+_CONFIG_RE = re.compile(
+    r"""(?:getenv|Getenv|environ\.get|environ\[|getProperty)\(?\s*["']([A-Za-z_][A-Za-z0-9_.]*)["']"""
+    r"""|process\.env\.([A-Za-z_][A-Za-z0-9_]*)"""
+)
+# 其他语言的轻量级定义匹配 (按行)：(正则, 类型)
+_JS_PATTERNS = [
+    (re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)"), "function"),
+    (re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+([A-Za-z_$][\w$]*)"), "class"),
+    (re.compile(r"^\s*(?:export\s+)?(?:interface|type|enum)\s+([A-Za-z_$][\w$]*)"), "type"),
+    (re.compile(r"^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:\([^)]*\)|[\w$]+)\s*=>"),
+     "function"),
+    (re.compile(r"^\s*(?:export\s+)?const\s+([A-Z][A-Z0-9_]*)\s*="), "constant"),
+]
+_GO_PATTERNS = [
+    (re.compile(r"^func\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)"), "function"),
+    (re.compile(r"^type\s+([A-Za-z_]\w*)\s+(?:struct|interface)"), "class"),
+    (re.compile(r"^type\s+([A-Za-z_]\w*)"), "type"),
+    (re.compile(r"^(?:const|var)\s+([A-Za-z_]\w*)"), "constant"),
+    (re.compile(r"^\s+([A-Z]\w*)\s*(?:[\w.*\[\]]+\s*)?=\s*"), "constant"),
+]
+_JAVA_PATTERNS = [
+    (re.compile(r"^\s*(?:[\w@]+\s+)*(?:class|interface|enum|record)\s+([A-Za-z_]\w*)"), "class"),
+    (re.compile(r"^\s*(?:public|private|protected)?\s*(?:static\s+)?final\s+[\w<>\[\], ]+\s+([A-Z][A-Z0-9_]*)\s*="),
+     "constant"),
+    (re.compile(r"^\s*(?:(?:public|private|protected|static|final|abstract|synchronized|native)\s+)+"
+                r"(?:<[^>]+>\s+)?[\w<>\[\], .]+\s+([a-zA-Z_]\w*)\s*\("), "method"),
+]
+_YAML_KEY = re.compile(r"^([A-Za-z_][\w.-]*)\s*:")
+_PATTERNS_BY_EXTENSION = {
+    ".js": _JS_PATTERNS, ".ts": _JS_PATTERNS, ".go": _GO_PATTERNS, ".java": _JAVA_PATTERNS,
+}
+
+# 问题中的候选标识符：反引号内的内容，或形如 snake_case / camelCase / 常量名 / a.b 的词
+_BACKTICK_RE = re.compile(r"`([^`\s]+)`")
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*")
+
+
+def _python_symbols(text):
+    """Python 按 AST 提取：(名称, 类型, 起始行, 结束行)"""
+    tree = ast.parse(text)
+    symbols = []
+
+    def start_of(node):
+        return min([d.lineno for d in getattr(node, "decorator_list", [])] + [node.lineno])
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append((node.name, "function", start_of(node), node.end_lineno))
+        elif isinstance(node, ast.ClassDef):
+            symbols.append((node.name, "class", start_of(node), node.end_lineno))
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    symbols.append((f"{node.name}.{item.name}", "method", start_of(item), item.end_lineno))
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                for name in ast.walk(target):
+                    if isinstance(name, ast.Name):
+                        kind = "constant" if name.id.isupper() else "variable"
+                        symbols.append((name.id, kind, node.lineno, node.end_lineno))
+    return symbols
+
+
+def _pattern_symbols(text, extension):
+    """其他语言按行用正则匹配定义 (不解析语法，只取定义所在的一行)"""
+    patterns = _PATTERNS_BY_EXTENSION.get(extension)
+    symbols = []
+    for lineno, line in enumerate(text.splitlines(), start=1):
+        if patterns:
+            for pattern, kind in patterns:
+                match = pattern.match(line)
+                if match:
+                    symbols.append((match.group(1), kind, lineno, lineno))
+                    break
+        elif extension in (".yaml", ".yml"):
+            match = _YAML_KEY.match(line)  # 只取顶层配置键
+            if match:
+                symbols.append((match.group(1), "config", lineno, lineno))
+    return symbols
+
+
+def _config_reads(text):
+    """任意语言中读取环境变量的位置"""
+    symbols = []
+    for lineno, line in enumerate(text.splitlines(), start=1):
+        for match in _CONFIG_RE.finditer(line):
+            symbols.append((match.group(1) or match.group(2), "config", lineno, lineno))
+    return symbols
+
+
+def extract_symbols(text, rel_path):
+    """提取单个文件的符号：[(名称, 类型, 起始行, 结束行)]；Markdown / 纯文本不提取定义"""
+    extension = os.path.splitext(rel_path)[1].lower()
+    symbols = []
+    if extension == ".py":
+        try:
+            symbols = _python_symbols(text)
+        except (SyntaxError, ValueError, RecursionError):
+            symbols = _pattern_symbols(text, extension)
+    elif extension not in (".md", ".txt", ".rst"):
+        symbols = _pattern_symbols(text, extension)
+    if extension not in (".md", ".txt", ".rst"):
+        symbols.extend(_config_reads(text))
+    return symbols
+
+
+def _chunk_lines(text, chunks):
+    """每个切片在文件中的行范围 [(起始行, 结束行, chunk_id)]"""
+    ranges = []
+    search_from = 0
+    for chunk in chunks:
+        metadata = chunk.metadata
+        if "start_line" in metadata and "end_line" in metadata:
+            start, end = int(metadata["start_line"]), int(metadata["end_line"])
+        else:
+            # 文本切分器只记录字符偏移；旧版切分没有位置信息，按顺序在原文中查找
+            offset = metadata.get("start_index")
+            if offset is None:
+                offset = text.find(chunk.page_content, search_from)
+                if offset < 0:
+                    continue
+                search_from = offset + 1
+            start = text.count("\n", 0, int(offset)) + 1
+            end = start + chunk.page_content.rstrip("\n").count("\n")
+        ranges.append((start, end, metadata["chunk_id"]))
+    return ranges
+
+
+def locate_symbols(text, rel_path, chunks):
+    """
+    提取符号并定位到切片：同一定义被多个切片覆盖 (重叠切分) 时，取覆盖定义范围最多的切片
+    :return: [[名称, 类型, 起始行, 结束行, chunk_id]]
+    """
+    ranges = _chunk_lines(text, chunks)
+    entries, seen = [], set()
+    for name, kind, start, end in extract_symbols(text, rel_path):
+        best, best_cover = None, 0
+        for c_start, c_end, chunk_id in ranges:
+            if c_start <= start <= c_end:
+                cover = min(end, c_end) - start + 1
+                if cover > best_cover:
+                    best, best_cover = chunk_id, cover
+        if best is None or (name, kind, start) in seen:
+            continue
+        seen.add((name, kind, start))
+        entries.append([name, kind, start, end, best])
+    return entries
+
+
+def query_identifiers(question):
+    """问题中像代码标识符的词 (避免 name、deploy 这类普通单词误命中)"""
+    candidates = _BACKTICK_RE.findall(question)
+    for word in _WORD_RE.findall(question):
+        if "_" in word or "." in word or re.search(r"[a-z][A-Z]", word) or (word.isupper() and len(word) > 2):
+            candidates.append(word)
+    names = []
+    for candidate in candidates:
+        candidate = candidate.strip("().,:;?!\"'")  # build_graph() -> build_graph
+        if candidate and candidate not in names:
+            names.append(candidate)
+    return names
+
+
+class SymbolIndex:
+    """
+    项目级符号表：函数、类、方法、常量、配置键 -> 文件 / 行号 / 所在切片 (JSON 持久化)
+    按文件组织，增量更新时整体替换变更文件的符号
+    """
+
+    def __init__(self):
+        self.files = {}      # 相对路径 -> [[名称, 类型, 起始行, 结束行, chunk_id]]
+        self._by_name = None
+        self.build_seconds = 0.0
+
+    @property
+    def size(self):
+        return sum(len(entries) for entries in self.files.values())
+
+    def add_file(self, rel_path, text, chunks):
+        start = time.perf_counter()
+        entries = locate_symbols(text, rel_path, chunks)
+        if entries:
+            self.files[rel_path] = entries
+        else:
+            self.files.pop(rel_path, None)
+        self._by_name = None
+        self.build_seconds += time.perf_counter() - start
+
+    def remove_file(self, rel_path):
+        if self.files.pop(rel_path, None) is not None:
+            self._by_name = None
+
+    def remap_chunks(self, mapping):
+        """把指向 mapping 中切片的定义改为指向对应的切片 (导入去重后，重复切片的定义指向规范切片)"""
+        if not mapping:
+            return
+        for entries in self.files.values():
+            for entry in entries:
+                entry[4] = mapping.get(entry[4], entry[4])
+        self._by_name = None
+
+    def _name_table(self):
+        """名称 -> 定义列表；方法同时按 类名.方法名 与 方法名 登记"""
+        if self._by_name is None:
+            table = {}
+            for rel_path, entries in self.files.items():
+                for name, kind, start, end, chunk_id in entries:
+                    item = {"name": name, "kind": kind, "path": rel_path,
+                            "start_line": start, "end_line": end, "chunk_id": chunk_id}
+                    table.setdefault(name, []).append(item)
+                    if "." in name:
+                        table.setdefault(name.rsplit(".", 1)[1], []).append(item)
+            self._by_name = table
+        return self._by_name
+
+    def lookup(self, question, max_chunks=SYMBOL_MAX_CHUNKS, max_definitions=SYMBOL_MAX_DEFINITIONS):
+        """
+        精确查找问题中提到的标识符
+        :return: [定义 dict]，按 定义 > 常量 > 读取配置 排序，所在切片不重复，最多 max_chunks 个
+        """
+        table = self._name_table()
+        matches = []
+        for name in query_identifiers(question):
+            items = table.get(name)
+            if not items and "." in name:
+                items = table.get(name.rsplit(".", 1)[1])
+            if not items:
+                continue
+            definitions = [i for i in items if i["kind"] != "config"]
+            if len(definitions) > max_definitions:
+                continue
+            matches.extend(sorted(items, key=lambda i: _KIND_PRIORITY.get(i["kind"], 9)))
+        results, chunk_ids = [], set()
+        for item in matches:
+            if item["chunk_id"] in chunk_ids:
+                continue
+            chunk_ids.add(item["chunk_id"])
+            results.append(item)
+            if len(results) >= max_chunks:
+                break
+        return results
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "build_seconds": self.build_seconds},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls()
+        index.files = data["files"]
+        index.build_seconds = data.get("build_seconds", 0.0)
+        return index
+
+
+def save_symbols(index, db_path):
+    """在 ingest 阶段把符号索引写入 db_path，构建耗时记录在 index.build_seconds"""
+    index.save(os.path.join(db_path, SYMBOL_INDEX_FILENAME))
+    print(f"🔖 符号索引已构建: {index.size} 个符号 ({len(index.files)} 个文件), 构建耗时 {index.build_seconds:.2f}s")
+    return index
+
+
+def update_symbols(db_path, removed_files, added_files, remap=None):
+    """
+    增量更新：替换变更文件的符号
+    :param added_files: [(相对路径, 文件内容, 该文件的全部切片)]
+    :param remap: 可选，切片 ID -> 实际写入向量库的切片 ID (去重后的规范切片)
+    """
+    index = load_symbols(db_path)
+    if index is None:
+        # 旧项目没有符号索引，只更新变更文件会得到不完整的索引；全量重新导入后生成
+        print("⚠️ 项目没有符号索引，跳过 (强制重新导入后生成)")
+        return None
+    index.build_seconds = 0.0
+    for rel_path in removed_files:
+        index.remove_file(rel_path)
+    for rel_path, text, chunks in added_files:
+        index.add_file(rel_path, text, chunks)
+    index.remap_chunks(remap)
+    index.save(os.path.join(db_path, SYMBOL_INDEX_FILENAME))
+    print(f"🔖 符号索引已增量更新: {len(removed_files)} 个文件移除 / {len(added_files)} 个文件重建, "
+          f"耗时 {index.build_seconds:.2f}s")
+    return index
+
+
+def load_symbols(db_path):
+    """读取项目的符号索引，不存在时返回 None (旧项目不做精确查找)"""
+    path = os.path.join(db_path, SYMBOL_INDEX_FILENAME)
+    if not os.path.exists(path):
+        return None
+    start = time.perf_counter()
+    index = SymbolIndex.load(path)
+    print(f"🔖 已加载符号索引: {index.size} 个符号, 耗时 {time.perf_counter() - start:.2f}s")
+    return index
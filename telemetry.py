@@ -0,0 +1,321 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+# 追踪开关：关闭后 span() / record() 不做任何记录
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() == "true"
+# 在控制台输出节点 / 导入阶段的耗时 (LLM、向量化等细粒度调用只写入日志与指标)
+TELEMETRY_CONSOLE = os.getenv("TELEMETRY_CONSOLE", "true").lower() == "true"
+# 结构化 JSON 日志 (每个 span 一行)，留空表示不写；超过 TELEMETRY_LOG_MAX_MB 后轮转为 .1
+TELEMETRY_LOG_PATH = os.getenv("TELEMETRY_LOG_PATH", os.path.join("telemetry", "spans.jsonl"))
+TELEMETRY_LOG_MAX_MB = float(os.getenv("TELEMETRY_LOG_MAX_MB", "50"))
+# Prometheus 文本格式导出文件 (供 node_exporter textfile collector 采集)，留空表示不导出
+# HTTP API 另外提供 /metrics/prometheus 接口
+TELEMETRY_PROM_PATH = os.getenv("TELEMETRY_PROM_PATH", "")
+TELEMETRY_PROM_INTERVAL = float(os.getenv("TELEMETRY_PROM_INTERVAL", "15"))
+
+METRIC_PREFIX = "navigator"
+# 耗时直方图的分桶 (秒)，覆盖从单次向量查询到整仓导入
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_span = contextvars.ContextVar("telemetry_span", default=None)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    """一次被追踪的操作：耗时、属性 (文档数、Token 数等)、错误，以及所属的 trace"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent", "attrs", "echo", "start", "duration",
+                 "children_seconds", "error")
+
+    def __init__(self, name, trace_id, parent, attrs, echo=False):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent = parent
+        self.attrs = attrs
+        self.echo = echo
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.children_seconds = 0.0
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @property
+    def self_seconds(self):
+        """扣除子 span 之后的耗时 (如 写入批次 扣除其中的向量化)"""
+        return max(0.0, self.duration - self.children_seconds)
+
+
+class _NoopSpan:
+    trace_id = None
+    duration = children_seconds = self_seconds = 0.0
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Metrics:
+    """进程内指标：每种 span 的耗时直方图、错误数，以及数值属性的累计值"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # span 名 -> [各桶计数, 总耗时, 次数]
+        self._errors = {}
+        self._totals = {}      # (span 名, 属性名) -> 累计值
+
+    def observe(self, span):
+        with self._lock:
+            hist = self._histograms.setdefault(span.name, [[0] * len(_BUCKETS), 0.0, 0])
+            for i, bound in enumerate(_BUCKETS):
+                if span.duration <= bound:
+                    hist[0][i] += 1
+            hist[1] += span.duration
+            hist[2] += 1
+            if span.error:
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            # 计数类属性累加 (延迟类的 *_ms 属性累加没有意义，只保留在日志中)
+            for key, value in span.attrs.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and not key.endswith("_ms"):
+                    self._totals[(span.name, key)] = self._totals.get((span.name, key), 0) + value
+
+    def render(self):
+        """Prometheus 文本格式"""
+        with self._lock:
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self._histograms.items()}
+            errors = dict(self._errors)
+            totals = dict(self._totals)
+
+        lines = [
+            f"# HELP {METRIC_PREFIX}_span_seconds Duration of traced operations",
+            f"# TYPE {METRIC_PREFIX}_span_seconds histogram",
+        ]
+        for name, (buckets, total, count) in sorted(histograms.items()):
+            for bound, n in zip(_BUCKETS, buckets):
+                lines.append(f'{METRIC_PREFIX}_span_seconds_bucket{{span="{name}",le="{bound}"}} {n}')
+            lines.append(f'{METRIC_PREFIX}_span_seconds_bucket{{span="{name}",le="+Inf"}} {count}')
+            lines.append(f'{METRIC_PREFIX}_span_seconds_sum{{span="{name}"}} {total:.6f}')
+            lines.append(f'{METRIC_PREFIX}_span_seconds_count{{span="{name}"}} {count}')
+
+        lines += [
+            f"# HELP {METRIC_PREFIX}_span_errors_total Traced operations that raised",
+            f"# TYPE {METRIC_PREFIX}_span_errors_total counter",
+        ]
+        for name, n in sorted(errors.items()):
+            lines.append(f'{METRIC_PREFIX}_span_errors_total{{span="{name}"}} {n}')
+
+        # 数值属性 (docs_in、input_tokens、texts ...) 各自导出为一个计数器
+        by_key = {}
+        for (name, key), value in totals.items():
+            by_key.setdefault(key, []).append((name, value))
+        for key, values in sorted(by_key.items()):
+            metric = f"{METRIC_PREFIX}_{key}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for name, value in sorted(values):
+                lines.append(f'{metric}{{span="{name}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """每种 span 的次数、平均耗时与错误数 (用于界面展示)"""
+        with self._lock:
+            return {
+                name: {"count": count, "avg_ms": total / count * 1000 if count else 0.0,
+                       "errors": self._errors.get(name, 0)}
+                for name, (_, total, count) in self._histograms.items()
+            }
+
+
+metrics = Metrics()
+
+
+class _JsonLog:
+    """追加写入 JSON Lines，按大小轮转 (多线程安全)"""
+
+    def __init__(self, path, max_mb):
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            try:
+                if self._file is None:
+                    if os.path.dirname(self.path):
+                        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+                self._file.write(line)
+                if self.max_bytes and self._file.tell() > self.max_bytes:
+                    self._file.close()
+                    os.replace(self.path, self.path + ".1")
+                    self._file = None
+            except OSError as e:
+                print(f"⚠️ [Telemetry] 写入日志失败: {e}")
+                self._file = None
+
+
+_log = _JsonLog(TELEMETRY_LOG_PATH, TELEMETRY_LOG_MAX_MB) if TELEMETRY_LOG_PATH else None
+_last_prom_export = 0.0
+_prom_lock = threading.Lock()
+
+
+def export_prometheus(path=None):
+    """把当前指标写入 Prometheus 文本文件 (原子替换)"""
+    path = path or TELEMETRY_PROM_PATH
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(metrics.render())
+    os.replace(tmp_path, path)
+
+
+def _maybe_export():
+    global _last_prom_export
+    if not TELEMETRY_PROM_PATH:
+        return
+    with _prom_lock:
+        if time.monotonic() - _last_prom_export < TELEMETRY_PROM_INTERVAL:
+            return
+        _last_prom_export = time.monotonic()
+    try:
+        export_prometheus()
+    except OSError as e:
+        print(f"⚠️ [Telemetry] 导出 Prometheus 指标失败: {e}")
+
+
+def _finish(span):
+    if span.parent is not None:
+        span.parent.children_seconds += span.duration
+    metrics.observe(span)
+    if _log is not None:
+        _log.write({
+            "ts": time.time(), "trace_id": span.trace_id, "span_id": span.span_id,
+            "parent_id": span.parent.span_id if span.parent is not None else None,
+            "name": span.name, "duration_ms": round(span.duration * 1000, 3),
+            "status": "error" if span.error else "ok", "error": span.error, **span.attrs,
+        })
+    if span.echo and TELEMETRY_CONSOLE:
+        details = " ".join(
+            f"{k}={v}" for k, v in span.attrs.items()
+            if isinstance(v, (int, float)) and not isinstance(v, bool)
+        )
+        status = f" ❌ {span.error}" if span.error else ""
+        print(f"⏱️ [{span.trace_id[:8]}] {span.name} {span.duration * 1000:.0f}ms {details}{status}".rstrip())
+    if span.parent is None:
+        _maybe_export()
+
+
+@contextmanager
+def span(name, trace_id=None, echo=False, **attrs):
+    """
+    追踪一段操作 (可嵌套)，子 span 自动继承当前的 trace ID
+    :param trace_id: 指定 trace ID (如 HTTP 请求传入)；为空时沿用当前 trace，没有则新建
+    :param echo: 结束时在控制台输出耗时
+    用法：
+        with span("retrieve", echo=True) as s:
+            docs = retriever.invoke(question)
+            s.set(docs_out=len(docs))
+    """
+    if not TELEMETRY_ENABLED:
+        yield _NOOP
+        return
+    parent = _current_span.get()
+    if trace_id is None:
+        trace_id = parent.trace_id if parent is not None else new_trace_id()
+    current = Span(name, trace_id, parent, attrs, echo)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        # 生成器被提前关闭 (GeneratorExit) 不算错误
+        if not isinstance(e, GeneratorExit):
+            current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # 在其他上下文中结束 (如被垃圾回收的生成器)，无法还原，直接清空
+            _current_span.set(None)
+        _finish(current)
+
+
+def record(name, seconds, error=None, echo=False, **attrs):
+    """记录一个已经结束的操作 (如 LLM 回调、导入阶段的累计耗时)，挂在当前 span 之下"""
+    if not TELEMETRY_ENABLED:
+        return
+    parent = _current_span.get()
+    done = Span(name, parent.trace_id if parent is not None else new_trace_id(), parent, attrs, echo)
+    done.duration = seconds
+    done.error = error
+    _finish(done)
+
+
+def add(**counts):
+    """在当前 span 上累加计数属性 (如评分失败的文档数)，随 span 写入日志与指标；没有当前 span 时忽略"""
+    current = _current_span.get()
+    if current is None:
+        return
+    for key, value in counts.items():
+        current.attrs[key] = current.attrs.get(key, 0) + value
+
+
+def current_trace_id():
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
+
+
+class TelemetryCallback(BaseCallbackHandler):
+    """
+    LangChain 回调：记录每次模型调用的耗时、输入/输出 Token 数与错误
+    优先使用模型返回的 usage，没有时按字符数估算
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._starts = {}
+
+    def _start(self, run_id, text):
+        from grader import estimate_tokens
+        self._starts[run_id] = (time.perf_counter(), estimate_tokens(text))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "".join(str(m.content) for batch in messages for m in batch))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "".join(prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        from grader import estimate_tokens
+        start, input_tokens = self._starts.pop(run_id, (time.perf_counter(), 0))
+        output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    input_tokens = usage.get("input_tokens") or input_tokens
+                    output_tokens += usage.get("output_tokens") or 0
+                else:
+                    output_tokens += estimate_tokens(generation.text)
+        record(self.name, time.perf_counter() - start, input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        start, input_tokens = self._starts.pop(run_id, (time.perf_counter(), 0))
+        record(self.name, time.perf_counter() - start, error=f"{type(error).__name__}: {error}",
+               input_tokens=input_tokens)
@@ -0,0 +1,14 @@
+"""
+测试环境：项目模块在导入时读取配置 (缓存路径等)，因此在导入任何项目模块之前
+切换到临时工作目录，向量缓存、评分缓存、追踪日志等都写在这里，不影响真实数据
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_REPO = os.path.join(ROOT, "benchmarks", "fixtures", "sample_repo")
+
+sys.path.insert(0, ROOT)
+os.environ.update({"TELEMETRY_CONSOLE": "false"})
+os.chdir(tempfile.mkdtemp(prefix="navigator-tests-"))
@@ -0,0 +1,69 @@
+"""语义答案缓存：SQLite 共享 (多个实例 / 进程看到同一份缓存)、相似问题命中、重新导入后失效"""
+import os
+import sys
+import subprocess
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from answer_cache import AnswerCache
+from conftest import ROOT
+from project_manifest import MANIFEST_FILENAME
+
+_VECTORS = {
+    "如何安装": [1.0, 0.0, 0.0],
+    "如何安装？": [0.99, 0.05, 0.0],
+    "怎么部署": [0.0, 1.0, 0.0],
+}
+
+
+class FixedEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [_VECTORS[t] for t in texts]
+
+    def embed_query(self, text):
+        return _VECTORS[text]
+
+
+def _cache(tmp_path, **kwargs):
+    db_path = tmp_path / "db" / "weather"
+    db_path.mkdir(parents=True, exist_ok=True)
+    return AnswerCache(str(db_path), FixedEmbeddings(), path=str(tmp_path / "answers.sqlite"), **kwargs)
+
+
+def test_shared_between_instances(tmp_path):
+    writer, reader = _cache(tmp_path), _cache(tmp_path)
+    writer.store("如何安装", "pip install weather", [Document(page_content="README", metadata={"source": "README.md"})])
+
+    hit = reader.lookup("如何安装？")
+    assert hit["answer"] == "pip install weather"
+    assert hit["documents"][0].metadata["source"] == "README.md"
+    assert reader.lookup("怎么部署") is None
+    # 命中统计同样共享
+    assert writer.stats() == {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
+    assert reader.contains("如何安装") and not reader.contains("如何安装？")
+
+
+def test_reingest_invalidates(tmp_path):
+    cache = _cache(tmp_path)
+    cache.store("如何安装", "pip install weather", [])
+    with open(os.path.join(cache.db_path, MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+        f.write("{}")
+    assert cache.lookup("如何安装") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_max_entries_evicts_least_recently_used(tmp_path):
+    cache = _cache(tmp_path, max_entries=2)
+    cache.store("如何安装", "a", [])
+    cache.store("怎么部署", "b", [])
+    cache.lookup("如何安装")
+    cache.store("如何安装？", "c", [])
+    assert cache.contains("如何安装？") and not cache.contains("怎么部署")
+
+
+def test_query_path_does_not_import_ingest():
+    # 查询端 (答案缓存、单次查询流程) 只需要清单文件名与版本号，不应加载 git / 切分 / 向量库写入等导入依赖
+    code = "import sys, answer_cache, query_service; print('ingest' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,167 @@
+"""HTTP 查询服务的路由测试 (模型调用全部替换为桩，不需要 Ollama / Kimi)"""
+import json
+import asyncio
+import threading
+
+import pytest
+from starlette.testclient import TestClient
+
+import api_server
+
+
+@pytest.fixture
+def client():
+    with TestClient(api_server.app) as client:
+        yield client
+
+
+def test_metrics_in_llm_mode_does_not_build_fast_grader(client, monkeypatch):
+    def fail():
+        raise AssertionError("LLM 评分模式下不应构建快速评分引擎")
+
+    monkeypatch.setattr(api_server, "GRADER_ENGINE", "llm")
+    monkeypatch.setattr(api_server, "GRADER_SAMPLE_LOG", False)
+    monkeypatch.setattr(api_server, "get_fast_grader", fail)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.json()["grader"] == {"engine": "llm"}
+
+
+class StubQuery:
+    """stream_query 的替身：按顺序产出固定事件；gate 未放行时在第一个事件后阻塞 (模拟模型生成中)"""
+
+    def __init__(self, block=False):
+        self.gate = threading.Event()
+        if not block:
+            self.gate.set()
+        self.cancelled = None
+        self.finished = threading.Event()
+
+    def __call__(self, project, question, cancelled=None, trace_id=None):
+        self.cancelled = cancelled
+        try:
+            yield {"event": "status", "message": "检索中"}
+            while not self.gate.wait(0.01):
+                if cancelled.is_set():
+                    return
+            yield {"event": "token", "text": f"{project}: {question}"}
+            yield {"event": "done", "answer": f"{project}: {question}", "sources": [], "cached": False,
+                   "stats": {}, "trace_id": trace_id}
+        finally:
+            self.finished.set()
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    """单个执行名额、不排队的并发控制，查询流程替换为桩"""
+    admission = api_server.Admission(limit=1, max_queue=0, timeout=0.05)
+    monkeypatch.setattr(api_server, "query_admission", admission)
+    monkeypatch.setattr(api_server, "list_existing_projects", lambda: ["weather"])
+    monkeypatch.setattr(api_server, "stream_query", StubQuery())
+    return admission
+
+
+def _post(client, **body):
+    return client.post("/query", json={"project": "weather", "question": "如何缓存天气", **body})
+
+
+def test_query_returns_answer_and_releases_slot(client, admission):
+    response = _post(client)
+    assert response.status_code == 200
+    assert response.json()["answer"] == "weather: 如何缓存天气"
+    assert response.headers["X-Trace-Id"]
+    assert admission.running == 0
+
+
+def test_streaming_query_yields_ndjson_events(client, admission):
+    with client.stream("POST", "/query", json={"project": "weather", "question": "q", "stream": True}) as response:
+        assert response.status_code == 200
+        events = [json.loads(line) for line in response.iter_lines() if line]
+    assert [e["event"] for e in events] == ["status", "token", "done"]
+    assert admission.running == 0
+
+
+def test_full_queue_returns_429(client, admission):
+    client.portal.call(admission.acquire)
+    try:
+        response = _post(client)
+    finally:
+        client.portal.call(admission.release)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"]
+    assert admission.rejected == 1
+
+
+def test_queue_timeout_returns_503(client, admission):
+    admission.max_queue = 1
+    client.portal.call(admission.acquire)
+    try:
+        response = _post(client)
+    finally:
+        client.portal.call(admission.release)
+    assert response.status_code == 503
+    assert admission.waiting == 0
+
+
+@pytest.mark.parametrize("body", [[1, 2], "question", 3])
+def test_non_object_body_is_rejected(client, admission, body):
+    assert client.post("/query", json=body).status_code == 400
+    assert client.post("/ingest", json=body).status_code == 400
+
+
+async def _call_query(receive):
+    """直接以 ASGI 方式调用 /query (流式)，返回发出的消息"""
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+        # 发送响应头时让出事件循环 (真实服务器写 socket 时同样会挂起)，断开事件可能先于生成器开始迭代被处理
+        await asyncio.sleep(0.01)
+
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST", "path": "/query", "raw_path": b"/query",
+        "query_string": b"", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 8000), "scheme": "http", "root_path": "",
+    }
+    await api_server.app(scope, receive, send)
+    return sent
+
+
+def _receiver(after_first_chunk=None):
+    """第一次返回请求体，之后立即 (或在 after_first_chunk 置位后) 返回断开"""
+    body = json.dumps({"project": "weather", "question": "q", "stream": True}).encode("utf-8")
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        if after_first_chunk is not None:
+            await after_first_chunk.wait()
+        return {"type": "http.disconnect"}
+
+    return receive
+
+
+def test_disconnect_before_streaming_releases_slot(admission):
+    asyncio.run(_call_query(_receiver()))
+    assert admission.running == 0
+    assert not admission._semaphore.locked()
+
+
+def test_disconnect_mid_stream_stops_worker_and_releases_slot(admission, monkeypatch):
+    stub = StubQuery(block=True)
+    monkeypatch.setattr(api_server, "stream_query", stub)
+
+    async def run():
+        first_chunk = asyncio.Event()
+        receive = _receiver(first_chunk)
+        task = asyncio.create_task(_call_query(receive))
+        while stub.cancelled is None:
+            await asyncio.sleep(0.01)
+        first_chunk.set()
+        await task
+
+    asyncio.run(run())
+    # 工作线程收到取消信号并退出后才释放名额
+    assert stub.cancelled.is_set() and stub.finished.is_set()
+    assert admission.running == 0
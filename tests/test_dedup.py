@@ -0,0 +1,96 @@
+"""导入去重 (完全相同 / MinHash 近似重复) 的单元测试"""
+import pytest
+
+from dedup import Deduper, group_aliases, jaccard, normalized_hash, shingles
+
+# 60 个互不相同的词，shingle 之间没有偶然重合
+BASE = " ".join(f"token{i}" for i in range(60))
+
+
+def variant(replacements):
+    """把 BASE 中指定位置的词换掉"""
+    tokens = BASE.split()
+    for i in replacements:
+        tokens[i] = f"changed{i}"
+    return " ".join(tokens)
+
+
+def test_exact_duplicate_ignores_whitespace():
+    deduper = Deduper()
+    text = "def fetch(city):\n    return get_weather(city)\n"
+    reformatted = "def fetch(city):\r\n\treturn   get_weather(city)   \r\n"
+    assert normalized_hash(text) == normalized_hash(reformatted)
+    assert deduper.check("a.py#1", text) is None
+    assert deduper.check("vendor/a.py#1", reformatted) == "a.py#1"
+    assert deduper.exact == 1 and deduper.near == 0
+    assert deduper.duplicates == {"vendor/a.py#1": "a.py#1"}
+
+
+def test_near_duplicate_at_threshold_is_merged():
+    near = variant([59])
+    score = jaccard(shingles(BASE)[0], shingles(near)[0])
+    assert 0.9 < score < 1.0
+
+    # 相似度恰好等于阈值算重复
+    deduper = Deduper(threshold=score)
+    assert deduper.check("a.py#1", BASE) is None
+    assert deduper.check("examples/a.py#1", near) == "a.py#1"
+    assert deduper.near == 1
+
+    # 阈值略高于相似度时保留为独立的规范切片
+    deduper = Deduper(threshold=score + 1e-6)
+    assert deduper.check("a.py#1", BASE) is None
+    assert deduper.check("examples/a.py#1", near) is None
+    assert deduper.removed == 0
+
+
+def test_near_duplicate_also_registers_exact_hash():
+    deduper = Deduper(threshold=0.8)
+    near = variant([59])
+    deduper.check("a.py#1", BASE)
+    assert deduper.check("b.py#1", near) == "a.py#1"
+    # 近似重复内容的完全相同副本直接按哈希命中原规范切片
+    assert deduper.check("c.py#1", near) == "a.py#1"
+    assert (deduper.near, deduper.exact) == (1, 1)
+
+
+def test_distinct_content_is_not_merged():
+    deduper = Deduper()
+    other = " ".join(f"other{i}" for i in range(60))
+    # 每隔几个词改一个：共享的词很多，但 shingle 的 Jaccard 相似度远低于阈值
+    scattered = variant(range(0, 60, 4))
+    assert deduper.check("a.py#1", BASE) is None
+    assert deduper.check("b.py#1", other) is None
+    assert deduper.check("c.py#1", scattered) is None
+    assert deduper.removed == 0
+    assert deduper.duplicates == {}
+
+
+def test_short_chunks_only_deduplicated_exactly():
+    deduper = Deduper(threshold=0.5, min_tokens=20)
+    short = " ".join(f"token{i}" for i in range(12))
+    short_variant = short + " extra"
+    assert deduper.check("a.py#1", short) is None
+    # 词数少于 min_tokens：即使相似度很高也不做近似去重
+    assert deduper.check("b.py#1", short_variant) is None
+    # 完全相同的短切片仍然去重
+    assert deduper.check("c.py#1", short) == "a.py#1"
+    assert (deduper.exact, deduper.near) == (1, 0)
+
+
+def test_group_aliases_maps_canonical_to_other_files():
+    duplicates = {
+        "vendor/b/a.py#abc": "a.py#abc",
+        "vendor/c/a.py#abc": "a.py#abc",
+        "vendor/b/a.py#abc-1": "a.py#abc",
+        "a.py#abc-2": "a.py#abc",        # 同一文件内的重复片段不算别名
+        "lib.py#def-1": "lib.py#def",    # 只有同文件重复的规范切片不出现在结果中
+    }
+    assert group_aliases(duplicates) == {"a.py#abc": ["vendor/b/a.py", "vendor/c/a.py"]}
+    assert group_aliases({}) == {}
+
+
+@pytest.mark.parametrize("num_perm, bands", [(64, 0), (64, 10), (10, 16)])
+def test_invalid_band_configuration(num_perm, bands):
+    with pytest.raises(ValueError):
+        Deduper(num_perm=num_perm, bands=bands)
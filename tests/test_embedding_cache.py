@@ -0,0 +1,88 @@
+"""向量缓存 (SQLite LRU 表)：命中 / 未命中、达到上限时的 LRU 淘汰、写入时不必每次计数全表"""
+import pytest
+
+from embedding_cache import CachedEmbeddings, EmbeddingCache, text_hash
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(t)), 0.5] for t in texts]
+
+    def embed_query(self, text):
+        self.texts.append(text)
+        return [float(len(text)), 0.5]
+
+
+@pytest.fixture
+def embeddings_cache(tmp_path):
+    return EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_entries=10)
+
+
+def _count_queries(cache):
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    return statements
+
+
+def test_embedding_hits_and_misses(embeddings_cache):
+    underlying = CountingEmbeddings()
+    cached = CachedEmbeddings(underlying, "embed-model", cache=embeddings_cache)
+    first = cached.embed_documents(["alpha", "beta", "alpha"])
+    # 批内重复的文本只向量化一次
+    assert underlying.texts == ["alpha", "beta"]
+    assert cached.embed_documents(["beta", "alpha"]) == [first[1], first[0]]
+    assert underlying.texts == ["alpha", "beta"]
+    stats = embeddings_cache.stats()
+    assert stats["entries"] == 2 and stats["hits"] == 2 and stats["misses"] == 3
+    # 不同模型的向量互不共用
+    assert embeddings_cache.get_many("other-model", [text_hash("alpha")]) == {}
+
+
+def test_vectors_round_trip_as_float32(embeddings_cache):
+    embeddings_cache.put_many("m", {"h": [0.25, -1.5, 3.0]})
+    assert embeddings_cache.get_many("m", ["h", "missing"]) == {"h": [0.25, -1.5, 3.0]}
+    assert (embeddings_cache.hits, embeddings_cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(embeddings_cache):
+    for i in range(10):
+        embeddings_cache.put_many("m", {f"h{i}": [float(i)]})
+    # 最早写入的 h0、h1 刚被读取过，淘汰时保留
+    assert len(embeddings_cache.get_many("m", ["h0", "h1"])) == 2
+    embeddings_cache.put_many("m", {"h10": [10.0]})
+
+    # 超过上限 (11 > 10) 后淘汰到上限的 90%，去掉最久未使用的 h2、h3
+    remaining = embeddings_cache.get_many("m", [f"h{i}" for i in range(11)])
+    assert sorted(remaining, key=lambda h: int(h[1:])) == ["h0", "h1"] + [f"h{i}" for i in range(4, 11)]
+    assert embeddings_cache.evictions == 2
+    assert embeddings_cache.stats()["entries"] == 9
+
+
+def test_writes_do_not_count_the_table_every_time(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_entries=100)
+    statements = _count_queries(cache)
+    for i in range(9):
+        cache.put_many("m", {f"h{i}": [float(i)]})
+    assert not [s for s in statements if "COUNT(*)" in s]
+    # 累计写入达到上限的 10% 时重新计数一次
+    cache.put_many("m", {"h9": [9.0]})
+    assert len([s for s in statements if "COUNT(*)" in s]) == 1
+
+
+def test_count_estimate_catches_up_with_other_processes(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    this, other = EmbeddingCache(path, max_entries=20), EmbeddingCache(path, max_entries=20)
+    for i in range(20):
+        other.put_many("m", {f"other{i}": [float(i)]})
+    # 本进程的估算不知道另一个进程的写入，第一次写入不计数
+    this.put_many("m", {"mine0": [0.0]})
+    assert this.stats()["entries"] == 21 and this.evictions == 0
+    # 累计写入达到上限的 10% (2 条) 时重新计数，发现超出上限后淘汰
+    this.put_many("m", {"mine1": [1.0]})
+    assert this.evictions == 4
+    assert this.stats()["entries"] == 18
+    assert len(this.get_many("m", ["mine0", "mine1"])) == 2
@@ -0,0 +1,140 @@
+"""跨项目检索：分片分数归一化、按项目配额合并、分片超时从开始执行时计时、未开始的分片取消"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+import federated
+from federated import FederatedRetriever, merge_shards, normalize_shard
+
+
+def shard(project, scores):
+    """一个项目按排名排好的检索结果 (scores 为各片段的向量相似度)"""
+    documents = [
+        Document(page_content=f"{project} {rank}", metadata={"project": project, "score": score})
+        for rank, score in enumerate(scores, start=1)
+    ]
+    return normalize_shard(documents, rrf_k=60)
+
+
+def names(documents):
+    return [d.page_content for d in documents]
+
+
+def test_normalize_shard_uses_reciprocal_rank():
+    documents = shard("weather", [0.9, 0.1, 0.5])
+    assert [d.metadata["federated_score"] for d in documents] == [1 / 61, 1 / 62, 1 / 63]
+    # 原始分数的量纲不影响归一化结果，只看分片内排名
+    assert normalize_shard([Document(page_content="x", metadata={"score": 42.0})], rrf_k=0)[0].metadata[
+        "federated_score"] == 1.0
+    assert normalize_shard([]) == []
+
+
+def test_merge_interleaves_by_rank_and_breaks_ties_by_score():
+    results = {"alpha": shard("alpha", [0.4, 0.3]), "beta": shard("beta", [0.8, 0.2])}
+    merged = merge_shards(results, k=10, quota=5)
+    # 同一排名的片段按相似度排序
+    assert names(merged) == ["beta 1", "alpha 1", "alpha 2", "beta 2"]
+
+
+def test_merge_applies_project_quota_and_k():
+    results = {
+        "big": shard("big", [0.9] * 10),
+        "small": shard("small", [0.5, 0.5]),
+        "tiny": shard("tiny", [0.1]),
+    }
+    merged = merge_shards(results, k=6, quota=3)
+    per_project = {p: sum(1 for d in merged if d.metadata["project"] == p) for p in results}
+    assert per_project == {"big": 3, "small": 2, "tiny": 1}
+    assert len(merged) == 6
+
+    # 其他项目不够时仍受配额限制，不会用大项目补满 k
+    assert len(merge_shards({"big": shard("big", [0.9] * 10)}, k=6, quota=3)) == 3
+    # k 先于配额生效
+    assert names(merge_shards(results, k=2, quota=3)) == ["big 1", "small 1"]
+
+
+def test_merge_without_quota_ranks_across_projects():
+    results = {"big": shard("big", [0.9] * 10), "small": shard("small", [0.5])}
+    merged = merge_shards(results, k=4, quota=0)
+    assert names(merged) == ["big 1", "small 1", "big 2", "big 3"]
+
+
+class ScriptedShard:
+    def __init__(self, name, behaviour, calls):
+        self.name = name
+        self.behaviour = behaviour
+        self.calls = calls
+
+    def invoke(self, query):
+        self.calls.append(self.name)
+        self.behaviour()
+        return [Document(page_content=f"{self.name} 1", metadata={"score": 0.5})]
+
+
+class ScriptedRegistry:
+    max_projects = 8
+
+    def __init__(self, behaviours):
+        self.behaviours = behaviours
+        self.calls = []
+
+    @contextmanager
+    def use(self, name):
+        yield SimpleNamespace(retriever=ScriptedShard(name, self.behaviours[name], self.calls))
+
+
+@pytest.fixture
+def one_worker(monkeypatch):
+    """线程池只有一个线程：分片依次执行，后面的分片需要排队"""
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(federated, "_shard_executor", executor)
+    monkeypatch.setattr(federated, "get_client", lambda name: SimpleNamespace(embed_query=lambda q: [0.0]))
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def retriever_for(monkeypatch, registry, timeout):
+    monkeypatch.setattr(FederatedRetriever, "resolve_projects", lambda self: sorted(registry.behaviours))
+    return FederatedRetriever(registry=registry, k=10, quota=5, timeout=timeout)
+
+
+def test_queue_time_does_not_count_against_timeout(one_worker, monkeypatch):
+    registry = ScriptedRegistry({"a": lambda: time.sleep(0.3), "b": lambda: time.sleep(0.3)})
+    retriever = retriever_for(monkeypatch, registry, timeout=0.5)
+    # b 在 a 之后才开始执行，从提交算起超过 0.5s，但自身只执行了 0.3s
+    results, failed, timed_out, cancelled = retriever._gather(["a", "b"], "q")
+    assert sorted(results) == ["a", "b"]
+    assert (failed, timed_out, cancelled) == (0, [], [])
+
+
+def test_shards_that_never_start_are_cancelled(one_worker, monkeypatch):
+    release = threading.Event()
+    registry = ScriptedRegistry({"stuck": lambda: release.wait(5), "waiting": lambda: None})
+    retriever = retriever_for(monkeypatch, registry, timeout=0.2)
+
+    start = time.monotonic()
+    documents = retriever.invoke("q")
+    assert documents == []
+    assert time.monotonic() - start < 1.0
+
+    release.set()
+    one_worker.shutdown(wait=True)
+    # 排队中的分片已取消，没有在超时后继续占用线程池
+    assert registry.calls == ["stuck"]
+
+
+def test_timeout_is_reported_per_shard(one_worker, monkeypatch):
+    release = threading.Event()
+    registry = ScriptedRegistry({"fast": lambda: None, "slow": lambda: release.wait(5)})
+    retriever = retriever_for(monkeypatch, registry, timeout=0.2)
+    try:
+        results, failed, timed_out, cancelled = retriever._gather(["fast", "slow"], "q")
+    finally:
+        release.set()
+    assert list(results) == ["fast"]
+    assert (failed, timed_out, cancelled) == (0, ["slow"], [])
@@ -0,0 +1,66 @@
+"""共享 HTTP 连接层：只重试服务端未处理的请求，流式响应提前放弃时立即归还并发名额"""
+import httpx
+import pytest
+
+from http_clients import Backend, LimitedTransport
+
+
+class ScriptedTransport(httpx.BaseTransport):
+    """按顺序返回预设的结果 (异常或状态码)，记录收到的请求数"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = 0
+
+    def handle_request(self, request):
+        self.requests += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, stream=httpx.ByteStream(b"data: 1\n\ndata: 2\n\n"), headers={"retry-after": "0"})
+
+
+def _client(*outcomes, max_concurrency=1):
+    backend = Backend("test", max_concurrency, 0)
+    transport = LimitedTransport(backend, max_retries=2)
+    transport._transport = ScriptedTransport(*outcomes)
+    return httpx.Client(transport=transport), backend, transport._transport
+
+
+def test_connect_errors_and_503_are_retried(monkeypatch):
+    monkeypatch.setattr("http_clients.time.sleep", lambda _: None)
+    client, backend, inner = _client(httpx.ConnectError("refused"), 503, 200)
+    assert client.post("http://kimi/v1/chat/completions", json={}).status_code == 200
+    assert inner.requests == 3
+    assert backend.stats()["retries"] == 2
+    assert backend.stats()["in_flight"] == 0
+
+
+@pytest.mark.parametrize("outcome", [httpx.ReadError("reset"), httpx.RemoteProtocolError("closed")])
+def test_errors_after_sending_are_not_retried(outcome):
+    # 请求可能已被处理 (按 Token 计费的生成)，不能重发
+    client, backend, inner = _client(outcome, 200)
+    with pytest.raises(type(outcome)):
+        client.post("http://kimi/v1/chat/completions", json={})
+    assert inner.requests == 1
+    assert backend.stats()["in_flight"] == 0
+
+
+def test_500_is_returned_without_retry():
+    client, backend, inner = _client(500, 200)
+    assert client.post("http://kimi/v1/chat/completions", json={}).status_code == 500
+    assert inner.requests == 1
+
+
+def test_abandoned_stream_releases_slot():
+    client, backend, _ = _client(200, 200)
+    with client.stream("POST", "http://kimi/v1/chat/completions", json={}) as response:
+        lines = response.iter_lines()
+        next(lines)
+        assert backend.stats()["in_flight"] == 1
+        # 调用方不再读取 (例如用户取消)，迭代器结束时立即归还，不等到响应关闭或被回收
+        lines.close()
+        assert backend.stats()["in_flight"] == 0
+    # 并发上限为 1：名额已归还，下一个请求不会阻塞
+    assert client.post("http://kimi/v1/chat/completions", json={}).status_code == 200
+    assert backend.stats()["in_flight"] == 0
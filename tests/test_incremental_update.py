@@ -0,0 +1,125 @@
+"""增量更新：与重新全量导入得到相同的文件集合 (包括 .gitignore 的各种情况)，拉取后读不到 commit 时报错"""
+import os
+import shutil
+import subprocess
+import zlib
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import ingest
+from conftest import SAMPLE_REPO
+
+URL = "https://github.com/acme/weather"
+
+
+class HashEmbeddings(Embeddings):
+    def _vector(self, text):
+        seed = zlib.crc32(text.encode("utf-8"))
+        return [((seed >> shift) & 0xFF) / 255.0 + 0.01 for shift in range(0, 32, 4)]
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def git(repo, *args):
+    subprocess.run(["git", "-C", repo, "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                   check=True, capture_output=True)
+
+
+def write(repo, rel_path, text):
+    path = os.path.join(repo, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def commit(repo, message):
+    # 被忽略的文件也提交 (仓库中检入的生成文件等)，使其出现在 git diff 中，由过滤规则决定是否索引
+    git(repo, "add", "-A", "--force")
+    git(repo, "commit", "-q", "-m", message)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_BATCH_SIZE", 8)
+    monkeypatch.setattr(ingest, "INGEST_WORKERS", 1)
+    monkeypatch.setattr(ingest, "DEDUP_ENABLED", False)
+    monkeypatch.setattr("flat_store.VECTOR_BACKEND", "flat")
+    monkeypatch.setattr(ingest, "get_embeddings", HashEmbeddings)
+    # 源码已经在本地仓库中提交，拉取更新视为成功
+    monkeypatch.setattr(ingest, "fetch_updates", lambda *args, **kwargs: True)
+
+    source = str(tmp_path / "src" / "weather")
+    shutil.copytree(SAMPLE_REPO, source, ignore=shutil.ignore_patterns("__pycache__"))
+    write(source, ".gitignore", "generated/\n*_gen.py\n")
+    write(source, "weather/.gitignore", "scratch.py\n")
+    write(source, "legacy/old.py", "def old():\n    return 'legacy'\n")
+    git(source, "init", "-q")
+    commit(source, "initial")
+    return source
+
+
+def full_index(source, db_path):
+    ingest.index_source_tree(source, db_path, URL)
+    return ingest.load_manifest(db_path)
+
+
+def test_incremental_matches_full_scan_with_gitignore(repo, tmp_path):
+    db_path = str(tmp_path / "db" / "incremental")
+    before = full_index(repo, db_path)
+    assert "legacy/old.py" in before["files"]
+
+    # 新增：普通文件、被根目录 / 子目录 .gitignore 忽略的文件、被忽略目录下的文件 (含 !取反规则)
+    write(repo, "weather/radar.py", "def radar():\n    return 'radar scan'\n")
+    write(repo, "weather/models_gen.py", "GENERATED = True\n")
+    write(repo, "weather/scratch.py", "print('scratch')\n")
+    write(repo, "generated/schema.py", "SCHEMA = {}\n")
+    write(repo, "generated/.gitignore", "!keep.py\n")
+    write(repo, "generated/keep.py", "KEEP = 1\n")
+    write(repo, "build/output.py", "OUTPUT = 1\n")
+    # 修改与删除
+    with open(os.path.join(repo, "weather", "geo.py"), "a", encoding="utf-8") as f:
+        f.write("\n\ndef antipode(lat, lon):\n    return -lat, lon + 180\n")
+    os.remove(os.path.join(repo, "weather", "alerts.py"))
+    # 规则变化：已索引的 legacy/ 现在被忽略
+    write(repo, ".gitignore", "generated/\n*_gen.py\nlegacy/\n")
+    commit(repo, "update")
+
+    db, message = ingest.update_project(URL, repo, db_path, before)
+    assert db == db_path and message.startswith("Updated")
+    incremental = ingest.load_manifest(db_path)
+    full = full_index(repo, str(tmp_path / "db" / "full"))
+
+    assert incremental["commit"] == full["commit"]
+    assert incremental["files"] == full["files"]
+    assert "weather/radar.py" in incremental["files"]
+    for ignored in ("weather/models_gen.py", "weather/scratch.py", "generated/schema.py",
+                    "generated/keep.py", "build/output.py", "legacy/old.py", "weather/alerts.py"):
+        assert ignored not in incremental["files"]
+
+
+def test_unignored_files_are_added(repo, tmp_path):
+    db_path = str(tmp_path / "db" / "incremental")
+    write(repo, "generated/schema.py", "SCHEMA = {'fields': []}\n")
+    commit(repo, "generated files")
+    before = full_index(repo, db_path)
+    assert "generated/schema.py" not in before["files"]
+
+    write(repo, ".gitignore", "*_gen.py\n")
+    commit(repo, "stop ignoring generated/")
+    ingest.update_project(URL, repo, db_path, before)
+    incremental = ingest.load_manifest(db_path)
+    assert "generated/schema.py" in incremental["files"]
+    assert incremental["files"] == full_index(repo, str(tmp_path / "db" / "full"))["files"]
+
+
+def test_missing_head_after_fetch_is_reported(repo, tmp_path, monkeypatch):
+    db_path = str(tmp_path / "db" / "incremental")
+    before = full_index(repo, db_path)
+    monkeypatch.setattr(ingest, "git_head", lambda source_path: None)
+    assert ingest.update_project(URL, repo, db_path, before) == (None, "Fetch Failed")
+    assert ingest.load_manifest(db_path)["commit"] == before["commit"]
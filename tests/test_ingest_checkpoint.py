@@ -0,0 +1,141 @@
+"""断点续传：导入中断后从检查点继续，检查点存在时绝不把半成品向量库当作缓存"""
+import os
+import json
+import shutil
+import zlib
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import ingest
+from conftest import SAMPLE_REPO
+
+URL = "https://github.com/acme/weather"
+
+
+class HashEmbeddings(Embeddings):
+    """按文本哈希生成的确定性向量；fail_after 次 embed_documents 调用之后抛出异常 (模拟 Ollama 中断)"""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.calls = 0
+        self.texts = []
+
+    def _vector(self, text):
+        seed = zlib.crc32(text.encode("utf-8"))
+        return [((seed >> shift) & 0xFF) / 255.0 + 0.01 for shift in range(0, 32, 4)]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("embedding backend unavailable")
+        self.texts.extend(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """把向量库 / 源码目录指向临时目录，克隆改为复制示例仓库，使用 flat 后端与小批次"""
+    monkeypatch.setattr(ingest, "DB_ROOT", str(tmp_path / "db"))
+    monkeypatch.setattr(ingest, "SOURCE_ROOT", str(tmp_path / "src"))
+    monkeypatch.setattr(ingest, "INGEST_BATCH_SIZE", 4)
+    monkeypatch.setattr(ingest, "INGEST_WORKERS", 1)
+    # 关闭去重，使写入的切片与清单一一对应
+    monkeypatch.setattr(ingest, "DEDUP_ENABLED", False)
+    monkeypatch.setattr("flat_store.VECTOR_BACKEND", "flat")
+    clones = []
+
+    def fake_clone(url, target_dir, ref=None):
+        clones.append(url)
+        shutil.rmtree(target_dir, ignore_errors=True)
+        shutil.copytree(SAMPLE_REPO, target_dir, ignore=shutil.ignore_patterns("__pycache__"))
+        return True
+
+    monkeypatch.setattr(ingest, "clone_repo", fake_clone)
+
+    def run(embeddings, **kwargs):
+        monkeypatch.setattr(ingest, "get_embeddings", lambda: embeddings)
+        return ingest.ingest_project(URL, **kwargs)
+
+    db_path = os.path.join(ingest.DB_ROOT, "weather")
+    source_path = os.path.join(ingest.SOURCE_ROOT, "weather")
+    return run, clones, db_path, source_path
+
+
+def _checkpoint(db_path):
+    with open(os.path.join(db_path, ingest.CHECKPOINT_FILENAME), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _interrupt(run, db_path):
+    db, message = run(HashEmbeddings(fail_after=2))
+    assert db is None and message.startswith("Ingest Interrupted")
+    checkpoint = _checkpoint(db_path)
+    assert checkpoint["url"] == URL
+    return checkpoint
+
+
+def _stored_files(db_path):
+    store = ingest.open_vector_store(db_path, HashEmbeddings())
+    ids = store.get(include=[])["ids"]
+    store.close()
+    return {chunk_id.rsplit("#", 1)[0] for chunk_id in ids}
+
+
+def test_resume_skips_completed_files(env):
+    run, clones, db_path, _ = env
+    checkpoint = _interrupt(run, db_path)
+    done = set(checkpoint["done_files"])
+    assert done
+
+    embeddings = HashEmbeddings()
+    db, message = run(embeddings)
+    assert db == db_path and message.startswith("Success")
+    # 源码仍在：不重新克隆，只向量化未完成文件的切片
+    assert len(clones) == 1
+    assert not os.path.exists(os.path.join(db_path, ingest.CHECKPOINT_FILENAME))
+    files = ingest.load_manifest(db_path)["files"]
+    assert _stored_files(db_path) == set(files)
+    assert len(embeddings.texts) == sum(len(ids) for path, ids in files.items() if path not in done)
+
+    # 导入完成后再次加载直接命中缓存
+    assert run(HashEmbeddings())[1].startswith("Cached")
+
+
+def test_checkpoint_without_source_reingests(env):
+    run, clones, db_path, source_path = env
+    _interrupt(run, db_path)
+    shutil.rmtree(source_path)
+
+    embeddings = HashEmbeddings()
+    db, message = run(embeddings)
+    # 不能把半成品当作缓存：重新克隆并从头导入
+    assert message.startswith("Success")
+    assert len(clones) == 2
+    assert not os.path.exists(os.path.join(db_path, ingest.CHECKPOINT_FILENAME))
+    assert _stored_files(db_path) == set(ingest.load_manifest(db_path)["files"])
+
+
+def test_unreadable_checkpoint_reingests(env):
+    run, clones, db_path, _ = env
+    _interrupt(run, db_path)
+    with open(os.path.join(db_path, ingest.CHECKPOINT_FILENAME), "w", encoding="utf-8") as f:
+        f.write("{not json")
+
+    db, message = run(HashEmbeddings())
+    assert message.startswith("Success")
+    assert len(clones) == 2
+
+
+def test_checkpoint_from_other_url_reingests(env):
+    run, clones, db_path, _ = env
+    _interrupt(run, db_path)
+    with open(os.path.join(db_path, ingest.CHECKPOINT_FILENAME), "w", encoding="utf-8") as f:
+        json.dump({"url": "https://github.com/someone-else/weather", "done_files": []}, f)
+
+    db, message = run(HashEmbeddings())
+    assert message.startswith("Success")
+    assert len(clones) == 2
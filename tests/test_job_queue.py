@@ -0,0 +1,114 @@
+"""后台导入任务队列：同项目去重、同名不同地址的冲突、多进程共享状态与中断检测"""
+import json
+import threading
+import time
+
+import pytest
+
+from job_queue import JobConflictError, JobQueue
+
+URL = "https://github.com/acme/weather"
+
+
+class BlockingRunner:
+    """导入函数替身：阻塞到 release() 为止，返回失败结果 (不触发项目注册表)"""
+
+    def __init__(self):
+        self.calls = []
+        self._event = threading.Event()
+
+    def __call__(self, url, **kwargs):
+        self.calls.append(url)
+        self._event.wait(10)
+        return None, "No Documents Found"
+
+    def release(self):
+        self._event.set()
+
+
+@pytest.fixture
+def runner():
+    runner = BlockingRunner()
+    yield runner
+    runner.release()
+
+
+def _queue(tmp_path, runner, **kwargs):
+    return JobQueue(workers=1, path=str(tmp_path / "jobs.sqlite"), runner=runner, **kwargs)
+
+
+def _wait_finished(queue, job_id):
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("任务未结束")
+
+
+def test_same_url_is_deduplicated(tmp_path, runner):
+    queue = _queue(tmp_path, runner)
+    job, created = queue.submit(URL)
+    again, created_again = queue.submit(URL + ".git/")
+    assert created and not created_again
+    assert again["id"] == job["id"]
+
+    runner.release()
+    assert _wait_finished(queue, job["id"])["status"] == "failed"
+    assert runner.calls == [URL]
+    # 任务结束后可以再次提交
+    assert queue.submit(URL)[1]
+
+
+def test_fork_with_same_name_is_rejected(tmp_path, runner):
+    queue = _queue(tmp_path, runner)
+    job, _ = queue.submit(URL)
+    with pytest.raises(JobConflictError, match=job["id"]):
+        queue.submit("https://github.com/someone-else/weather")
+    assert [j["id"] for j in queue.list()] == [job["id"]]
+
+
+def test_state_is_shared_between_processes(tmp_path, runner):
+    # 两个队列实例共用同一个状态文件，模拟 Web 界面与 API 服务两个进程
+    app, api = _queue(tmp_path, runner), _queue(tmp_path, runner)
+    job, _ = app.submit(URL)
+
+    seen, created = api.submit(URL)
+    assert not created and seen["id"] == job["id"]
+    with pytest.raises(JobConflictError):
+        api.submit("https://github.com/someone-else/weather")
+    # 另一个进程的任务仍在运行 (心跳未超时)，不会被标记为 interrupted
+    assert api.get(job["id"])["status"] in ("queued", "running")
+
+    runner.release()
+    assert _wait_finished(api, job["id"])["status"] == "failed"
+    assert api.stats()["jobs"] == {"failed": 1}
+
+
+def test_jobs_of_dead_process_are_interrupted(tmp_path, runner):
+    dead = _queue(tmp_path, runner)
+    job, _ = dead.submit(URL)
+    while dead.get(job["id"])["status"] != "running":
+        time.sleep(0.01)
+    # 模拟执行任务的进程已退出：心跳停在很久以前
+    dead._conn.execute("UPDATE jobs SET heartbeat = 0")
+
+    restarted = _queue(tmp_path, runner, stale_seconds=60)
+    interrupted = restarted.get(job["id"])
+    assert interrupted["status"] == "interrupted"
+    stored = json.loads(restarted._conn.execute("SELECT data FROM jobs").fetchone()[0])
+    assert stored["status"] == "interrupted"
+    # 中断的任务不再阻止同一项目重新提交
+    assert restarted.submit(URL)[1]
+
+
+@pytest.mark.parametrize("options", [{"ref": "v2.0"}, {"force_update": True}, {"incremental": True}])
+def test_pending_job_with_different_options_conflicts(tmp_path, runner, options):
+    queue = _queue(tmp_path, runner)
+    job, _ = queue.submit(URL)
+    # 不同的 ref / 强制更新 / 增量模式不能合并到进行中的任务，也不能被静默丢弃
+    with pytest.raises(JobConflictError, match=job["id"]):
+        queue.submit(URL, **options)
+    # 选项相同时仍然合并
+    assert queue.submit(URL)[0]["id"] == job["id"]
+    assert len(queue.list()) == 1
@@ -0,0 +1,61 @@
+"""BM25 索引与倒数排名融合 (RRF) 的单元测试"""
+import pytest
+
+from lexical_index import BM25Index, load_index, reciprocal_rank_fusion, save_index, tokenize
+
+
+def test_rrf_scores_are_sum_of_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60))
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused["c"] == pytest.approx(1 / 63)
+    assert fused["d"] == pytest.approx(1 / 62)
+
+
+def test_rrf_prefers_documents_found_by_both_rankings():
+    # 两路都命中的文档排在只被一路排第一的文档之前
+    fused = reciprocal_rank_fusion([["vec_only", "both"], ["bm25_only", "both"]], k=60)
+    ids = [doc_id for doc_id, _ in fused]
+    assert ids[0] == "both"
+    assert set(ids[1:]) == {"vec_only", "bm25_only"}
+
+
+def test_rrf_k_controls_weight_of_top_ranks():
+    rankings = [["a", "b"], ["b", "c"], ["a", "d"]]
+    assert [d for d, _ in reciprocal_rank_fusion(rankings, k=1)][0] == "a"
+    # 分数按从高到低排列
+    scores = [s for _, s in reciprocal_rank_fusion(rankings, k=60)]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_rrf_empty_rankings():
+    assert reciprocal_rank_fusion([]) == []
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+def test_tokenize_keeps_identifiers_and_splits_parts():
+    tokens = tokenize("def build_graph(OllamaBaseURL): 检索器")
+    assert "build_graph" in tokens
+    assert {"build", "graph"} <= set(tokens)
+    assert {"ollamabaseurl", "ollama", "base", "url"} <= set(tokens)
+    assert {"检索", "索器"} <= set(tokens)
+
+
+def test_bm25_search_remove_and_roundtrip(tmp_path):
+    index = BM25Index()
+    index.add("a.py#1", "def build_graph(retriever): return graph")
+    index.add("b.py#1", "def load_index(db_path): return index")
+    index.add("c.py#1", "README 说明 build 步骤")
+    assert index.search("build_graph", k=1)[0][0] == "a.py#1"
+
+    assert index.remove(["a.py#1"]) == 1
+    assert all(doc_id != "a.py#1" for doc_id, _ in index.search("build_graph"))
+
+    save_index(index, str(tmp_path))
+    loaded = load_index(str(tmp_path))
+    assert loaded.size == 2
+    assert loaded.search("load_index") == index.search("load_index")
+
+
+def test_load_index_missing(tmp_path):
+    assert load_index(str(tmp_path)) is None
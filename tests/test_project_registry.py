@@ -0,0 +1,160 @@
+"""已加载项目缓存：其他进程重新导入后按数据版本重新加载，淘汰 / 失效的项目等最后一个使用者结束后才关闭"""
+import os
+import threading
+
+import pytest
+
+import project_registry
+from project_manifest import MANIFEST_FILENAME
+from project_registry import ProjectRegistry
+
+
+class FakeProject:
+    def __init__(self, name, generation):
+        self.name = name
+        self.generation = generation
+        self.est_bytes = 1
+        self.active = 0
+        self.evicted = False
+        self.version = None
+        self.closed = False
+
+
+class FakeLoader:
+    def __init__(self):
+        self.loads = []
+
+    def __call__(self, name):
+        project = FakeProject(name, len(self.loads))
+        self.loads.append(project)
+        return project
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    versions = {}
+    loader = FakeLoader()
+    registry = ProjectRegistry(max_projects=2, max_bytes=100, loader=loader, version_of=versions.get)
+    monkeypatch.setattr(registry, "_close", lambda entry: setattr(entry, "closed", True))
+    return registry, loader, versions
+
+
+@pytest.fixture
+def single(monkeypatch):
+    """只缓存一个项目，取用另一个项目即淘汰当前项目；记录每次关闭"""
+    closes = []
+    registry = ProjectRegistry(max_projects=1, max_bytes=100, loader=FakeLoader(), version_of=lambda name: None)
+    monkeypatch.setattr(registry, "_close", closes.append)
+    return registry, closes
+
+
+def test_reimport_in_another_process_reloads_project(registry):
+    registry, loader, versions = registry
+    versions["weather"] = 1
+    first = registry.get("weather")
+    assert registry.get("weather") is first
+
+    # 另一个进程重新导入后清单的修改时间变化
+    versions["weather"] = 2
+    second = registry.get("weather")
+    assert second is not first and second.version == 2
+    assert first.closed
+    assert registry.metrics()["reloads"] == 1
+    assert registry.get("weather") is second
+
+
+def test_missing_manifest_keeps_loaded_version(registry):
+    registry, loader, versions = registry
+    versions["weather"] = 1
+    first = registry.get("weather")
+    # 重新导入进行中 (清单尚未写入)：继续使用已加载的版本
+    del versions["weather"]
+    assert registry.get("weather") is first
+    assert len(loader.loads) == 1
+
+
+def test_reload_while_in_use_defers_close(registry):
+    registry, loader, versions = registry
+    versions["weather"] = 1
+    with registry.use("weather") as old:
+        versions["weather"] = 2
+        with registry.use("weather") as new:
+            assert new is not old
+        # 旧版本仍在被查询使用，不能关闭
+        assert not old.closed
+    assert old.closed and not new.closed
+
+
+def test_version_follows_manifest_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(project_registry, "DB_ROOT", str(tmp_path))
+    manifest = tmp_path / "weather" / MANIFEST_FILENAME
+    manifest.parent.mkdir()
+    manifest.write_text("{}", encoding="utf-8")
+    os.utime(manifest, ns=(1_000_000_000, 1_000_000_000))
+    loader = FakeLoader()
+    registry = ProjectRegistry(loader=loader)
+    monkeypatch.setattr(registry, "_close", lambda entry: None)
+
+    first = registry.get("weather")
+    assert registry.get("weather") is first
+    # 其他进程的导入 / 增量更新重写清单
+    os.utime(manifest, ns=(2_000_000_000, 2_000_000_000))
+    assert registry.get("weather") is not first
+    assert len(loader.loads) == 2
+
+
+def test_evicted_while_in_use_closes_after_release(single):
+    registry, closes = single
+    with registry.use("alpha") as alpha:
+        registry.get("beta")
+        # 已被淘汰，但查询仍在使用，向量库连接保持打开
+        assert alpha.evicted and registry.metrics()["projects"] == ["beta"]
+        assert closes == []
+    assert closes == [alpha]
+    # 再次取用时重新加载，不会拿到已关闭的实例
+    assert registry.get("alpha") is not alpha
+
+
+def test_nested_use_closes_after_last_release(single):
+    registry, closes = single
+    with registry.use("alpha") as outer:
+        with registry.use("alpha") as inner:
+            assert inner is outer and outer.active == 2
+            registry.get("beta")
+        # 内层释放后仍有外层使用者
+        assert closes == [] and outer.active == 1
+    assert closes == [outer] and outer.active == 0
+
+
+def test_invalidate_while_in_use_defers_close(single):
+    registry, closes = single
+    with registry.use("alpha") as alpha:
+        assert registry.invalidate("alpha")
+        assert closes == []
+    assert closes == [alpha]
+    assert not registry.invalidate("alpha")
+
+
+def test_close_waits_for_query_in_other_thread(single):
+    registry, closes = single
+    acquired, release = threading.Event(), threading.Event()
+
+    def query():
+        with registry.use("alpha"):
+            acquired.set()
+            release.wait(5)
+
+    worker = threading.Thread(target=query)
+    worker.start()
+    assert acquired.wait(5)
+    alpha = registry.get("alpha")
+    registry.get("beta")
+    assert alpha.evicted and closes == []
+
+    release.set()
+    worker.join(5)
+    # 由最后一个使用者 (查询线程) 在释放时关闭，且只关闭一次
+    assert closes == [alpha]
+    # 无人使用的项目被淘汰时立即关闭
+    registry.get("gamma")
+    assert [p.name for p in closes] == ["alpha", "beta"]
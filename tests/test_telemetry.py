@@ -0,0 +1,174 @@
+"""追踪与指标：Prometheus 直方图输出、跨线程的 trace ID 传递、查询状态写入 span 属性、JSON 日志轮转"""
+import json
+import os
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+import federated
+import grader
+import telemetry
+from federated import FederatedRetriever
+from telemetry import Metrics, Span, span
+
+
+class CollectingLog:
+    """JSON 日志替身：收集每个结束的 span"""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+    def named(self, name):
+        return [r for r in self.records if r["name"] == name]
+
+
+@pytest.fixture
+def log(monkeypatch):
+    collected = CollectingLog()
+    monkeypatch.setattr(telemetry, "_log", collected)
+    monkeypatch.setattr(telemetry, "TELEMETRY_ENABLED", True)
+    return collected
+
+
+def finished(name, seconds, error=None, **attrs):
+    done = Span(name, "trace", None, attrs)
+    done.duration = seconds
+    done.error = error
+    return done
+
+
+def parse(text):
+    """Prometheus 文本格式 -> {(指标名, 标签): 值}"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, value = line.rsplit(" ", 1)
+        name, _, labels = series.partition("{")
+        labels = tuple(
+            tuple(pair.split("=", 1)) for pair in labels.rstrip("}").split(",") if pair
+        )
+        samples[(name, tuple((k, v.strip('"')) for k, v in labels))] = float(value)
+    return samples
+
+
+def test_render_histogram_buckets_are_cumulative():
+    metrics = Metrics()
+    for seconds in (0.003, 0.2, 0.2, 4.0):
+        metrics.observe(finished("retrieve", seconds, docs_out=5, vector_ms=12))
+    metrics.observe(finished("retrieve", 500.0, error="TimeoutError: slow", docs_out=0))
+    samples = parse(metrics.render())
+
+    def bucket(le):
+        return samples[("navigator_span_seconds_bucket", (("span", "retrieve"), ("le", le)))]
+
+    assert bucket("0.005") == 1
+    assert bucket("0.1") == 1
+    assert bucket("0.25") == 3
+    assert bucket("5") == 4
+    assert bucket("300") == 4
+    # 超出最大分桶的只计入 +Inf，+Inf 等于总次数
+    assert bucket("+Inf") == 5
+    bounds = [le for (name, labels) in samples if name == "navigator_span_seconds_bucket"
+              for key, le in labels if key == "le"]
+    counts = [bucket(le) for le in bounds]
+    assert counts == sorted(counts)
+
+    assert samples[("navigator_span_seconds_count", (("span", "retrieve"),))] == 5
+    assert samples[("navigator_span_seconds_sum", (("span", "retrieve"),))] == pytest.approx(504.403)
+    assert samples[("navigator_span_errors_total", (("span", "retrieve"),))] == 1
+    assert samples[("navigator_docs_out_total", (("span", "retrieve"),))] == 20
+    # 延迟类属性不导出为计数器
+    assert not any(name == "navigator_vector_ms_total" for name, _ in samples)
+    assert metrics.summary()["retrieve"]["errors"] == 1
+
+
+class FakeShard:
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+
+    def invoke(self, query):
+        if self.fail:
+            raise RuntimeError("index corrupted")
+        return [Document(page_content=f"{self.name} {i}", metadata={"score": 0.5}) for i in range(3)]
+
+
+class FakeRegistry:
+    max_projects = 8
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    @contextmanager
+    def use(self, name):
+        yield SimpleNamespace(retriever=FakeShard(name, fail=name in self.failing))
+
+
+def test_shard_spans_share_trace_across_threads(log, monkeypatch):
+    monkeypatch.setattr(federated, "get_client", lambda name: SimpleNamespace(embed_query=lambda q: [0.0]))
+    monkeypatch.setattr(FederatedRetriever, "resolve_projects", lambda self: ["alpha", "beta", "gamma"])
+    retriever = FederatedRetriever(registry=FakeRegistry(failing={"gamma"}), k=4, quota=2)
+
+    with span("query", trace_id="feedc0de") as root:
+        documents = retriever.invoke("where is the cache?")
+    assert len(documents) == 4
+
+    shards = log.named("retrieve.shard")
+    federated_span, = log.named("retrieve.federated")
+    # 分片在线程池中执行，仍然属于调用方的 trace，并挂在 retrieve.federated 之下
+    assert {r["project"] for r in shards} == {"alpha", "beta", "gamma"}
+    assert {r["trace_id"] for r in shards} == {"feedc0de"}
+    assert {r["parent_id"] for r in shards} == {federated_span["span_id"]}
+    assert federated_span["parent_id"] == root.span_id
+    failed, = [r for r in shards if r["status"] == "error"]
+    assert failed["project"] == "gamma" and "index corrupted" in failed["error"]
+
+    assert federated_span["shards_ok"] == 2 and federated_span["shards_failed"] == 1
+    assert federated_span["shards_timed_out"] == 0
+    assert federated_span["contributed"] == {"alpha": 2, "beta": 2}
+
+
+class FailingChain:
+    def batch(self, inputs, config=None, return_exceptions=False):
+        return [ValueError("bad json"), {"score": "yes"}, "not a dict"][:len(inputs)]
+
+
+def test_grading_status_is_recorded_on_span(log):
+    documents = [Document(page_content=f"doc {i}") for i in range(3)]
+    with span("grade") as s:
+        grades, calls, failed = grader._grade_single(FailingChain(), "q", documents, max_workers=2)
+        selected = grader.select_documents(documents, grades)
+    assert grades == ["partial", "yes", "partial"] and failed == {0, 2}
+    assert len(selected) == 3
+    assert s.attrs == {"grade_failed": 2, "selected_yes": 1, "selected_partial": 2}
+
+    record, = log.named("grade")
+    assert record["grade_failed"] == 2
+
+    # 没有当前 span 时忽略
+    telemetry.add(grade_failed=1)
+
+
+def test_log_rotates_when_over_size(tmp_path):
+    path = str(tmp_path / "telemetry" / "spans.jsonl")
+    log = telemetry._JsonLog(path, max_mb=1 / 1024)  # 1 KB
+    i = 0
+    while not os.path.exists(path + ".1"):
+        log.write({"name": "retrieve", "i": i, "padding": "x" * 60})
+        i += 1
+        assert i < 100, "日志没有轮转"
+    assert os.path.getsize(path + ".1") > 1024
+    for last in range(i, i + 3):
+        log.write({"name": "retrieve", "i": last, "padding": "x" * 60})
+
+    rotated = [json.loads(line)["i"] for line in open(path + ".1", encoding="utf-8")]
+    current = [json.loads(line)["i"] for line in open(path, encoding="utf-8")]
+    # 轮转后继续写入新文件，最新的记录不丢失，两个文件中的记录前后衔接
+    assert rotated == list(range(i))
+    assert current == [i, i + 1, i + 2]
@@ -0,0 +1,65 @@
+"""向量检索相关性分数的换算：两种后端都落在 [0, 1]，且顺序与相似度一致"""
+import math
+import warnings
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from flat_store import FlatVectorStore, open_vector_store, relevance_from_cosine, search_with_relevance
+
+# 查询向量为 (1, 0)：same 完全相同、near 夹角 30°、orthogonal 正交、opposite 方向相反
+_VECTORS = {
+    "query": [1.0, 0.0],
+    "same": [1.0, 0.0],
+    "near": [math.cos(math.pi / 6), math.sin(math.pi / 6)],
+    "orthogonal": [0.0, 1.0],
+    "opposite": [-1.0, 0.0],
+}
+
+
+class FixedEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [_VECTORS[t] for t in texts]
+
+    def embed_query(self, text):
+        return _VECTORS[text]
+
+
+def _documents():
+    return [Document(page_content=name, metadata={"chunk_id": name}) for name in _VECTORS if name != "query"]
+
+
+def test_relevance_from_cosine_is_clamped():
+    assert relevance_from_cosine(1.0) == pytest.approx(1.0)
+    # 量化误差导致的略超过 1 与方向相反的向量都被截断
+    assert relevance_from_cosine(1.001) == 1.0
+    assert relevance_from_cosine(-1.0) == 0.0
+    assert 0.0 < relevance_from_cosine(0.9) < 1.0
+
+
+def _check(results):
+    names = [doc.page_content for doc, _ in results]
+    scores = [score for _, score in results]
+    assert names[:2] == ["same", "near"]
+    assert all(0.0 <= s <= 1.0 for s in scores)
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] == pytest.approx(1.0, abs=1e-3)
+    assert scores[-1] == 0.0
+
+
+def test_flat_store_scores_in_range(tmp_path):
+    store = FlatVectorStore(str(tmp_path), FixedEmbeddings())
+    store.add_documents(_documents())
+    _check(search_with_relevance(store, "query", 4))
+    store.close()
+
+
+def test_chroma_scores_in_range_without_warning(tmp_path, monkeypatch):
+    pytest.importorskip("chromadb")
+    monkeypatch.setattr("flat_store.VECTOR_BACKEND", "chroma")
+    store = open_vector_store(str(tmp_path), FixedEmbeddings())
+    store.add_documents(_documents(), ids=[d.metadata["chunk_id"] for d in _documents()])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", UserWarning)
+        _check(search_with_relevance(store, "query", 4))
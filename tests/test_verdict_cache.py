@@ -0,0 +1,41 @@
+"""评分缓存：按 模型 / Prompt 版本 / 规范化问题 寻址、达到上限时的 LRU 淘汰、重新导入后清理失效切片的评分"""
+import pytest
+
+import ingest
+from verdict_cache import VerdictCache
+
+
+@pytest.fixture
+def verdicts(tmp_path):
+    return VerdictCache(str(tmp_path / "verdicts.sqlite"), max_entries=10)
+
+
+def test_verdicts_are_scoped_by_model_prompt_and_question(verdicts):
+    verdicts.put_many("grader", "1", "如何安装？", {"c1": "yes", "c2": "no"})
+    # 规范化后相同的问题共用评分
+    assert verdicts.get_many("grader", "1", "如何安装", ["c1", "c2", "c3"]) == {"c1": "yes", "c2": "no"}
+    assert verdicts.get_many("grader", "batch-1", "如何安装", ["c1"]) == {}
+    assert verdicts.get_many("other", "1", "如何安装", ["c1"]) == {}
+    assert verdicts.stats()["hits"] == 2
+
+
+def test_verdict_eviction_at_bound(verdicts):
+    for i in range(11):
+        verdicts.put_many("grader", "1", f"问题 {i}", {f"c{i}": "yes"})
+    assert verdicts.stats()["entries"] == 9
+    assert verdicts.get_many("grader", "1", "问题 0", ["c0"]) == {}
+    assert verdicts.get_many("grader", "1", "问题 10", ["c10"]) == {"c10": "yes"}
+
+
+def test_reingest_drops_verdicts_of_changed_chunks(verdicts, monkeypatch):
+    monkeypatch.setattr(ingest, "get_verdict_cache", lambda: verdicts)
+    verdicts.put_many("grader", "1", "q1", {"aaaa": "yes", "bbbb": "no", "cccc": "yes"})
+    verdicts.put_many("grader", "1", "q2", {"aaaa": "no"})
+    old_hashes = {"aaaa", "bbbb", "cccc"}
+    # 重新导入后 a.py 的切片内容变了 (aaaa -> dddd)，c.py 被删除
+    files = {"a.py": ["a.py#dddd"], "b.py": ["b.py#bbbb"]}
+    ingest.drop_stale_verdicts(old_hashes, files)
+
+    assert verdicts.get_many("grader", "1", "q1", ["aaaa", "bbbb", "cccc"]) == {"bbbb": "no"}
+    assert verdicts.get_many("grader", "1", "q2", ["aaaa"]) == {}
+    assert verdicts.stats()["entries"] == 1
@@ -0,0 +1,103 @@
+import os
+import re
+import hashlib
+import threading
+import unicodedata
+
+from sqlite_lru import SQLiteLRUCache
+
+# 评分结果缓存：按 (评分模型, Prompt 版本, 规范化后的问题, 切片内容哈希) 寻址，所有项目共用一份
+# 同一个问题 (或措辞略有差异的追问) 再次检索到相同切片时，不再调用评分模型
+VERDICT_CACHE_ENABLED = os.getenv("VERDICT_CACHE_ENABLED", "true").lower() == "true"
+VERDICT_CACHE_PATH = os.getenv("VERDICT_CACHE_PATH", os.path.join("embedding_cache", "verdicts.sqlite"))
+# 缓存条目上限，超出后按最近使用时间 (LRU) 淘汰
+VERDICT_CACHE_MAX_ENTRIES = int(os.getenv("VERDICT_CACHE_MAX_ENTRIES", "200000"))
+
+_SPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT = " ?？!！。.,，;；:：~～"
+
+
+def normalize_question(question):
+    """规范化问题：全角转半角、小写、合并空白、去掉结尾标点 ("如何安装？" 与 "如何安装" 视为同一问题)"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    return _SPACE_RE.sub(" ", text).strip().rstrip(_TRAILING_PUNCT)
+
+
+def chunk_hash(doc):
+    """切片内容哈希：优先使用 ingest 写入的 metadata["content_hash"]，旧项目现场计算"""
+    return doc.metadata.get("content_hash") or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()[:16]
+
+
+class VerdictCache(SQLiteLRUCache):
+    """
+    基于 SQLite 的评分结果缓存 (线程安全，WAL 模式支持多进程共享)
+    """
+
+    table = "verdicts"
+    scope_columns = ("model", "prompt_version", "question")
+    hash_column = "content_hash"
+    value_columns = ("grade",)
+    schema = (
+        """CREATE TABLE IF NOT EXISTS verdicts (
+            model TEXT NOT NULL,
+            prompt_version TEXT NOT NULL,
+            question TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            grade TEXT NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (model, prompt_version, question, content_hash)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_verdict_hash ON verdicts (content_hash)",
+        "CREATE INDEX IF NOT EXISTS idx_verdict_last_used ON verdicts (last_used)",
+    )
+    label = "Verdict Cache"
+
+    def __init__(self, path=VERDICT_CACHE_PATH, max_entries=VERDICT_CACHE_MAX_ENTRIES):
+        super().__init__(path, max_entries)
+
+    def get_many(self, model, prompt_version, question, hashes):
+        """批量查询，返回 {content_hash: 评分}，命中的条目会刷新最近使用时间"""
+        scope = (model, prompt_version, normalize_question(question))
+        return {h: grade for h, (grade,) in self._get(scope, hashes).items()}
+
+    def put_many(self, model, prompt_version, question, items):
+        """批量写入 {content_hash: 评分}，写入后按需淘汰"""
+        scope = (model, prompt_version, normalize_question(question))
+        self._put(scope, {h: (grade,) for h, grade in items.items()})
+
+    def scoped(self, model, prompt_version):
+        return ScopedVerdicts(self, model, prompt_version)
+
+
+class ScopedVerdicts:
+    """绑定了评分模型与 Prompt 版本的缓存视图，供评分引擎按文档读写"""
+
+    def __init__(self, cache, model, prompt_version):
+        self.cache = cache
+        self.model = model
+        self.prompt_version = prompt_version
+
+    def lookup(self, question, documents):
+        """返回与 documents 一一对应的缓存评分 (未命中为 None)"""
+        hashes = [chunk_hash(d) for d in documents]
+        found = self.cache.get_many(self.model, self.prompt_version, question, hashes)
+        return [found.get(h) for h in hashes]
+
+    def store(self, question, documents, grades):
+        self.cache.put_many(
+            self.model, self.prompt_version, question,
+            {chunk_hash(d): g for d, g in zip(documents, grades)}
+        )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_verdict_cache():
+    """进程内共享的缓存实例"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = VerdictCache()
+        return _cache